@@ -90,6 +90,7 @@ INSTALLED_APPS = [
     'authentication',
     'farmers',
     'loans',
+    'credit_scoring',
 ]
 
 MIDDLEWARE = [
@@ -211,11 +212,59 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Cache shared by web workers and Celery: token validation, vendor and token
+# count caches and run locks are invalidated from any process, so they must
+# live in Redis like the broker. Tests run in one process and use LocMem.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', 'redis://localhost:6379/1'),
+    }
+}
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 CELERY_BEAT_SCHEDULE = {
     'monitor-payment-schedules': {
         'task': 'loans.tasks.monitor_payment_schedules',
         'schedule': crontab(hour=0, minute=0),  # Run daily at midnight
     },
+    'reconcile-loan-balances': {
+        'task': 'loans.tasks.reconcile_loan_balances',
+        'schedule': crontab(hour=2, minute=0),  # Run daily at 2am
+    },
+    'process-momo-webhook-events': {
+        'task': 'loans.tasks.process_momo_webhook_events',
+        'schedule': 10.0,  # Safety net for callbacks whose drain was not queued
+    },
+    'poll-payment-statuses': {
+        'task': 'loans.tasks.poll_payment_statuses',
+        'schedule': 30.0,  # Check pending MoMo repayments that are due
+    },
+    'poll-disbursement-statuses': {
+        'task': 'loans.tasks.poll_disbursement_statuses',
+        'schedule': 60.0,  # Confirm accepted MoMo loan disbursements
+    },
+    'expire-loan-tokens': {
+        'task': 'loans.tasks.expire_loan_tokens',
+        'schedule': crontab(minute='*/10'),  # Move expired tokens out of ACTIVE
+    },
+    'archive-closed-loans': {
+        'task': 'loans.tasks.archive_closed_loans',
+        'schedule': crontab(hour=3, minute=0, day_of_week=0),  # Weekly, Sunday 3am
+    },
+    'settle-vendor-payouts': {
+        'task': 'loans.tasks.settle_vendor_payouts',
+        'schedule': crontab(minute=0),  # One netted transfer per vendor every hour
+    },
+    'dispatch-outbound-messages': {
+        'task': 'loans.tasks.dispatch_outbound_messages',
+        'schedule': 30.0,  # Drain the SMS outbox every 30 seconds
+    },
 }
 
 # Database settings
@@ -247,12 +296,23 @@ AT_API_KEY = os.getenv('AT_API_KEY', 'sandbox_api_key')
 AT_USERNAME = os.getenv('AT_USERNAME', 'sandbox_username')
 
 # MTN MoMo API settings
+MOMO_API_URL = os.getenv('MOMO_API_URL', 'https://sandbox.momodeveloper.mtn.com')
 MOMO_API_KEY = os.getenv('MOMO_API_KEY', '')
 MOMO_API_USER_ID = os.getenv('MOMO_API_USER_ID', '')
+MOMO_API_USER = os.getenv('MOMO_API_USER', MOMO_API_USER_ID)
 MOMO_API_SECRET = os.getenv('MOMO_API_SECRET', '')
 MOMO_ENVIRONMENT = os.getenv('MOMO_ENVIRONMENT', 'sandbox')
 MOMO_COLLECTION_PRIMARY_KEY = os.getenv('MOMO_COLLECTION_PRIMARY_KEY', '')
 MOMO_DISBURSEMENT_PRIMARY_KEY = os.getenv('MOMO_DISBURSEMENT_PRIMARY_KEY', '')
+MOMO_SUBSCRIPTION_KEY = os.getenv('MOMO_SUBSCRIPTION_KEY', MOMO_DISBURSEMENT_PRIMARY_KEY)
+MOMO_COLLECTION_KEY = os.getenv('MOMO_COLLECTION_KEY', MOMO_COLLECTION_PRIMARY_KEY)
+
+# Archive files of transactions and repayments of long-closed loans
+ARCHIVE_ROOT = os.getenv('ARCHIVE_ROOT', str(BASE_DIR / 'archive'))
+
+# Token redemptions: 'IMMEDIATE' pays the vendor on each redemption, 'NETTED'
+# records them for the periodic settle_vendor_payouts transfer per vendor
+TOKEN_SETTLEMENT_MODE = os.getenv('TOKEN_SETTLEMENT_MODE', 'IMMEDIATE')
 
 # Market API settings 
 MARKET_API_KEY = os.getenv('MARKET_API_KEY', '')
@@ -267,6 +327,13 @@ SENTINEL_API_KEY = os.environ.get('SENTINEL_API_KEY')
 SENTINEL_OAUTH_CLIENT_ID = os.environ.get('SENTINEL_OAUTH_CLIENT_ID')
 SENTINEL_OAUTH_CLIENT_SECRET = os.environ.get('SENTINEL_OAUTH_CLIENT_SECRET')
 
+# Loan eligibility limits
+MINIMUM_CREDIT_SCORE = int(os.getenv('MINIMUM_CREDIT_SCORE', '40'))
+MAXIMUM_EXPOSURE = int(os.getenv('MAXIMUM_EXPOSURE', '1000000'))
+
+# Serialised credit scoring model used by loans.risk_service.ModelCreditScoring
+CREDIT_MODEL_PATH = os.getenv('CREDIT_MODEL_PATH', str(BASE_DIR / 'ml_models' / 'credit_model.joblib'))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import ScoreSnapshot
+
+
+@admin.register(ScoreSnapshot)
+class ScoreSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('farmer', 'score', 'model_version', 'scored_at')
+    list_filter = ('model_version',)
+    search_fields = ('farmer__name', 'farmer__phone_number')
+    date_hierarchy = 'scored_at'
+    readonly_fields = ('farmer', 'score', 'model_version', 'components', 'scored_at')
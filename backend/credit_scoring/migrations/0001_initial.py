@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('farmers', '0004_climatehistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scored_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('model_version', models.CharField(max_length=100)),
+                ('score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('components', models.JSONField(default=list, help_text='Component values in the order defined by the model version')),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_snapshots', to='farmers.farmer')),
+            ],
+            options={
+                'ordering': ['-scored_at'],
+                'indexes': [models.Index(fields=['farmer', '-scored_at'], include=('score', 'model_version'), name='snapshot_farmer_scored_idx')],
+            },
+        ),
+    ]
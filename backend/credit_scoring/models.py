@@ -0,0 +1,44 @@
+from django.db import models
+from django.utils import timezone
+
+
+class ScoreSnapshot(models.Model):
+    """
+    Append-only history of credit scores.
+
+    Each row records a farmer's score at a point in time together with the
+    model version and the component vector it was computed from, so that
+    any past decision can be audited.
+    """
+    farmer = models.ForeignKey(
+        'farmers.Farmer',
+        on_delete=models.CASCADE,
+        related_name='score_snapshots'
+    )
+    scored_at = models.DateTimeField(default=timezone.now)
+    model_version = models.CharField(max_length=100)
+    score = models.DecimalField(max_digits=5, decimal_places=2)
+    components = models.JSONField(
+        default=list,
+        help_text="Component values in the order defined by the model version"
+    )
+
+    class Meta:
+        ordering = ['-scored_at']
+        indexes = [
+            # Serves "latest score" and "score as of date" lookups per farmer;
+            # on PostgreSQL the included columns make them index-only scans
+            models.Index(
+                fields=['farmer', '-scored_at'],
+                include=['score', 'model_version'],
+                name='snapshot_farmer_scored_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.farmer_id} scored {self.score} at {self.scored_at:%Y-%m-%d %H:%M}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Score snapshots are append-only")
+        super().save(*args, **kwargs)
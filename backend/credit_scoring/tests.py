@@ -0,0 +1,60 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+from authentication.models import User
+from farmers.models import Farmer
+from .models import ScoreSnapshot
+from .utils import latest_scores, record_snapshots, score_as_of
+
+
+class TestScoreSnapshots(TestCase):
+    def setUp(self):
+        self.farmers = []
+        for i in range(2):
+            user = User.objects.create(
+                username=f"snapshot_user_{i}",
+                password="password123",
+                role="FARMER",
+                phone_number=f"+25078800000{i}"
+            )
+            self.farmers.append(Farmer.objects.create(
+                user=user,
+                name=f"Snapshot Farmer {i}",
+                phone_number=f"+25078800000{i}",
+                location="Kigali",
+                farm_size=2
+            ))
+
+        self.now = timezone.now()
+        record_snapshots(
+            [(farmer.id, 40 + i, [1.234, 5]) for i, farmer in enumerate(self.farmers)],
+            model_version='v1',
+            scored_at=self.now - timedelta(days=30)
+        )
+        record_snapshots(
+            [(self.farmers[0].id, 72.456, [2, 3])],
+            model_version='v2',
+            scored_at=self.now
+        )
+
+    def test_latest_scores(self):
+        with self.assertNumQueries(1):
+            latest = latest_scores([farmer.id for farmer in self.farmers])
+
+        self.assertEqual(latest[self.farmers[0].id].score, Decimal('72.46'))
+        self.assertEqual(latest[self.farmers[0].id].model_version, 'v2')
+        self.assertEqual(latest[self.farmers[1].id].score, Decimal('41.00'))
+
+    def test_score_as_of_date(self):
+        as_of = self.now - timedelta(days=1)
+
+        self.assertEqual(score_as_of(self.farmers[0].id, as_of).model_version, 'v1')
+        self.assertEqual(latest_scores([self.farmers[0].id], as_of=as_of)[self.farmers[0].id].components, [1.23, 5.0])
+        self.assertIsNone(score_as_of(self.farmers[1].id, self.now - timedelta(days=60)))
+
+    def test_snapshots_are_append_only(self):
+        snapshot = ScoreSnapshot.objects.first()
+        snapshot.score = Decimal('99.00')
+        with self.assertRaises(ValueError):
+            snapshot.save()
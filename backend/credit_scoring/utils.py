@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import ScoreSnapshot
+
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def compact_components(values, precision=2):
+    """Round a component vector so snapshots stay small"""
+    return [round(float(value), precision) for value in values]
+
+
+def record_snapshots(entries, model_version, scored_at=None):
+    """
+    Append score snapshots in bulk.
+
+    Args:
+        entries: iterable of (farmer_id, score, components) tuples
+        model_version: version of the scorer that produced the scores
+        scored_at: timestamp shared by the batch (defaults to now)
+
+    Returns:
+        List of created ScoreSnapshot rows
+    """
+    scored_at = scored_at or timezone.now()
+    snapshots = [
+        ScoreSnapshot(
+            farmer_id=farmer_id,
+            scored_at=scored_at,
+            model_version=model_version,
+            score=round(score, 2),
+            components=compact_components(components),
+        )
+        for farmer_id, score, components in entries
+    ]
+    with transaction.atomic():
+        return ScoreSnapshot.objects.bulk_create(snapshots, batch_size=SNAPSHOT_BATCH_SIZE)
+
+
+def _latest_snapshot_ids(farmer_ids, as_of=None):
+    """Correlated subquery picking each farmer's newest snapshot id"""
+    newest = ScoreSnapshot.objects.filter(farmer_id=OuterRef('farmer_id'))
+    if as_of is not None:
+        newest = newest.filter(scored_at__lte=as_of)
+    newest = newest.order_by('-scored_at', '-id').values('id')[:1]
+
+    return ScoreSnapshot.objects.filter(
+        farmer_id__in=farmer_ids,
+        id=Subquery(newest)
+    )
+
+
+def latest_scores(farmer_ids, as_of=None):
+    """
+    Return {farmer_id: ScoreSnapshot} with each farmer's latest snapshot,
+    optionally as of a given datetime. Each farmer's lookup is a single
+    descending seek on the (farmer, scored_at) index.
+    """
+    return {
+        snapshot.farmer_id: snapshot
+        for snapshot in _latest_snapshot_ids(list(farmer_ids), as_of=as_of)
+    }
+
+
+def score_as_of(farmer_id, as_of=None):
+    """Latest snapshot for one farmer at or before `as_of` (default: now)"""
+    snapshots = ScoreSnapshot.objects.filter(farmer_id=farmer_id)
+    if as_of is not None:
+        snapshots = snapshots.filter(scored_at__lte=as_of)
+    return snapshots.order_by('-scored_at', '-id').first()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Loan, LoanProduct, LoanRepayment, Transaction
+from .models import Loan, LoanProduct, LoanRepayment, Transaction, OutboundMessage, MoMoWebhookEvent
 
 @admin.register(LoanProduct)
 class LoanProductAdmin(admin.ModelAdmin):
@@ -34,4 +34,19 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = ('id', 'loan', 'transaction_type', 'amount', 'status', 'created_at')
     list_filter = ('transaction_type', 'status')
     search_fields = ('reference', 'loan__farmer__name')
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'phone_number', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('phone_number',)
+    readonly_fields = ('created_at', 'sent_at', 'claimed_at')
+
+
+@admin.register(MoMoWebhookEvent)
+class MoMoWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('provider_transaction_id', 'external_id', 'amount', 'provider_status', 'status', 'received_at')
+    list_filter = ('status', 'provider_status')
+    search_fields = ('provider_transaction_id', 'external_id', 'phone_number')
+    readonly_fields = ('payload', 'received_at', 'processed_at')
@@ -32,6 +32,7 @@ class FarmerAlertService:
     async def check_and_send_weather_alerts(self):
         """Check weather conditions and send alerts to relevant farmers"""
         loans = await self.get_active_loans_with_schedule()
+        alerts = []
         
         for loan in loans:
             farmer = loan.farmer
@@ -62,8 +63,8 @@ class FarmerAlertService:
                 )
                 
                 if success:
-                    await self.sms_service.send_sms(farmer.phone_number, message)
-                    logger.info(f"Weather alert sent to farmer {farmer.id} with schedule adjustment")
+                    alerts.append((farmer.phone_number, message))
+                    logger.info(f"Weather alert queued for farmer {farmer.id} with schedule adjustment")
             
             # For medium risk, just send an alert
             elif drought_risk['risk_level'] == 'MEDIUM':
@@ -73,8 +74,10 @@ class FarmerAlertService:
                     f"if possible. Contact your local extension officer for advice."
                 )
                 
-                await self.sms_service.send_sms(farmer.phone_number, message)
-                logger.info(f"Weather advisory sent to farmer {farmer.id}")
+                alerts.append((farmer.phone_number, message))
+                logger.info(f"Weather advisory queued for farmer {farmer.id}")
+        
+        await self._send_alerts(alerts, 'Weather')
     
     async def send_market_price_alerts(self):
         """Send market price alerts to farmers with relevant crops"""
@@ -87,6 +90,7 @@ class FarmerAlertService:
             ).select_related('farmer'))
         
         crop_cycles = await get_active_crop_cycles()
+        alerts = []
         
         for cycle in crop_cycles:
             crop_type = cycle.crop_type
@@ -106,8 +110,8 @@ class FarmerAlertService:
                     f"Consider timing your harvest carefully for maximum returns."
                 )
                 
-                await self.sms_service.send_sms(farmer.phone_number, message)
-                logger.info(f"Market price alert sent to farmer {farmer.id} for {crop_type}")
+                alerts.append((farmer.phone_number, message))
+                logger.info(f"Market price alert queued for farmer {farmer.id} for {crop_type}")
             
             # If within 7 days of expected harvest, send best selling time info
             days_to_harvest = (cycle.expected_harvest_date - timezone.now().date()).days
@@ -122,5 +126,15 @@ class FarmerAlertService:
                         f"Potential price increase: {selling_advice['price_increase_potential']}."
                     )
                     
-                    await self.sms_service.send_sms(farmer.phone_number, message)
-                    logger.info(f"Harvest timing advice sent to farmer {farmer.id} for {crop_type}")
\ No newline at end of file
+                    alerts.append((farmer.phone_number, message))
+                    logger.info(f"Harvest timing advice queued for farmer {farmer.id} for {crop_type}")
+        
+        await self._send_alerts(alerts, 'Market')
+
+    async def _send_alerts(self, alerts, kind):
+        """Send collected (phone_number, message) alerts as bulk requests"""
+        results = await self.sms_service.send_grouped(alerts)
+        statuses = [status for by_phone in results.values() for status in by_phone.values()]
+        sent = sum(status['success'] for status in statuses)
+        logger.info(f"{kind} alerts sent: {sent}, failed: {len(statuses) - sent}")
+        return results
\ No newline at end of file
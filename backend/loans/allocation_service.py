@@ -0,0 +1,138 @@
+# backend/loans/allocation_service.py
+
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from .models import PaymentSchedule
+
+# Schedule statuses that can still take a payment
+OPEN_SCHEDULE_STATUSES = ['PENDING', 'PARTIAL', 'OVERDUE']
+# Fields written back after an allocation
+ALLOCATION_UPDATE_FIELDS = ['amount_paid', 'status', 'updated_at']
+
+CENT = Decimal('0.01')
+
+
+def _split_paid(schedule):
+    """
+    Split what has already been paid on a schedule into penalty, interest
+    and principal, in allocation order.
+    """
+    paid = schedule.amount_paid
+    penalty = min(paid, schedule.penalty_amount)
+    interest = min(paid - penalty, schedule.interest_amount)
+    return penalty, interest, paid - penalty - interest
+
+
+def allocate(schedules, amount):
+    """
+    Allocate a payment across schedules in memory.
+
+    Schedules are paid oldest first. Within each schedule the payment
+    covers penalty, then interest, then principal. Schedule objects are
+    updated in place; nothing is written to the database.
+
+    Args:
+        schedules: Open PaymentSchedule objects ordered by due date
+        amount: Payment amount as a Decimal
+
+    Returns:
+        Tuple of (changed schedules, allocation result dictionary)
+    """
+    remaining = Decimal(amount).quantize(CENT)
+    totals = {'penalty': Decimal('0'), 'interest': Decimal('0'), 'principal': Decimal('0')}
+    installments = []
+    changed = []
+
+    for schedule in schedules:
+        if remaining <= 0:
+            break
+
+        penalty_paid, interest_paid, principal_paid = _split_paid(schedule)
+        parts = {}
+        for component, due in (
+            ('penalty', schedule.penalty_amount - penalty_paid),
+            ('interest', schedule.interest_amount - interest_paid),
+            ('principal', schedule.amount - schedule.interest_amount - principal_paid),
+        ):
+            parts[component] = min(remaining, max(due, Decimal('0')))
+            remaining -= parts[component]
+            totals[component] += parts[component]
+
+        applied = sum(parts.values())
+        if not applied:
+            continue
+
+        schedule.amount_paid += applied
+        if schedule.amount_paid >= schedule.amount + schedule.penalty_amount:
+            schedule.status = 'PAID'
+        elif schedule.status != 'OVERDUE':
+            # Overdue installments stay overdue until they are paid off
+            schedule.status = 'PARTIAL'
+        changed.append(schedule)
+
+        installments.append({
+            'schedule_id': schedule.id,
+            'installment': schedule.installment_number,
+            'amount': applied,
+            'penalty': parts['penalty'],
+            'interest': parts['interest'],
+            'principal': parts['principal'],
+            'status': schedule.status
+        })
+
+    result = {
+        'amount': Decimal(amount).quantize(CENT),
+        'applied': sum(totals.values()),
+        'unapplied': remaining,
+        'penalty_paid': totals['penalty'],
+        'interest_paid': totals['interest'],
+        'principal_paid': totals['principal'],
+        'installments': installments,
+        'schedules_paid_off': all(schedule.status == 'PAID' for schedule in schedules)
+    }
+    return changed, result
+
+
+class PaymentAllocationService:
+    """Single entry point for applying a payment to a loan's schedules"""
+
+    @staticmethod
+    def allocate_payment(loan, amount, now=None):
+        """
+        Lock the loan's open schedules, allocate the payment and persist it.
+
+        Runs in one transaction with one locking SELECT and one bulk_update,
+        whatever the number of installments touched. Call it inside the
+        caller's transaction.atomic() block so that the allocation commits
+        together with the repayment record.
+
+        Args:
+            loan: Loan instance or id
+            amount: Payment amount as a Decimal
+            now: Timestamp for updated_at, defaults to timezone.now()
+
+        Returns:
+            Allocation result dictionary, see allocate()
+        """
+        loan_id = getattr(loan, 'pk', loan)
+        now = now or timezone.now()
+
+        # No savepoint: the allocation is rolled back with the caller's transaction
+        with transaction.atomic(savepoint=False):
+            schedules = list(
+                PaymentSchedule.objects.select_for_update().filter(
+                    loan_id=loan_id,
+                    status__in=OPEN_SCHEDULE_STATUSES
+                ).order_by('due_date', 'installment_number')
+            )
+
+            changed, result = allocate(schedules, amount)
+
+            for schedule in changed:
+                schedule.updated_at = now
+            if changed:
+                PaymentSchedule.objects.bulk_update(changed, ALLOCATION_UPDATE_FIELDS)
+
+        result['loan_id'] = loan_id
+        return result
@@ -21,12 +21,9 @@ class LoanAnalyticsService:
         )['total'] or 0
         
         # Calculate total outstanding amount
-        total_repaid = LoanRepayment.objects.filter(
-            loan__in=active_loans,
-            status='COMPLETED'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        total_outstanding = total_disbursed - total_repaid
+        total_outstanding = active_loans.aggregate(
+            total=Sum('outstanding_balance')
+        )['total'] or 0
         
         # Calculate default rate (loans overdue by more than 30 days)
         overdue_30_days = active_loans.filter(
@@ -0,0 +1,273 @@
+# backend/loans/archive_service.py
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ArchivedLoan, ArchiveSegment, Loan, LoanRepayment, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Loans archived per batch; each batch writes at most one file per table and month
+ARCHIVE_BATCH_SIZE = 200
+# Loans in these statuses take no more payments
+CLOSED_LOAN_STATUSES = ('PAID', 'DEFAULTED', 'REJECTED')
+# Default age of the last payment activity before a closed loan is archived
+ARCHIVE_MIN_AGE = timedelta(days=365)
+# Columns kept in the archive files, as returned by the read-through functions
+TRANSACTION_ARCHIVE_FIELDS = (
+    'id', 'loan_id', 'transaction_type', 'amount', 'currency', 'reference',
+    'phone_number', 'status', 'financial_id', 'created_at', 'updated_at'
+)
+REPAYMENT_ARCHIVE_FIELDS = ('id', 'loan_id', 'amount', 'payment_date', 'transaction_reference')
+# Archived columns converted back from JSON strings on read
+ARCHIVE_DATETIME_FIELDS = ('created_at', 'updated_at', 'payment_date')
+ARCHIVE_DECIMAL_FIELDS = ('amount',)
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder, but keeping datetimes to the microsecond"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def archive_root():
+    return settings.ARCHIVE_ROOT
+
+
+def read_segment(segment):
+    """Yield the rows of an archive segment as dicts, with datetimes and amounts restored"""
+    with gzip.open(os.path.join(archive_root(), segment.path), 'rt') as f:
+        for line in f:
+            row = json.loads(line)
+            for field in ARCHIVE_DATETIME_FIELDS:
+                if row.get(field):
+                    row[field] = parse_datetime(row[field])
+            for field in ARCHIVE_DECIMAL_FIELDS:
+                if row.get(field) is not None:
+                    row[field] = Decimal(row[field])
+            yield row
+
+
+def _archived_rows(loan_id, kind):
+    segments = ArchiveSegment.objects.filter(loans__loan_id=loan_id, kind=kind).order_by('period', 'id')
+    loan_key = str(loan_id)
+    return [
+        row
+        for segment in segments
+        for row in read_segment(segment)
+        if row['loan_id'] == loan_key
+    ]
+
+
+def loan_transactions(loan_id):
+    """
+    A loan's transactions, oldest first, from the live table or its archive files.
+
+    Archived rows have the same fields and types, except that ids are strings.
+    """
+    if ArchivedLoan.objects.filter(loan_id=loan_id).exists():
+        return _archived_rows(loan_id, 'TRANSACTIONS')
+    return list(
+        Transaction.objects.filter(loan_id=loan_id).order_by('created_at').values(*TRANSACTION_ARCHIVE_FIELDS)
+    )
+
+
+def loan_repayments(loan_id):
+    """A loan's repayments, oldest first, from the live table or its archive files"""
+    if ArchivedLoan.objects.filter(loan_id=loan_id).exists():
+        return _archived_rows(loan_id, 'REPAYMENTS')
+    return list(
+        LoanRepayment.objects.filter(loan_id=loan_id).order_by('payment_date').values(*REPAYMENT_ARCHIVE_FIELDS)
+    )
+
+
+class LoanArchiver:
+    """
+    Moves the transactions and repayments of long-closed loans to archive files.
+
+    Each batch of loans is locked, its rows are written to gzipped JSON
+    lines files under ARCHIVE_ROOT/<table>/<YYYY-MM>/, and then, in the same
+    transaction, the files and loans are recorded in the ArchiveSegment and
+    ArchivedLoan index and the rows are deleted. A file is renamed into place
+    only once it is complete, and its name is derived from the batch's loans.
+    A run that stops part way therefore leaves at most unindexed files, and
+    the next run picks up every loan that is not in the index yet.
+    """
+
+    def __init__(self, batch_size=ARCHIVE_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    @staticmethod
+    def eligible_loans(cutoff):
+        """Closed, unarchived loans with no transaction or repayment since cutoff"""
+        return Loan.objects.filter(
+            status__in=CLOSED_LOAN_STATUSES,
+            archive__isnull=True
+        ).exclude(
+            transactions__updated_at__gte=cutoff
+        ).exclude(
+            repayments__payment_date__gte=cutoff
+        )
+
+    def archive_batch(self, cutoff, after_id=None, dry_run=False):
+        """
+        Archive the next batch of eligible loans after after_id.
+
+        Returns:
+            Tuple of (last loan id or None when done, batch metrics)
+        """
+        with transaction.atomic():
+            loans = self.eligible_loans(cutoff).order_by('id')
+            if after_id is not None:
+                loans = loans.filter(id__gt=after_id)
+            if not dry_run:
+                loans = loans.select_for_update(of=('self',))
+            loans = list(loans.only('id', 'due_date')[:self.batch_size])
+            if not loans:
+                return None, None
+
+            loan_ids = [loan.id for loan in loans]
+            transactions = list(
+                Transaction.objects.filter(loan_id__in=loan_ids).order_by('created_at').values(
+                    *TRANSACTION_ARCHIVE_FIELDS
+                )
+            )
+            repayments = list(
+                LoanRepayment.objects.filter(loan_id__in=loan_ids).annotate(
+                    due_date=F('loan__due_date')
+                ).order_by('payment_date').values(*REPAYMENT_ARCHIVE_FIELDS, 'due_date')
+            )
+            metrics = {'loans': len(loans), 'transactions': len(transactions), 'repayments': len(repayments), 'bytes': 0}
+            if dry_run:
+                return loans[-1].id, metrics
+
+            batch_key = hashlib.sha1(''.join(sorted(str(loan_id) for loan_id in loan_ids)).encode()).hexdigest()[:16]
+            segments_by_loan = {loan_id: set() for loan_id in loan_ids}
+            for kind, rows, date_field in (
+                ('TRANSACTIONS', transactions, 'created_at'),
+                ('REPAYMENTS', repayments, 'payment_date'),
+            ):
+                for period, period_rows in self._by_month(rows, date_field).items():
+                    segment, size = self._write_segment(kind, period, batch_key, period_rows)
+                    metrics['bytes'] += size
+                    for row in period_rows:
+                        segments_by_loan[row['loan_id']].add(segment.id)
+
+            on_time = {loan_id: 0 for loan_id in loan_ids}
+            transaction_counts = {loan_id: 0 for loan_id in loan_ids}
+            repayment_counts = {loan_id: 0 for loan_id in loan_ids}
+            for row in transactions:
+                transaction_counts[row['loan_id']] += 1
+            for row in repayments:
+                repayment_counts[row['loan_id']] += 1
+                if row['due_date'] and row['payment_date'] <= row['due_date']:
+                    on_time[row['loan_id']] += 1
+
+            ArchivedLoan.objects.bulk_create([
+                ArchivedLoan(
+                    loan_id=loan_id,
+                    transaction_count=transaction_counts[loan_id],
+                    repayment_count=repayment_counts[loan_id],
+                    on_time_repayments=on_time[loan_id]
+                )
+                for loan_id in loan_ids
+            ])
+            ArchivedLoan.segments.through.objects.bulk_create([
+                ArchivedLoan.segments.through(archivedloan_id=loan_id, archivesegment_id=segment_id)
+                for loan_id, segment_ids in segments_by_loan.items()
+                for segment_id in segment_ids
+            ])
+            Transaction.objects.filter(loan_id__in=loan_ids).delete()
+            LoanRepayment.objects.filter(loan_id__in=loan_ids).delete()
+
+        return loans[-1].id, metrics
+
+    @staticmethod
+    def _by_month(rows, date_field):
+        months = {}
+        for row in rows:
+            months.setdefault(row[date_field].strftime('%Y-%m'), []).append(row)
+        return months
+
+    def _write_segment(self, kind, period, batch_key, rows):
+        """Write one archive file atomically and index it; returns the segment and file size"""
+        fields = TRANSACTION_ARCHIVE_FIELDS if kind == 'TRANSACTIONS' else REPAYMENT_ARCHIVE_FIELDS
+        path = os.path.join(kind.lower(), period, f"{batch_key}.jsonl.gz")
+        full_path = os.path.join(archive_root(), path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        partial_path = f"{full_path}.partial"
+        with open(partial_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for row in rows:
+                    f.write(json.dumps({field: row[field] for field in fields}, cls=ArchiveJSONEncoder).encode())
+                    f.write(b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        with open(partial_path, 'rb') as f:
+            sha256 = hashlib.sha256(f.read()).hexdigest()
+        os.replace(partial_path, full_path)
+
+        segment, _ = ArchiveSegment.objects.update_or_create(
+            path=path,
+            defaults={'kind': kind, 'period': period, 'row_count': len(rows), 'sha256': sha256}
+        )
+        return segment, os.path.getsize(full_path)
+
+    def run(self, cutoff=None, max_batches=None, dry_run=False, on_batch=None):
+        """
+        Archive batches until no eligible loan is left or max_batches is reached.
+
+        Args:
+            cutoff: Archive loans with no payment activity since this time;
+                defaults to ARCHIVE_MIN_AGE ago
+            max_batches: Stop after this many batches
+            dry_run: Count what would be archived without writing or deleting
+            on_batch: Optional callable receiving each batch's metrics
+
+        Returns:
+            Dictionary with totals, elapsed time and throughput
+        """
+        cutoff = cutoff or timezone.now() - ARCHIVE_MIN_AGE
+        started = time.perf_counter()
+        totals = {'batches': 0, 'loans': 0, 'transactions': 0, 'repayments': 0, 'bytes': 0}
+        last_id = None
+
+        while max_batches is None or totals['batches'] < max_batches:
+            batch_started = time.perf_counter()
+            last_id, metrics = self.archive_batch(cutoff, last_id, dry_run=dry_run)
+            if last_id is None:
+                break
+
+            totals['batches'] += 1
+            for key in ('loans', 'transactions', 'repayments', 'bytes'):
+                totals[key] += metrics[key]
+            metrics['batch'] = totals['batches']
+            metrics['elapsed_seconds'] = round(time.perf_counter() - batch_started, 3)
+            logger.info(f"Archive batch: {metrics}")
+            if on_batch:
+                on_batch(metrics)
+
+        elapsed = time.perf_counter() - started
+        rows = totals['transactions'] + totals['repayments']
+        return {
+            **totals,
+            'cutoff': cutoff.isoformat(),
+            'dry_run': dry_run,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(rows / elapsed, 1) if elapsed else 0.0
+        }
@@ -0,0 +1,251 @@
+# backend/loans/benchmarks.py
+"""
+Shared helpers for the loan benchmarking commands.
+
+Keeps timing and reporting consistent between benchmarks so that results
+from different commands can be compared side by side.
+"""
+
+import json
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+def percentile(values, pct):
+    """
+    Return the pct-th percentile (0-100) of a list of numbers.
+
+    Interpolates linearly between the two nearest ranks, so the median of
+    an even number of samples is the mean of the middle two.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = min(max(pct, 0), 100) / 100 * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarise(samples, items=None):
+    """
+    Summarise a list of latency samples (in seconds).
+
+    `items` is the number of units of work the samples covered and defaults
+    to one per sample; throughput is reported per unit of work.
+    """
+    total = sum(samples)
+    items = len(samples) if items is None else items
+    return {
+        'samples': len(samples),
+        'mean_ms': round(total / len(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'throughput_per_s': round(items / total, 1) if total else 0.0,
+    }
+
+
+class Timer:
+    """Context manager collecting wall-clock samples"""
+
+    def __init__(self):
+        self.samples = []
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+
+@contextmanager
+def stub_external_services(scorer):
+    """
+    Replace weather, satellite and climate calls on a scorer with constant
+    async stubs so that benchmarks measure our own code, not the network.
+    """
+    patches = []
+    if hasattr(scorer, 'weather_service'):
+        patches.append(patch.object(scorer.weather_service, 'assess_risk', AsyncMock(return_value=30)))
+    if hasattr(scorer, 'satellite_service'):
+        patches.append(patch.object(scorer.satellite_service, 'analyze_farm', AsyncMock(return_value=70)))
+    if hasattr(scorer, 'climate_data_service'):
+        patches.append(patch.object(
+            scorer.climate_data_service, 'update_farmer_climate_data',
+            AsyncMock(return_value={'success': True, 'updated_count': 0, 'error_count': 0, 'total_farmers': 0})
+        ))
+    for p in patches:
+        p.start()
+    try:
+        yield scorer
+    finally:
+        for p in reversed(patches):
+            p.stop()
+
+
+@contextmanager
+def count_queries():
+    """Capture the SQL queries issued on the default connection"""
+    with CaptureQueriesContext(connection) as context:
+        yield context
+
+
+def generate_population(size, seed=0, batch_size=2000):
+    """
+    Bulk-create a synthetic portfolio of `size` farmers.
+
+    Each farmer gets a user, up to three loans with payment schedules and
+    repayments, and up to three crop cycles, in roughly the proportions seen
+    in production. Returns the list of created farmers.
+    """
+    from authentication.models import User
+    from farmers.models import Farmer
+    from .models import CropCycle, Loan, LoanProduct, LoanRepayment, PaymentSchedule
+
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    product = LoanProduct.objects.create(
+        name=f"Benchmark Product {seed}",
+        description="Synthetic product for benchmarks",
+        min_amount=Decimal('100.00'),
+        max_amount=Decimal('100000.00'),
+        interest_rate=Decimal('12.00'),
+        duration_days=180,
+    )
+
+    users = User.objects.bulk_create([
+        User(
+            username=f"bench-{seed}-{i}",
+            password='!',
+            role='FARMER',
+            phone_number=f"+2599{seed % 10}{i:08d}",
+        )
+        for i in range(size)
+    ], batch_size=batch_size)
+
+    farmers = Farmer.objects.bulk_create([
+        Farmer(
+            user=user,
+            name=f"Benchmark Farmer {i}",
+            phone_number=user.phone_number,
+            location=rng.choice(['Kigali', 'Musanze', 'Nyagatare', 'Kayonza', 'Huye']),
+            farm_size=Decimal(rng.randint(50, 1000)) / 100,
+            ndvi_value=rng.uniform(-0.1, 0.9) if rng.random() < 0.7 else None,
+            rainfall_anomaly_mm=rng.uniform(-40, 40) if rng.random() < 0.7 else None,
+        )
+        for i, user in enumerate(users)
+    ], batch_size=batch_size)
+
+    loans, schedules, repayments, crop_cycles = [], [], [], []
+    for farmer in farmers:
+        for _ in range(rng.choice([0, 1, 1, 2, 3])):
+            status = rng.choices(
+                ['PAID', 'ACTIVE', 'OVERDUE', 'DEFAULTED', 'PENDING'],
+                weights=[45, 30, 10, 5, 10]
+            )[0]
+            amount = Decimal(rng.randint(100, 2000) * 10)
+            disbursed = now - timedelta(days=rng.randint(30, 900))
+            loan = Loan(
+                farmer=farmer,
+                loan_product=product,
+                amount_requested=amount,
+                amount_approved=None if status == 'PENDING' else amount,
+                status=status,
+                disbursement_date=None if status == 'PENDING' else disbursed,
+                due_date=None if status == 'PENDING' else disbursed + timedelta(days=180),
+            )
+            loans.append(loan)
+            if status == 'PENDING':
+                continue
+
+            installments = rng.randint(3, 6)
+            installment = (amount / installments).quantize(Decimal('0.01'))
+            for n in range(1, installments + 1):
+                due = disbursed + timedelta(days=30 * n)
+                if status == 'PAID':
+                    schedule_status = 'PAID'
+                elif due < now:
+                    schedule_status = rng.choice(['PAID', 'PAID', 'OVERDUE', 'PARTIAL'])
+                else:
+                    schedule_status = 'PENDING'
+                schedules.append(PaymentSchedule(
+                    loan=loan,
+                    installment_number=n,
+                    due_date=due,
+                    principal_amount=installment,
+                    interest_amount=Decimal('0.00'),
+                    amount=installment,
+                    status=schedule_status,
+                    amount_paid=installment if schedule_status == 'PAID' else Decimal('0.00'),
+                ))
+                if schedule_status == 'PAID':
+                    # Loan IDs are only assigned by bulk_create, so the loan's
+                    # position in this population identifies it instead
+                    repayments.append(LoanRepayment(
+                        loan=loan,
+                        amount=installment,
+                        transaction_reference=f"BENCH-{seed}-{len(loans)}-{n}",
+                    ))
+                    loan.total_repaid += installment
+            loan.outstanding_balance = max(amount - loan.total_repaid, 0)
+
+        for _ in range(rng.randint(0, 3)):
+            planted = (now - timedelta(days=rng.randint(60, 1500))).date()
+            crop_cycles.append(CropCycle(
+                farmer=farmer,
+                crop_type=rng.choice([c[0] for c in CropCycle.CROP_TYPE_CHOICES]),
+                season=rng.choice([s[0] for s in CropCycle.SEASON_CHOICES]),
+                planting_date=planted,
+                expected_harvest_date=planted + timedelta(days=120),
+                farm_size_allocated=farmer.farm_size,
+            ))
+
+    Loan.objects.bulk_create(loans, batch_size=batch_size)
+    PaymentSchedule.objects.bulk_create(schedules, batch_size=batch_size)
+    LoanRepayment.objects.bulk_create(repayments, batch_size=batch_size)
+    CropCycle.objects.bulk_create(crop_cycles, batch_size=batch_size)
+    return farmers
+
+
+def write_baseline(results, path):
+    """Write benchmark results to a JSON baseline file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, sort_keys=True))
+
+
+def compare_to_baseline(results, path, tolerance=0.2):
+    """
+    Compare results against a stored baseline.
+
+    Returns a list of human-readable regressions: any p50/p99 latency or
+    queries-per-call figure that grew by more than `tolerance`.
+    """
+    path = Path(path)
+    if not path.exists():
+        return []
+
+    baseline = json.loads(path.read_text())
+    regressions = []
+    for scale, scorers in results.get('scales', {}).items():
+        for scorer, current in scorers.items():
+            previous = baseline.get('scales', {}).get(scale, {}).get(scorer)
+            if not previous:
+                continue
+            for metric in ('p50_ms', 'p99_ms', 'queries_per_call'):
+                old, new = previous.get(metric), current.get(metric)
+                if old and new and new > old * (1 + tolerance):
+                    regressions.append(f"{scale}/{scorer} {metric}: {old} -> {new}")
+    return regressions
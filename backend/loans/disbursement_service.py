@@ -0,0 +1,275 @@
+# backend/loans/disbursement_service.py
+
+import asyncio
+import logging
+import time
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+import httpx
+from .models import Loan, Transaction
+from .momo_integration import DISBURSEMENT_ACCEPTED_STATUS_CODES, DISBURSEMENT_DUPLICATE_STATUS_CODE, MoMoAPI
+from .outbox_service import queue_sms
+from .payment_status_service import MOMO_PENDING_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Approved loans claimed per disbursement batch
+DISBURSEMENT_BATCH_SIZE = 100
+# MoMo transfer requests in flight at once
+DISBURSEMENT_CONCURRENCY = 10
+# Held in the shared cache while a bulk run is in progress, so that a second
+# run does not start in this or any other process
+DISBURSEMENT_RUN_LOCK_KEY = 'bulk-disbursement-running'
+DISBURSEMENT_RUN_LOCK_TIMEOUT = 60 * 60
+
+
+class BulkDisbursementRunner:
+    """
+    Disburses APPROVED loans through MoMo in batches.
+
+    The checkpoint is the DISBURSEMENT Transaction created for each loan
+    before its transfer is sent. A loan whose transfer outcome is unknown,
+    because of a crash or a network error, keeps that transaction, and the
+    next run resends it under the same reference. MoMo rejects a repeated
+    reference with 409, so a loan is never paid twice; the original
+    transfer's status is then fetched to record its real outcome.
+
+    Subclasses pay other kinds of items through the same batches by
+    overriding claim_batch and record_results.
+    """
+    # Key under which per-batch and total item counts are reported
+    item_label = 'loans'
+    # Cache key held while a run is in progress
+    run_lock_key = DISBURSEMENT_RUN_LOCK_KEY
+    # Extra keyword arguments for MoMoAPI.send_disbursement
+    transfer_notes = {}
+
+    def __init__(self, batch_size=DISBURSEMENT_BATCH_SIZE, max_concurrency=DISBURSEMENT_CONCURRENCY):
+        self.momo_api = MoMoAPI()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+
+    @staticmethod
+    def retry_failed():
+        """Make approved loans whose transfer MoMo rejected eligible again"""
+        return Loan.objects.filter(status='APPROVED', disbursement_status='FAILED').update(
+            disbursement_status='PENDING'
+        )
+
+    def claim_batch(self, after_id=None):
+        """
+        Select the next batch of approved loans and checkpoint a transfer for each.
+
+        Loans are walked in primary key order from after_id, so a loan left
+        pending by a network error is not picked up again in the same run.
+        A pending DISBURSEMENT transaction from an earlier run is reused;
+        otherwise one is created with a new reference. Both are committed
+        before any transfer is sent.
+
+        Returns:
+            List of (loan, transaction) pairs
+        """
+        with transaction.atomic():
+            loans = Loan.objects.select_for_update(skip_locked=True, of=('self',)).select_related(
+                'farmer'
+            ).filter(
+                status='APPROVED',
+                disbursement_status='PENDING',
+                amount_approved__gt=0
+            ).order_by('id')
+            if after_id is not None:
+                loans = loans.filter(id__gt=after_id)
+            loans = list(loans[:self.batch_size])
+            if not loans:
+                return []
+
+            checkpoints = {
+                tx.loan_id: tx
+                for tx in Transaction.objects.filter(
+                    loan__in=loans, transaction_type='DISBURSEMENT', status='PENDING'
+                )
+            }
+
+            new_transactions = []
+            for loan in loans:
+                if loan.id not in checkpoints:
+                    tx = Transaction(
+                        loan=loan,
+                        transaction_type='DISBURSEMENT',
+                        amount=loan.amount_approved,
+                        currency='EUR',
+                        reference=str(uuid.uuid4()),
+                        phone_number=loan.farmer.phone_number,
+                        status='PENDING'
+                    )
+                    checkpoints[loan.id] = tx
+                    new_transactions.append(tx)
+                loan.momo_reference = checkpoints[loan.id].reference
+
+            Transaction.objects.bulk_create(new_transactions)
+            Loan.objects.bulk_update(loans, ['momo_reference'])
+
+        return [(loan, checkpoints[loan.id]) for loan in loans]
+
+    async def send_batch(self, items):
+        """
+        Submit the transfers for a batch over one shared client.
+
+        Returns:
+            List of (outcome, detail) aligned with items, where outcome is
+            'accepted', 'rejected' or 'unknown'
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with httpx.AsyncClient() as client:
+            async def send(tx):
+                async with semaphore:
+                    try:
+                        response = await self.momo_api.send_disbursement(
+                            tx.reference, tx.amount, tx.phone_number, client=client, **self.transfer_notes
+                        )
+                    except Exception as e:
+                        # MoMo may or may not have the transfer; resend it next run
+                        return 'unknown', str(e)
+
+                    if response.status_code in DISBURSEMENT_ACCEPTED_STATUS_CODES:
+                        return 'accepted', ''
+                    if response.status_code == DISBURSEMENT_DUPLICATE_STATUS_CODE:
+                        return await self.original_outcome(tx.reference, client)
+                    if response.status_code >= 500:
+                        return 'unknown', response.text
+                    return 'rejected', response.text
+
+            return await asyncio.gather(*[send(tx) for _, tx in items])
+
+    async def original_outcome(self, reference, client):
+        """
+        Outcome of a transfer MoMo already holds under reference.
+
+        Returns:
+            Tuple of (outcome, detail) as for send_batch
+        """
+        try:
+            status_data = await self.momo_api.get_disbursement_status(reference, client=client)
+        except Exception as e:
+            return 'unknown', str(e)
+
+        momo_status = status_data.get('status')
+        if momo_status == 'SUCCESSFUL' or momo_status in MOMO_PENDING_STATUSES:
+            return 'accepted', ''
+        return 'rejected', f"Original transfer {momo_status}: {status_data.get('reason', '')}"
+
+    def record_results(self, items, outcomes):
+        """
+        Persist a batch's outcomes with one bulk_update per table.
+
+        Accepted loans move to disbursement PROCESSING and their farmers are
+        notified through the outbox; DisbursementStatusPoller moves them on
+        once MoMo confirms the transfer. Rejected transfers are marked FAILED. Unknown
+        outcomes are left untouched for the next run to resend.
+
+        Returns:
+            Dictionary of loan counts by outcome
+        """
+        counts = {'accepted': 0, 'rejected': 0, 'unknown': 0}
+        loans = []
+        transactions = []
+        now = timezone.now()
+
+        with transaction.atomic():
+            for (loan, tx), (outcome, detail) in zip(items, outcomes):
+                counts[outcome] += 1
+                if outcome == 'accepted':
+                    loan.disbursement_status = 'PROCESSING'
+                    queue_sms(
+                        loan.farmer.phone_number,
+                        f"Your loan of {loan.amount_approved} RWF is being disbursed to your mobile money account."
+                    )
+                elif outcome == 'rejected':
+                    logger.warning(f"Disbursement for loan {loan.id} rejected: {detail}")
+                    loan.disbursement_status = 'FAILED'
+                    tx.status = 'FAILED'
+                    tx.updated_at = now
+                    transactions.append(tx)
+                else:
+                    logger.warning(f"Disbursement for loan {loan.id} not confirmed, will resend: {detail}")
+                    continue
+                loans.append(loan)
+
+            if loans:
+                Loan.objects.bulk_update(loans, ['disbursement_status'])
+            if transactions:
+                Transaction.objects.bulk_update(transactions, ['status', 'updated_at'])
+
+        return counts
+
+    async def run(self, max_batches=None, on_batch=None):
+        """
+        Disburse batches until no approved loan is left or max_batches is reached.
+
+        Only one run of each runner class goes at a time, across the web,
+        management command and Celery processes; a second one returns None
+        straight away. The lock is only released by the run that holds it.
+
+        Args:
+            max_batches: Stop after this many batches
+            on_batch: Optional callable receiving each batch's metrics
+
+        Returns:
+            Dictionary with totals, elapsed time and per-batch metrics
+        """
+        owner = str(uuid.uuid4())
+        if not cache.add(self.run_lock_key, owner, timeout=DISBURSEMENT_RUN_LOCK_TIMEOUT):
+            logger.info(f"{self.__class__.__name__} already running, skipping")
+            return None
+        try:
+            return await self._run(max_batches, on_batch)
+        finally:
+            # A run that outlived the lock timeout must not release a newer run's lock
+            if cache.get(self.run_lock_key) == owner:
+                cache.delete(self.run_lock_key)
+
+    async def _run(self, max_batches, on_batch):
+        started = time.perf_counter()
+        totals = {self.item_label: 0, 'accepted': 0, 'rejected': 0, 'unknown': 0}
+        batches = []
+        last_id = None
+
+        while max_batches is None or len(batches) < max_batches:
+            batch_started = time.perf_counter()
+            items = await sync_to_async(self.claim_batch)(last_id)
+            if not items:
+                break
+            last_id = items[-1][0].id
+
+            outcomes = await self.send_batch(items)
+            counts = await sync_to_async(self.record_results)(items, outcomes)
+
+            elapsed = time.perf_counter() - batch_started
+            metrics = {
+                'batch': len(batches) + 1,
+                self.item_label: len(items),
+                **counts,
+                'elapsed_seconds': round(elapsed, 3),
+                'per_second': round(len(items) / elapsed, 1) if elapsed else 0.0
+            }
+            batches.append(metrics)
+            logger.info(f"{self.__class__.__name__} batch: {metrics}")
+            if on_batch:
+                on_batch(metrics)
+
+            totals[self.item_label] += len(items)
+            for outcome, count in counts.items():
+                totals[outcome] += count
+
+        elapsed = time.perf_counter() - started
+        return {
+            'batches': len(batches),
+            **totals,
+            'elapsed_seconds': round(elapsed, 3),
+            'per_second': round(totals[self.item_label] / elapsed, 1) if elapsed else 0.0,
+            'batch_metrics': batches
+        }
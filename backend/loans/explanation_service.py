@@ -0,0 +1,157 @@
+# backend/loans/explanation_service.py
+
+import logging
+import threading
+from django.db import transaction
+from asgiref.sync import sync_to_async
+from farmers.models import Farmer
+from credit_scoring.utils import record_snapshots
+from .models import CreditScoreExplanation
+from .risk_service import SCORING_FEATURES, build_feature_matrix, get_scoring_model
+
+logger = logging.getLogger(__name__)
+
+# Number of farmers summarised into the SHAP background dataset
+BACKGROUND_SIZE = 100
+# Number of largest contributions stored for the API
+TOP_FEATURE_COUNT = 5
+
+_explainer = None
+_explainer_lock = threading.Lock()
+
+
+def get_explainer(artifact):
+    """
+    Build (once per loaded model) an approximate SHAP explainer.
+
+    The background dataset is taken from the artifact when it was saved with
+    one, otherwise sampled from current farmers. A permutation explainer is
+    used so any classifier exposing predict_proba can be explained.
+    """
+    global _explainer
+    if _explainer is None or _explainer[0] is not artifact:
+        with _explainer_lock:
+            if _explainer is None or _explainer[0] is not artifact:
+                import shap
+
+                background = artifact.get('background')
+                if background is None:
+                    sample = list(Farmer.objects.order_by('?')[:BACKGROUND_SIZE])
+                    background = build_feature_matrix(sample)
+                background = shap.sample(background, min(BACKGROUND_SIZE, len(background)), random_state=0)
+
+                model = artifact['model']
+                explainer = shap.Explainer(
+                    lambda features: model.predict_proba(features)[:, 1],
+                    shap.maskers.Independent(background),
+                    algorithm='permutation',
+                )
+                _explainer = (artifact, explainer)
+                logger.info(
+                    f"Built SHAP explainer for model {artifact['version']} "
+                    f"with {len(background)} background rows"
+                )
+    return _explainer[1]
+
+
+class CreditExplanationService:
+    """Batch rescoring that stores why each farmer got their score"""
+
+    def rescore_batch(self, farmers):
+        """
+        Score and explain a batch of farmers in one pass.
+
+        Writes one ScoreSnapshot per farmer and links the explanation to it.
+        Returns the list of CreditScoreExplanation rows that were written.
+        """
+        if not farmers:
+            return []
+
+        artifact = get_scoring_model()
+        features = build_feature_matrix(farmers)
+        probabilities = artifact['model'].predict_proba(features)[:, 1]
+        explanation = get_explainer(artifact)(features)
+
+        scores = [round(float(probability) * 100, 2) for probability in probabilities]
+
+        rows = []
+        for farmer, score, values, base_value, feature_row in zip(
+            farmers, scores, explanation.values, explanation.base_values, features
+        ):
+            # Report contributions on the same 0-100 scale as the score
+            contributions = {
+                name: round(float(value) * 100, 2)
+                for name, value in zip(SCORING_FEATURES, values)
+            }
+            ranked = sorted(
+                zip(SCORING_FEATURES, feature_row, values),
+                key=lambda item: abs(item[2]),
+                reverse=True
+            )
+            rows.append(CreditScoreExplanation(
+                farmer=farmer,
+                model_version=artifact['version'],
+                score=score,
+                base_value=round(float(base_value) * 100, 2),
+                contributions=contributions,
+                top_features=[
+                    {
+                        'feature': name,
+                        'value': float(value),
+                        'contribution': round(float(shap_value) * 100, 2)
+                    }
+                    for name, value, shap_value in ranked[:TOP_FEATURE_COUNT]
+                ],
+            ))
+
+        with transaction.atomic():
+            snapshots = record_snapshots(
+                zip([farmer.id for farmer in farmers], scores, features),
+                model_version=artifact['version']
+            )
+            for row, snapshot in zip(rows, snapshots):
+                row.snapshot = snapshot
+            CreditScoreExplanation.objects.bulk_create(rows)
+        return rows
+
+    def rescore_all(self, batch_size=500, queryset=None):
+        """Rescore every farmer (or the given queryset) in batches"""
+        queryset = queryset if queryset is not None else Farmer.objects.all()
+        processed = 0
+        last_id = None
+
+        while True:
+            batch_query = queryset.order_by('id')
+            if last_id is not None:
+                batch_query = batch_query.filter(id__gt=last_id)
+            farmers = list(batch_query[:batch_size])
+            if not farmers:
+                break
+
+            self.rescore_batch(farmers)
+            processed += len(farmers)
+            last_id = farmers[-1].id
+            logger.info(f"Rescored {processed} farmers")
+
+        return {'processed': processed}
+
+    @staticmethod
+    def get_loan_explanation(loan):
+        """
+        Return the stored explanation behind a loan decision.
+
+        Uses the latest explanation computed at or before the decision date,
+        which is a single indexed lookup on (farmer, created_at). Returns
+        None when none existed yet; a later explanation was not the basis
+        of the decision.
+        """
+        decided_at = loan.approval_date or loan.application_date
+        if not decided_at:
+            return None
+        return CreditScoreExplanation.objects.filter(
+            farmer_id=loan.farmer_id, created_at__lte=decided_at
+        ).first()
+
+    async def arescore_all(self, batch_size=500):
+        """Async wrapper for use from Celery tasks"""
+        return await sync_to_async(self.rescore_all)(batch_size=batch_size)
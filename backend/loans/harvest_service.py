@@ -7,6 +7,7 @@ from asgiref.sync import sync_to_async
 from decimal import Decimal
 from .models import Loan, CropCycle, HarvestBasedPaymentSchedule, HarvestPaymentInstallment
 from .services import SMSService
+from .outbox_service import queue_sms
 
 class HarvestBasedLoanService:
     def __init__(self):
@@ -66,21 +67,21 @@ class HarvestBasedLoanService:
                 
                 # Update loan due date
                 loan.due_date = crop_cycle.expected_harvest_date + timedelta(days=30)
-                loan.save()
+                loan.save(update_fields=['due_date'])
+                
+                # Notify farmer
+                queue_sms(
+                    loan.farmer.phone_number,
+                    f"Your loan repayment schedule has been created based on your expected harvest date "
+                    f"({crop_cycle.expected_harvest_date.strftime('%d-%b-%Y')}). "
+                    f"First payment of {harvest_payment} RWF is due one week after harvest."
+                )
                 
                 return schedule
         
         try:
             schedule = await create_schedule()
             
-            # Notify farmer
-            await self.sms_service.send_sms(
-                loan.farmer.phone_number,
-                f"Your loan repayment schedule has been created based on your expected harvest date "
-                f"({crop_cycle.expected_harvest_date.strftime('%d-%b-%Y')}). "
-                f"First payment of {harvest_payment} RWF is due one week after harvest."
-            )
-            
             return True, schedule
         except Exception as e:
             return False, str(e)
@@ -98,20 +99,20 @@ class HarvestBasedLoanService:
                 # Update the loan due date
                 loan = schedule.loan
                 loan.due_date = loan.due_date + timedelta(days=delay_days)
-                loan.save()
+                loan.save(update_fields=['due_date'])
+                
+                # Notify farmer
+                queue_sms(
+                    loan.farmer.phone_number,
+                    f"Due to weather conditions, your loan repayment dates have been adjusted. "
+                    f"Your new payment dates have been extended by {delay_days} days."
+                )
                 
                 return schedule
         
         try:
             updated_schedule = await update_schedule()
             
-            # Notify farmer
-            await self.sms_service.send_sms(
-                schedule.loan.farmer.phone_number,
-                f"Due to weather conditions, your loan repayment dates have been adjusted. "
-                f"Your new payment dates have been extended by {delay_days} days."
-            )
-            
             return True, updated_schedule
         except Exception as e:
             return False, str(e)
\ No newline at end of file
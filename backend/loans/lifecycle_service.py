@@ -1,13 +1,36 @@
+import logging
+import time
+import uuid
+from decimal import Decimal
 from django.utils import timezone
 from asgiref.sync import sync_to_async
 from django.db import transaction
-from .models import Loan
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.functions import Greatest
+from .models import Loan, PaymentSchedule
 from .repayment_service import RepaymentService
 from .notification_service import NotificationService
 from .momo_integration import MoMoAPI
 from datetime import timedelta  
-from .services import LoanService
+from .services import BULK_QUERY_CHUNK_SIZE, LoanService, _chunks
 from .sms_service import SMSService
+from .outbox_service import queue_sms, queue_sms_batch
+from .allocation_service import OPEN_SCHEDULE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Bulk transitions: action -> (statuses a loan may move from, status it moves to)
+LOAN_TRANSITIONS = {
+    'approve': (('PENDING',), 'APPROVED'),
+    'reject': (('PENDING',), 'REJECTED'),
+    'complete': (('DISBURSED', 'ACTIVE', 'OVERDUE'), 'PAID'),
+}
+# SMS sent to the farmer of each loan a bulk transition moves
+TRANSITION_MESSAGES = {
+    'approve': NotificationService.loan_approval_message,
+    'reject': NotificationService.loan_rejection_message,
+    'complete': NotificationService.loan_completion_message,
+}
 
 class LoanLifecycleService:
     """Service to manage the complete lifecycle of a loan"""
@@ -30,27 +53,24 @@ class LoanLifecycleService:
                         if loan.status != 'PENDING':
                             return None, "Loan is not in PENDING status"
                         
-                        loan.status = 'APPROVED'
-                        loan.approval_date = timezone.now()
-                        
-                        if approved_amount is not None:
-                            loan.amount_approved = approved_amount
-                        else:
-                            loan.amount_approved = loan.amount_requested
-                            
-                        loan.save()
+                        loan.approve(
+                            approved_amount if approved_amount is not None else loan.amount_requested
+                        )
+                        loan.save(update_fields=Loan.APPROVAL_FIELDS)
                         
-                        # Get the farmer's phone number while we're in the sync context
-                        phone_number = loan.farmer.phone_number
-                        amount = loan.amount_approved
+                        # Approval notification commits together with the approval
+                        queue_sms(
+                            loan.farmer.phone_number,
+                            self.notification_service.loan_approval_message(loan)
+                        )
                         
-                        return loan, None, phone_number, amount
+                        return loan, None
                     except Loan.DoesNotExist:
-                        return None, "Loan not found", None, None
+                        return None, "Loan not found"
                     except Exception as e:
-                        return None, str(e), None, None
+                        return None, str(e)
             
-            loan, error, phone_number, amount = await get_and_update_loan()
+            loan, error = await get_and_update_loan()
             
             if error:
                 return False, error
@@ -58,17 +78,6 @@ class LoanLifecycleService:
             if not loan:
                 return False, "Could not approve loan"
             
-            # Send approval notification
-            try:
-                message = (
-                    f"Your loan application for {amount} RWF has been approved! "
-                    f"Funds will be disbursed shortly."
-                )
-                await self.sms_service.send_sms(phone_number, message)
-            except Exception as e:
-                # Log the error but don't fail the approval
-                print(f"SMS notification failed: {e}")
-            
             return True, loan
         
         except Exception as e:
@@ -103,7 +112,11 @@ class LoanLifecycleService:
                     loan.disbursement_date = timezone.now()
                     # Calculate due date based on loan product duration
                     loan.due_date = timezone.now() + timedelta(days=loan.loan_product.duration_days)
-                    loan.save()
+                    loan.save(update_fields=['status', 'disbursement_date', 'due_date'])
+                    queue_sms(
+                        loan.farmer.phone_number,
+                        self.notification_service.loan_disbursement_message(loan)
+                    )
                     return loan
             
             updated_loan = await update_loan()
@@ -112,9 +125,6 @@ class LoanLifecycleService:
             loan_service = LoanService()
             await loan_service.create_payment_schedule(updated_loan)
             
-            # Send disbursement notification
-            await self.notification_service.send_loan_disbursement_notification(updated_loan)
-            
             return True, updated_loan
             
         except Exception as e:
@@ -135,8 +145,8 @@ class LoanLifecycleService:
                             return loan, None
                         
                         # Verify all schedules are paid
-                        unpaid = loan.paymentschedule_set.filter(
-                            status__in=['PENDING', 'PARTIAL']
+                        unpaid = loan.payment_schedules.filter(
+                            status__in=OPEN_SCHEDULE_STATUSES
                         ).exists()
                         
                         if unpaid:
@@ -144,8 +154,11 @@ class LoanLifecycleService:
                         
                         print(f"[DEBUG] Marking loan {loan_id} as PAID")
                         loan.status = 'PAID'
-                        loan.completion_date = timezone.now()
-                        loan.save()
+                        loan.save(update_fields=['status'])
+                        queue_sms(
+                            loan.farmer.phone_number,
+                            self.notification_service.loan_completion_message(loan)
+                        )
                         return loan, None
                     except Loan.DoesNotExist:
                         return None, "Loan not found"
@@ -159,14 +172,162 @@ class LoanLifecycleService:
             if not loan:
                 return False, "Could not complete loan"
             
-            # Send completion notification
-            try:
-                await self.notification_service.send_loan_completion_notification(loan)
-            except Exception as e:
-                print(f"SMS notification failed: {e}")
-                # Don't fail the completion just because SMS failed
-            
             return True, "Loan marked as completed"
             
         except Exception as e:
-            return False, f"Error completing loan: {str(e)}"
\ No newline at end of file
+            return False, f"Error completing loan: {str(e)}"
+
+
+class BulkLoanLifecycle:
+    """
+    Moves many loans through one lifecycle transition at a time.
+
+    Loans are handled in chunks. Each chunk is locked and every loan in it
+    is checked against LOAN_TRANSITIONS before anything changes. The loans
+    that may move are then updated with one UPDATE, and their farmers' SMS
+    are queued with one bulk insert, in the same transaction. Approved loans
+    are paid by BulkDisbursementRunner, which is queued once the approvals
+    commit.
+    """
+
+    def __init__(self, chunk_size=BULK_QUERY_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def schedule_disbursement():
+        """Queue a bulk disbursement run for newly approved loans"""
+        from .tasks import disburse_approved_loans
+
+        try:
+            disburse_approved_loans.delay()
+        except Exception as e:
+            # The loans stay APPROVED and are paid by the next run
+            logger.warning(f"Could not queue bulk disbursement: {str(e)}")
+
+    def transition(self, action, loan_ids, approved_amounts=None, disburse=True):
+        """
+        Apply one transition to many loans.
+
+        Args:
+            action: Key of LOAN_TRANSITIONS
+            loan_ids: Loan ids, in the order results are wanted
+            approved_amounts: Optional {loan_id: amount} for approve; other
+                loans are approved for the amount requested
+            disburse: Queue a bulk disbursement run after approving
+
+        Returns:
+            Dictionary with per-loan results, in input order, and counts.
+            A loan already in the target status counts as a success but is
+            not moved or notified again.
+        """
+        if action not in LOAN_TRANSITIONS:
+            raise ValueError(f"Unknown loan transition: {action}")
+        started = time.perf_counter()
+        amounts = {
+            self._parse_id(loan_id): Decimal(str(amount))
+            for loan_id, amount in (approved_amounts or {}).items()
+        }
+
+        loan_ids = list(dict.fromkeys(loan_ids))
+        results = {}
+        ids = []
+        for loan_id in loan_ids:
+            parsed = self._parse_id(loan_id)
+            if parsed is None:
+                results[str(loan_id)] = self._result(loan_id, False, None, "Invalid loan id")
+            else:
+                ids.append(parsed)
+
+        moved = 0
+        for chunk in _chunks(list(dict.fromkeys(ids)), self.chunk_size):
+            moved += self._transition_chunk(action, chunk, amounts, results)
+
+        if action == 'approve' and disburse and moved:
+            transaction.on_commit(self.schedule_disbursement)
+
+        ordered = [results[str(self._parse_id(loan_id) or loan_id)] for loan_id in loan_ids]
+        succeeded = sum(1 for result in ordered if result['success'])
+        summary = {
+            'action': action,
+            'requested': len(ordered),
+            'moved': moved,
+            'succeeded': succeeded,
+            'failed': len(ordered) - succeeded,
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        }
+        logger.info(f"Bulk loan transition: {summary}")
+        return {**summary, 'results': ordered}
+
+    def _transition_chunk(self, action, loan_ids, amounts, results):
+        """Validate, update and notify one chunk in a transaction; returns loans moved"""
+        sources, target = LOAN_TRANSITIONS[action]
+        now = timezone.now()
+
+        with transaction.atomic():
+            loans = Loan.objects.select_for_update(of=('self',)).select_related('farmer').in_bulk(loan_ids)
+            unpaid = set()
+            if action == 'complete':
+                unpaid = set(
+                    PaymentSchedule.objects.filter(
+                        loan_id__in=loan_ids, status__in=OPEN_SCHEDULE_STATUSES
+                    ).values_list('loan_id', flat=True).distinct()
+                )
+
+            movable = []
+            for loan_id in loan_ids:
+                loan = loans.get(loan_id)
+                if loan is None:
+                    results[str(loan_id)] = self._result(loan_id, False, None, "Loan not found")
+                elif loan.status == target:
+                    results[str(loan_id)] = self._result(loan_id, True, target, f"Already {target}")
+                elif loan.status not in sources:
+                    results[str(loan_id)] = self._result(
+                        loan_id, False, loan.status, f"Cannot {action} a loan in {loan.status} status"
+                    )
+                elif loan_id in unpaid:
+                    results[str(loan_id)] = self._result(loan_id, False, loan.status, "Loan has unpaid schedules")
+                elif action == 'approve' and amounts.get(loan_id, loan.amount_requested) <= 0:
+                    results[str(loan_id)] = self._result(
+                        loan_id, False, loan.status, "Approved amount must be positive"
+                    )
+                else:
+                    movable.append(loan)
+            if not movable:
+                return 0
+
+            changes = {'status': target}
+            if action == 'approve':
+                approved = Case(
+                    *[When(id=loan.id, then=Value(amounts[loan.id])) for loan in movable if loan.id in amounts],
+                    default=F('amount_requested'),
+                    output_field=DecimalField(max_digits=10, decimal_places=2)
+                )
+                changes.update(
+                    approval_date=now,
+                    amount_approved=approved,
+                    outstanding_balance=Greatest(approved - F('total_repaid'), Value(Decimal('0'))),
+                    disbursement_status='PENDING'
+                )
+                for loan in movable:
+                    loan.amount_approved = amounts.get(loan.id, loan.amount_requested)
+            Loan.objects.filter(id__in=[loan.id for loan in movable], status__in=sources).update(**changes)
+
+            queue_sms_batch(
+                (loan.farmer.phone_number, TRANSITION_MESSAGES[action](loan))
+                for loan in movable
+            )
+
+        for loan in movable:
+            results[str(loan.id)] = self._result(loan.id, True, target, None)
+        return len(movable)
+
+    @staticmethod
+    def _parse_id(loan_id):
+        try:
+            return uuid.UUID(str(loan_id))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _result(loan_id, success, loan_status, reason):
+        return {'loan_id': str(loan_id), 'success': success, 'status': loan_status, 'reason': reason}
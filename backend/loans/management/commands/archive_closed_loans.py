@@ -0,0 +1,64 @@
+# backend/loans/management/commands/archive_closed_loans.py
+import json
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from loans.archive_service import ARCHIVE_BATCH_SIZE, LoanArchiver
+
+
+class Command(BaseCommand):
+    help = 'Moves transactions and repayments of long-closed loans to compressed archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help='Archive loans with no payment activity since this day (YYYY-MM-DD); defaults to a year ago'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ARCHIVE_BATCH_SIZE,
+            help='Number of loans archived per batch'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches; the next run carries on'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count what would be archived without writing or deleting'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = None
+        if options['before']:
+            day = parse_date(options['before'])
+            if day is None:
+                raise CommandError(f"Invalid date: {options['before']}")
+            cutoff = timezone.make_aware(datetime.combine(day, time.min))
+
+        result = LoanArchiver(batch_size=options['batch_size']).run(
+            cutoff=cutoff,
+            max_batches=options['max_batches'],
+            dry_run=options['dry_run'],
+            on_batch=self.write_batch
+        )
+
+        self.stdout.write(json.dumps(result, indent=2))
+        verb = 'Would archive' if result['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['loans']} loans: {result['transactions']} transactions and "
+            f"{result['repayments']} repayments in {result['elapsed_seconds']:.1f}s "
+            f"({result['rows_per_second']} rows/s)"
+        ))
+
+    def write_batch(self, metrics):
+        self.stdout.write(
+            f"Batch {metrics['batch']}: {metrics['loans']} loans, {metrics['transactions']} transactions, "
+            f"{metrics['repayments']} repayments, {metrics['bytes']} bytes in {metrics['elapsed_seconds']:.1f}s"
+        )
@@ -0,0 +1,104 @@
+# backend/loans/management/commands/benchmark_credit_scoring.py
+import json
+import random
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from loans.benchmarks import (
+    Timer, compare_to_baseline, count_queries, generate_population,
+    stub_external_services, summarise, write_baseline
+)
+from loans.risk_service import EnhancedCreditScoring
+from loans.services import DynamicCreditScoringService, LoanService
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks credit scoring cost against synthetic portfolios of increasing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Portfolio sizes (number of farmers) to benchmark'
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=200,
+            help='Number of farmers scored per scorer at each scale'
+        )
+        parser.add_argument(
+            '--baseline',
+            default='benchmarks/credit_scoring.json',
+            help='JSON baseline file to compare against'
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Overwrite the baseline with this run'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the generated population instead of rolling it back'
+        )
+
+    def handle(self, *args, **options):
+        results = {'generated_at': timezone.now().isoformat(), 'sample': options['sample'], 'scales': {}}
+
+        # The synthetic data lives in a savepoint per scale and is rolled
+        # back afterwards unless --keep is given. async_to_sync keeps the
+        # scorers' sync_to_async queries on this thread's connection.
+        with transaction.atomic():
+            for seed, scale in enumerate(options['scales']):
+                with transaction.atomic():
+                    start = time.perf_counter()
+                    farmers = generate_population(scale, seed=seed)
+                    self.stdout.write(
+                        f"Generated {scale} farmers in {time.perf_counter() - start:.1f}s"
+                    )
+
+                    sample = random.Random(seed).sample(farmers, min(options['sample'], len(farmers)))
+                    results['scales'][str(scale)] = self.measure(sample)
+
+                    if not options['keep']:
+                        transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+        regressions = compare_to_baseline(results, options['baseline'])
+        if options['update_baseline']:
+            write_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+        elif regressions:
+            raise CommandError("Regressions against baseline:\n" + "\n".join(regressions))
+
+    def measure(self, farmers):
+        """Time each scorer over the sampled farmers"""
+        enhanced = EnhancedCreditScoring()
+        dynamic = DynamicCreditScoringService()
+        scorers = {
+            'loan_service': LoanService.calculate_credit_score,
+            'enhanced': async_to_sync(enhanced.calculate_score),
+            'dynamic': async_to_sync(dynamic.generate_credit_score),
+        }
+
+        results = {}
+        with stub_external_services(enhanced), stub_external_services(dynamic):
+            for name, score in scorers.items():
+                timer = Timer()
+                queries = 0
+                for farmer in farmers:
+                    with count_queries() as captured, timer.measure():
+                        score(farmer)
+                    queries += len(captured)
+
+                results[name] = summarise(timer.samples)
+                results[name]['queries_per_call'] = round(queries / len(farmers), 2)
+        return results
@@ -0,0 +1,83 @@
+# backend/loans/management/commands/benchmark_ml_scoring.py
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+
+from farmers.models import Farmer
+from loans.benchmarks import Timer, stub_external_services, summarise
+from loans.risk_service import EnhancedCreditScoring, ModelCreditScoring, get_scoring_model
+
+
+class Command(BaseCommand):
+    help = 'Compares per-request latency of EnhancedCreditScoring and ModelCreditScoring'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farmers',
+            type=int,
+            default=200,
+            help='Number of farmers to score'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Batch size for the batched model path'
+        )
+
+    async def handle_async(self, *args, **options):
+        farmers = await sync_to_async(
+            lambda: list(Farmer.objects.all()[:options['farmers']])
+        )()
+        if not farmers:
+            raise CommandError("No farmers to score; load or generate data first")
+
+        # Load the artifact up front so it is reported separately from scoring
+        start = time.perf_counter()
+        try:
+            await sync_to_async(get_scoring_model)()
+        except Exception as e:
+            raise CommandError(f"Could not load scoring model: {str(e)}")
+        load_seconds = time.perf_counter() - start
+
+        enhanced_timer = Timer()
+        with stub_external_services(EnhancedCreditScoring()) as enhanced:
+            for farmer in farmers:
+                with enhanced_timer.measure():
+                    await enhanced.calculate_score(farmer)
+
+        model = ModelCreditScoring()
+        single_timer = Timer()
+        for farmer in farmers:
+            with single_timer.measure():
+                await model.calculate_score(farmer)
+
+        batch_timer = Timer()
+        batch_size = options['batch_size']
+        for i in range(0, len(farmers), batch_size):
+            with batch_timer.measure():
+                await model.score_batch(farmers[i:i + batch_size])
+
+        # Express batched cost per request so the three rows are comparable
+        per_request = [
+            sample / len(farmers[i * batch_size:(i + 1) * batch_size])
+            for i, sample in enumerate(batch_timer.samples)
+        ]
+        batched = summarise(per_request, items=len(per_request))
+        batched['throughput_per_s'] = summarise(batch_timer.samples, items=len(farmers))['throughput_per_s']
+
+        return {
+            'farmers': len(farmers),
+            'model_load_ms': round(load_seconds * 1000, 3),
+            'enhanced': summarise(enhanced_timer.samples),
+            'model_single': summarise(single_timer.samples),
+            'model_batched': batched,
+        }
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        results = asyncio.run(self.handle_async(*args, **options))
+        self.stdout.write(json.dumps(results, indent=2))
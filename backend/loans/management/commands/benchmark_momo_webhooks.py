@@ -0,0 +1,136 @@
+# backend/loans/management/commands/benchmark_momo_webhooks.py
+import json
+import random
+import time
+import uuid
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from loans.benchmarks import Timer, generate_population, summarise
+from loans.models import Loan
+from loans.webhook_service import MoMoWebhookService, WebhookEventWorker
+
+
+class Command(BaseCommand):
+    help = 'Measures MoMo callback throughput for a burst of callbacks, inline versus queued'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farmers',
+            type=int,
+            default=2000,
+            help='Size of the synthetic portfolio to generate'
+        )
+        parser.add_argument(
+            '--callbacks',
+            type=int,
+            default=1000,
+            help='Number of distinct callbacks in the burst'
+        )
+        parser.add_argument(
+            '--duplicates',
+            type=float,
+            default=0.1,
+            help='Fraction of callbacks that MTN retries'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Worker micro-batch size'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the portfolio and the burst'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Everything is rolled back; MoMo is never called when applying repayments
+        with transaction.atomic(), patch('loans.repayment_service.MoMoAPI'):
+            start = time.perf_counter()
+            generate_population(options['farmers'], seed=options['seed'])
+            self.stdout.write(
+                f"Generated {options['farmers']} farmers in {time.perf_counter() - start:.1f}s"
+            )
+
+            loan_ids = list(Loan.objects.filter(
+                status__in=['ACTIVE', 'OVERDUE'], outstanding_balance__gt=0
+            ).values_list('id', flat=True))
+            if not loan_ids:
+                raise CommandError("Generated portfolio has no loans to repay")
+
+            results = {
+                'callbacks': options['callbacks'],
+                'loans': min(len(loan_ids), options['callbacks']),
+            }
+
+            with transaction.atomic():
+                results['inline'] = self.measure_inline(self.burst(rng, loan_ids, options))
+                transaction.set_rollback(True)
+
+            with transaction.atomic():
+                results.update(self.measure_queued(self.burst(rng, loan_ids, options), options))
+                transaction.set_rollback(True)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def burst(self, rng, loan_ids, options):
+        """Build callback payloads, with retried callbacks shuffled into the burst"""
+        payloads = [
+            {
+                'financialTransactionId': uuid.uuid4().hex,
+                'externalId': str(rng.choice(loan_ids)),
+                'amount': str(Decimal(rng.randint(5, 50))),
+                'currency': 'RWF',
+                'payer': {'partyIdType': 'MSISDN', 'partyId': '250780000000'},
+                'status': 'SUCCESSFUL'
+            }
+            for _ in range(options['callbacks'])
+        ]
+        payloads += rng.sample(payloads, int(len(payloads) * options['duplicates']))
+        rng.shuffle(payloads)
+        return payloads
+
+    def measure_inline(self, payloads):
+        """Record and apply each callback inside the request, as before"""
+        service = MoMoWebhookService()
+        process_event = async_to_sync(service.process_event)
+        timer = Timer()
+        for payload in payloads:
+            with timer.measure():
+                event, created = MoMoWebhookService.record_event(payload)
+                if created:
+                    process_event(event)
+        return summarise(timer.samples)
+
+    def measure_queued(self, payloads, options):
+        """Record callbacks on the request path, then drain them with the worker"""
+        timer = Timer()
+        duplicates = 0
+        for payload in payloads:
+            with timer.measure():
+                _, created = MoMoWebhookService.record_event(payload)
+            duplicates += not created
+
+        worker = WebhookEventWorker(batch_size=options['batch_size'])
+        drained = async_to_sync(worker.drain)()
+
+        accepted = summarise(timer.samples)
+        accepted['duplicates_rejected'] = duplicates
+        return {
+            'accept': accepted,
+            'drain': drained,
+            'end_to_end_per_second': round(
+                len(payloads) / (sum(timer.samples) + drained['elapsed_seconds']), 1
+            )
+        }
@@ -0,0 +1,121 @@
+# backend/loans/management/commands/benchmark_payment_allocation.py
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from loans.allocation_service import OPEN_SCHEDULE_STATUSES, PaymentAllocationService, allocate
+from loans.benchmarks import Timer, count_queries, generate_population, summarise
+from loans.models import PaymentSchedule
+
+
+def save_per_schedule(loan_id, amount):
+    """The previous allocation strategy: read schedules, save() each one touched"""
+    schedules = PaymentSchedule.objects.filter(
+        loan_id=loan_id, status__in=OPEN_SCHEDULE_STATUSES
+    ).order_by('due_date')
+    remaining = amount
+    for schedule in schedules:
+        if remaining <= 0:
+            break
+        due = schedule.amount + schedule.penalty_amount - schedule.amount_paid
+        paid = min(remaining, due)
+        schedule.amount_paid += paid
+        schedule.status = 'PAID' if paid == due else 'PARTIAL'
+        remaining -= paid
+        schedule.save()
+
+
+class Command(BaseCommand):
+    help = 'Measures the cost per payment of allocating repayments across schedules'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farmers',
+            type=int,
+            default=2000,
+            help='Size of the synthetic portfolio to generate'
+        )
+        parser.add_argument(
+            '--payments',
+            type=int,
+            default=500,
+            help='Number of payments to allocate per strategy'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the portfolio and payment amounts'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Everything, including the generated portfolio, is rolled back
+        with transaction.atomic():
+            start = time.perf_counter()
+            generate_population(options['farmers'], seed=options['seed'])
+            self.stdout.write(
+                f"Generated {options['farmers']} farmers in {time.perf_counter() - start:.1f}s"
+            )
+
+            open_schedules = {}
+            for schedule in PaymentSchedule.objects.filter(
+                status__in=OPEN_SCHEDULE_STATUSES
+            ).order_by('due_date', 'installment_number'):
+                open_schedules.setdefault(schedule.loan_id, []).append(schedule)
+            if not open_schedules:
+                raise CommandError("Generated portfolio has no open schedules")
+
+            # Pay between half an installment and two and a half installments
+            payments = [
+                (loan_id, (schedules[0].amount * Decimal(rng.randint(5, 25)) / 10).quantize(Decimal('0.01')))
+                for loan_id, schedules in rng.choices(list(open_schedules.items()), k=options['payments'])
+            ]
+
+            results = {
+                'farmers': options['farmers'],
+                'payments': len(payments),
+                'in_memory': self.measure_in_memory(open_schedules, payments),
+                'allocate_payment': self.measure_db(PaymentAllocationService.allocate_payment, payments),
+                'save_per_schedule': self.measure_db(save_per_schedule, payments),
+            }
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def measure_in_memory(self, open_schedules, payments):
+        """Allocation arithmetic only, on schedules already loaded"""
+        timer = Timer()
+        for loan_id, amount in payments:
+            schedules = [
+                PaymentSchedule(**{
+                    field: getattr(schedule, field)
+                    for field in ('id', 'installment_number', 'amount', 'interest_amount',
+                                  'penalty_amount', 'amount_paid', 'status')
+                })
+                for schedule in open_schedules[loan_id]
+            ]
+            with timer.measure():
+                allocate(schedules, amount)
+        return summarise(timer.samples)
+
+    def measure_db(self, allocate_payment, payments):
+        """Full allocation including locking and writes, rolled back afterwards"""
+        timer = Timer()
+        queries = 0
+        with transaction.atomic():
+            for loan_id, amount in payments:
+                with count_queries() as captured, timer.measure():
+                    allocate_payment(loan_id, amount)
+                queries += len(captured)
+            transaction.set_rollback(True)
+
+        results = summarise(timer.samples)
+        results['queries_per_payment'] = round(queries / len(payments), 2)
+        return results
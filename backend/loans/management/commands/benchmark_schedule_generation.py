@@ -0,0 +1,169 @@
+# backend/loans/management/commands/benchmark_schedule_generation.py
+import json
+import random
+import time
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from loans.benchmarks import count_queries, generate_population
+from loans.models import Loan, LoanProduct, PaymentSchedule
+from loans.schedule_service import BulkScheduleGenerator, to_minor_units
+from loans.services import LoanService
+
+
+class Command(BaseCommand):
+    help = 'Compares per-loan and bulk payment schedule generation for a batch of disbursed loans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loans',
+            type=int,
+            default=2000,
+            help='Number of disbursed loans to schedule'
+        )
+        parser.add_argument(
+            '--harvest-share',
+            type=float,
+            default=0.3,
+            help='Fraction of loans repaid on harvest dates instead of monthly'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for loan amounts, products and harvest dates'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+
+        # Everything, including the generated loans, is rolled back
+        with transaction.atomic():
+            farmers = generate_population(max(options['loans'] // 10, 1), seed=options['seed'])
+            products = [
+                LoanProduct.objects.create(
+                    name=f"Schedule Benchmark {months} Months",
+                    description="Synthetic product for schedule benchmarks",
+                    min_amount=Decimal('100.00'),
+                    max_amount=Decimal('100000.00'),
+                    interest_rate=Decimal(rate),
+                    duration_days=30 * months,
+                )
+                for months, rate in ((3, '9.50'), (6, '12.00'), (12, '14.75'))
+            ]
+            loans = Loan.objects.bulk_create([
+                Loan(
+                    farmer=rng.choice(farmers),
+                    loan_product=rng.choice(products),
+                    amount_requested=amount,
+                    amount_approved=amount,
+                    status='DISBURSED',
+                    disbursement_date=now - timedelta(days=rng.randint(0, 60)),
+                )
+                for amount in (
+                    Decimal(rng.randint(10000, 500000)) / 100 for _ in range(options['loans'])
+                )
+            ])
+            loans = list(Loan.objects.filter(id__in=[loan.id for loan in loans]).select_related('loan_product'))
+            harvest_dates = {
+                loan.id: [
+                    (now + timedelta(days=rng.randint(60, 360))).date()
+                    for _ in range(rng.randint(1, 3))
+                ]
+                for loan in loans if rng.random() < options['harvest_share']
+            }
+
+            per_loan, per_loan_schedules = self.measure(lambda: self.per_loan(loans, harvest_dates), products)
+            per_loan['principal_drift_loans'] = self.principal_drift(loans, per_loan_schedules)
+
+            bulk, bulk_schedules = self.measure(lambda: BulkScheduleGenerator().generate(loans, harvest_dates), products)
+            bulk['principal_drift_loans'] = self.principal_drift(loans, bulk_schedules)
+
+            # Amortisation and object construction alone, without the INSERTs
+            start = time.perf_counter()
+            BulkScheduleGenerator().build(loans, harvest_dates)
+            bulk['build_seconds'] = round(time.perf_counter() - start, 3)
+
+            transaction.set_rollback(True)
+
+        results = {
+            'loans': len(loans),
+            'harvest_loans': len(harvest_dates),
+            'per_loan': per_loan,
+            'bulk': bulk,
+            'speedup': round(per_loan['elapsed_seconds'] / bulk['elapsed_seconds'], 1) if bulk['elapsed_seconds'] else None,
+            'max_installment_difference': str(self.max_difference(per_loan_schedules, bulk_schedules)),
+        }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    @staticmethod
+    def per_loan(loans, harvest_dates):
+        """The current path: one create_payment_schedule or create_harvest_based_schedule call per loan"""
+        service = LoanService()
+        # The per-loan harvest path stores naive dates in a DateTimeField
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for loan in loans:
+                if loan.id in harvest_dates:
+                    async_to_sync(service.create_harvest_based_schedule)(loan, list(harvest_dates[loan.id]))
+                else:
+                    async_to_sync(service.create_payment_schedule)(loan)
+
+    @staticmethod
+    def measure(generate, products):
+        """
+        Time one strategy inside a savepoint that is rolled back afterwards.
+
+        Only schedules of loans on the benchmark products are reported.
+
+        Returns:
+            Tuple of (metrics, saved schedules keyed by loan then installment)
+        """
+        with transaction.atomic():
+            with count_queries() as captured:
+                start = time.perf_counter()
+                generate()
+                elapsed = time.perf_counter() - start
+
+            schedules = {}
+            for row in PaymentSchedule.objects.filter(loan__loan_product__in=products).values(
+                'loan_id', 'installment_number', 'principal_amount', 'amount'
+            ):
+                schedules.setdefault(row['loan_id'], {})[row['installment_number']] = row
+            transaction.set_rollback(True)
+
+        count = sum(len(installments) for installments in schedules.values())
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'schedules': count,
+            'schedules_per_second': round(count / elapsed, 1) if elapsed else 0.0,
+            'queries': len(captured),
+        }, schedules
+
+    @staticmethod
+    def principal_drift(loans, schedules):
+        """Loans whose stored principal does not add up to the amount approved"""
+        return sum(
+            1 for loan in loans
+            if sum(to_minor_units(row['principal_amount']) for row in schedules.get(loan.id, {}).values())
+            != to_minor_units(loan.amount_approved)
+        )
+
+    @staticmethod
+    def max_difference(expected, actual):
+        """Largest installment amount difference between two strategies"""
+        return max(
+            (
+                abs(row['amount'] - actual.get(loan_id, {}).get(number, {}).get('amount', Decimal('0')))
+                for loan_id, installments in expected.items()
+                for number, row in installments.items()
+            ),
+            default=Decimal('0')
+        )
@@ -0,0 +1,201 @@
+# backend/loans/management/commands/benchmark_token_redemption.py
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from authentication.models import User
+from farmers.models import Farmer
+from loans.benchmarks import Timer, count_queries, summarise
+from loans.models import ApprovedVendor, Loan, LoanProduct, LoanToken, TokenTransaction
+from loans.tokenization_service import TokenizedLoanService
+
+
+async def redeem_read_modify_write(service, token_code, vendor_id, amount):
+    """The previous redemption strategy: read the token, pay, then save the new balance"""
+    @sync_to_async
+    def get_token():
+        return LoanToken.objects.select_related('loan__farmer').filter(
+            token=token_code, status='ACTIVE', amount__gte=amount
+        ).first()
+
+    loan_token = await get_token()
+    if not loan_token:
+        return False, "Invalid or insufficient token"
+
+    vendor = await sync_to_async(
+        lambda: ApprovedVendor.objects.filter(id=vendor_id, is_active=True).first()
+    )()
+    if not vendor:
+        return False, "Vendor not approved"
+
+    try:
+        result = await service.momo_api.initiate_disbursement(
+            loan_id=loan_token.loan.id, amount=amount, phone_number=vendor.phone_number
+        )
+    except Exception:
+        return False, "Payment failed"
+
+    @sync_to_async
+    def update_token():
+        with transaction.atomic():
+            loan_token.amount -= amount
+            if loan_token.amount <= 0:
+                loan_token.status = 'USED'
+            loan_token.save()
+            TokenTransaction.objects.create(
+                token=loan_token, vendor=vendor, amount=amount, reference=result['reference']
+            )
+
+    await update_token()
+    return True, "Transaction successful"
+
+
+class Command(BaseCommand):
+    help = 'Fires simultaneous redemptions at one token and checks for overspend, old versus new strategy'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--redemptions',
+            type=int,
+            default=500,
+            help='Simultaneous redemptions against the token'
+        )
+        parser.add_argument(
+            '--balance',
+            type=Decimal,
+            default=Decimal('10000'),
+            help='Starting token balance'
+        )
+        parser.add_argument(
+            '--amount',
+            type=Decimal,
+            default=Decimal('100'),
+            help='Amount of each redemption'
+        )
+        parser.add_argument(
+            '--payout-latency-ms',
+            type=float,
+            default=20.0,
+            help='Simulated MoMo payout latency'
+        )
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0.05,
+            help='Fraction of payouts that fail'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for payout failures'
+        )
+
+    def handle(self, *args, **options):
+        results = {
+            'redemptions': options['redemptions'],
+            'balance': str(options['balance']),
+            'amount': str(options['amount']),
+        }
+
+        # Everything is rolled back; MoMo is simulated
+        with transaction.atomic():
+            token_code, vendor_id = self.create_token(options['balance'])
+
+            for name, redeem in (
+                ('read_modify_write', redeem_read_modify_write),
+                ('conditional_reserve', lambda service, *args: service.process_token_redemption(*args)),
+            ):
+                with transaction.atomic():
+                    with count_queries() as captured:
+                        results[name] = async_to_sync(self.measure)(redeem, token_code, vendor_id, options)
+                    # Includes the audit queries at the end of measure()
+                    results[name]['queries_per_redemption'] = round(len(captured) / options['redemptions'], 2)
+                    transaction.set_rollback(True)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def create_token(self, balance):
+        user = User.objects.create(
+            username=f"bench_token_{uuid.uuid4().hex[:8]}",
+            password="benchmark",
+            role="FARMER",
+            phone_number="+250780000001"
+        )
+        farmer = Farmer.objects.create(
+            user=user, name="Benchmark Farmer", phone_number="+250780000001",
+            location="Kigali", farm_size=2
+        )
+        product = LoanProduct.objects.create(
+            name="Benchmark Input Loan", description="Token redemption benchmark",
+            min_amount=Decimal('1'), max_amount=balance, interest_rate=Decimal('10'), duration_days=90
+        )
+        loan = Loan.objects.create(
+            farmer=farmer, loan_product=product, amount_requested=balance,
+            amount_approved=balance, status='DISBURSED'
+        )
+        token = LoanToken.objects.create(
+            loan=loan, token=str(uuid.uuid4()), amount=balance, status='ACTIVE',
+            expiry_date=timezone.now() + timedelta(days=30)
+        )
+        vendor = ApprovedVendor.objects.create(
+            name="Benchmark Agro Dealer", phone_number="+250780000002",
+            location="Kigali", business_type='GENERAL'
+        )
+        return token.token, vendor.id
+
+    async def measure(self, redeem, token_code, vendor_id, options):
+        """Run all redemptions at once against a simulated MoMo and audit the token afterwards"""
+        rng = random.Random(options['seed'])
+        amount = options['amount']
+        paid_out = []
+
+        async def payout(loan_id, amount, phone_number):
+            await asyncio.sleep(options['payout_latency_ms'] / 1000)
+            if rng.random() < options['failure_rate']:
+                raise Exception("Simulated payout failure")
+            paid_out.append(amount)
+            return {'status': 'pending', 'reference': str(uuid.uuid4())}
+
+        service = TokenizedLoanService()
+        service.momo_api.initiate_disbursement = payout
+        timer = Timer()
+
+        async def timed_redemption():
+            with timer.measure():
+                success, _ = await redeem(service, token_code, vendor_id, amount)
+            return success
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*[timed_redemption() for _ in range(options['redemptions'])])
+        elapsed = time.perf_counter() - started
+
+        token = await LoanToken.objects.aget(token=token_code)
+        total_paid = sum(paid_out, Decimal('0'))
+        recorded = await sync_to_async(
+            lambda: sum(TokenTransaction.objects.filter(token=token).values_list('amount', flat=True), Decimal('0'))
+        )()
+
+        latency = summarise(timer.samples)
+        latency['throughput_per_s'] = round(len(outcomes) / elapsed, 1) if elapsed else 0.0
+        return {
+            'succeeded': sum(outcomes),
+            'paid_out': str(total_paid),
+            'recorded': str(recorded),
+            'final_balance': str(token.amount),
+            'final_status': token.status,
+            'overspend': str(max(total_paid - options['balance'], Decimal('0'))),
+            'balance_consistent': options['balance'] - total_paid == token.amount,
+            'latency': latency
+        }
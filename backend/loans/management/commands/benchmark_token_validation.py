@@ -0,0 +1,147 @@
+# backend/loans/management/commands/benchmark_token_validation.py
+import json
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from authentication.models import User
+from farmers.models import Farmer
+from loans.benchmarks import Timer, count_queries, summarise
+from loans.models import Loan, LoanProduct, LoanToken
+from loans.serializers import LoanTokenSerializer
+from loans.tokenization_service import TokenizedLoanService, token_cache_key
+
+
+async def validate_three_hops(token_code):
+    """The previous TokenValidationView path: fetch, serialise, then read the farmer"""
+    @sync_to_async
+    def get_token():
+        try:
+            return LoanToken.objects.select_related('loan__farmer').get(token=token_code, status='ACTIVE')
+        except LoanToken.DoesNotExist:
+            return None
+
+    loan_token = await get_token()
+    if not loan_token:
+        return None
+
+    token_data = await sync_to_async(lambda: LoanTokenSerializer(loan_token).data)()
+    farmer_info = await sync_to_async(lambda: {
+        'farmer_name': loan_token.loan.farmer.name,
+        'farmer_phone': loan_token.loan.farmer.phone_number
+    })()
+    token_data.update(farmer_info)
+    return token_data
+
+
+async def validate_cached(token_code):
+    """The current path: one cached values() query"""
+    row = await sync_to_async(TokenizedLoanService.validate_token)(token_code)
+    if not row:
+        return None
+    token_data = LoanTokenSerializer(row).data
+    token_data.update({
+        'farmer_name': row['loan__farmer__name'],
+        'farmer_phone': row['loan__farmer__phone_number']
+    })
+    return token_data
+
+
+class Command(BaseCommand):
+    help = 'Replays a market day of vendor token scans and reports validation latency, old versus new path'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tokens',
+            type=int,
+            default=200,
+            help='Active tokens in circulation'
+        )
+        parser.add_argument(
+            '--scans',
+            type=int,
+            default=2000,
+            help='Validation requests to replay'
+        )
+        parser.add_argument(
+            '--redemption-rate',
+            type=float,
+            default=0.1,
+            help='Fraction of scans followed by a redemption that invalidates the cached token'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the scan order'
+        )
+
+    def handle(self, *args, **options):
+        results = {'tokens': options['tokens'], 'scans': options['scans']}
+
+        # Everything is rolled back
+        with transaction.atomic():
+            tokens = self.create_tokens(options['tokens'])
+            rng = random.Random(options['seed'])
+            scans = [
+                (rng.choice(tokens), rng.random() < options['redemption_rate'])
+                for _ in range(options['scans'])
+            ]
+
+            for name, validate in (('three_hops', validate_three_hops), ('cached_values', validate_cached)):
+                cache.delete_many([token_cache_key(token) for token in tokens])
+                with count_queries() as captured:
+                    results[name] = async_to_sync(self.measure)(validate, scans)
+                results[name]['queries_per_scan'] = round(len(captured) / options['scans'], 2)
+
+            transaction.set_rollback(True)
+
+        cache.delete_many([token_cache_key(token) for token in tokens])
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def create_tokens(self, count):
+        user = User.objects.create(
+            username=f"bench_scan_{uuid.uuid4().hex[:8]}",
+            password="benchmark",
+            role="FARMER",
+            phone_number="+250780000003"
+        )
+        farmer = Farmer.objects.create(
+            user=user, name="Benchmark Farmer", phone_number="+250780000003",
+            location="Kigali", farm_size=2
+        )
+        product = LoanProduct.objects.create(
+            name="Benchmark Input Loan", description="Token validation benchmark",
+            min_amount=Decimal('1'), max_amount=Decimal('100000'), interest_rate=Decimal('10'), duration_days=90
+        )
+        loans = Loan.objects.bulk_create([
+            Loan(
+                farmer=farmer, loan_product=product, amount_requested=Decimal('50000'),
+                amount_approved=Decimal('50000'), status='DISBURSED'
+            )
+            for _ in range(count)
+        ])
+        expiry_date = timezone.now() + timedelta(days=30)
+        tokens = LoanToken.objects.bulk_create([
+            LoanToken(loan=loan, token=str(uuid.uuid4()), amount=Decimal('50000'), status='ACTIVE', expiry_date=expiry_date)
+            for loan in loans
+        ])
+        return [token.token for token in tokens]
+
+    async def measure(self, validate, scans):
+        """Validate each scan in turn; a redemption clears that token's cache entry"""
+        timer = Timer()
+        for token_code, redeemed in scans:
+            with timer.measure():
+                token_data = await validate(token_code)
+            assert token_data is not None
+            if redeemed:
+                TokenizedLoanService.invalidate_token(token_code)
+        return {'latency': summarise(timer.samples)}
@@ -0,0 +1,57 @@
+# backend/loans/management/commands/check_bulk_eligibility.py
+import csv
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loans.services import LoanService
+
+
+class Command(BaseCommand):
+    help = 'Checks loan pre-approval eligibility for a CSV of farmer_id,loan_product_id,amount rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='CSV file with farmer_id, loan_product_id and amount columns'
+        )
+        parser.add_argument(
+            '--output',
+            help='Where to write per-row decisions (defaults to stdout)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['input'], newline='') as f:
+                applications = [
+                    {
+                        'farmer_id': int(row['farmer_id']),
+                        'loan_product_id': int(row['loan_product_id']),
+                        'amount': Decimal(row['amount'])
+                    }
+                    for row in csv.DictReader(f)
+                ]
+        except (OSError, KeyError, ValueError, InvalidOperation) as e:
+            raise CommandError(f"Could not read applications: {str(e)}")
+
+        start = time.perf_counter()
+        results = LoanService.check_bulk_eligibility(applications)
+        elapsed = time.perf_counter() - start
+
+        fields = ['farmer_id', 'loan_product_id', 'amount', 'eligible', 'credit_score', 'reason']
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            writer = csv.DictWriter(output, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(results)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        eligible = sum(1 for result in results if result['eligible'])
+        self.stderr.write(self.style.SUCCESS(
+            f"Checked {len(results)} applications in {elapsed:.2f}s: "
+            f"{eligible} eligible, {len(results) - eligible} ineligible"
+        ))
@@ -0,0 +1,70 @@
+# backend/loans/management/commands/disburse_approved_loans.py
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loans.disbursement_service import (
+    DISBURSEMENT_BATCH_SIZE,
+    DISBURSEMENT_CONCURRENCY,
+    BulkDisbursementRunner,
+)
+
+
+class Command(BaseCommand):
+    help = 'Disburses APPROVED loans through MoMo in resumable batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DISBURSEMENT_BATCH_SIZE,
+            help='Number of loans claimed per batch'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=DISBURSEMENT_CONCURRENCY,
+            help='MoMo transfer requests in flight at once'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also resend loans whose transfer MoMo rejected'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            reset = BulkDisbursementRunner.retry_failed()
+            self.stdout.write(f"Requeued {reset} loans with rejected transfers")
+
+        runner = BulkDisbursementRunner(
+            batch_size=options['batch_size'],
+            max_concurrency=options['concurrency']
+        )
+        result = asyncio.run(runner.run(
+            max_batches=options['max_batches'],
+            on_batch=self.write_batch
+        ))
+        if result is None:
+            raise CommandError("Another bulk disbursement is already running")
+
+        result.pop('batch_metrics')
+        self.stdout.write(json.dumps(result, indent=2))
+        style = self.style.WARNING if result['rejected'] or result['unknown'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{result['accepted']} of {result['loans']} transfers accepted, "
+            f"{result['rejected']} rejected, {result['unknown']} to resend"
+        ))
+
+    def write_batch(self, metrics):
+        self.stdout.write(
+            f"Batch {metrics['batch']}: {metrics['loans']} loans in {metrics['elapsed_seconds']:.1f}s "
+            f"({metrics['per_second']}/s), {metrics['accepted']} accepted, "
+            f"{metrics['rejected']} rejected, {metrics['unknown']} unknown"
+        )
@@ -0,0 +1,41 @@
+# backend/loans/management/commands/reconcile_loan_balances.py
+from django.core.management.base import BaseCommand
+
+from loans.repayment_service import RECONCILE_BATCH_SIZE, reconcile_loan_balances
+
+
+class Command(BaseCommand):
+    help = 'Recomputes loan repayment totals from repayments and reports drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECONCILE_BATCH_SIZE,
+            help='Number of loans compared and corrected per batch'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without writing corrected totals'
+        )
+
+    def handle(self, *args, **options):
+        result = reconcile_loan_balances(
+            batch_size=options['batch_size'],
+            fix=not options['dry_run']
+        )
+
+        for sample in result['samples']:
+            self.stdout.write(
+                f"{sample['loan_id']}: total_repaid {sample['stored_total_repaid']} -> "
+                f"{sample['actual_total_repaid']}, outstanding_balance "
+                f"{sample['stored_outstanding_balance']} -> {sample['expected_outstanding_balance']}"
+            )
+
+        summary = (
+            f"Checked {result['checked']} loans in {result['elapsed_seconds']:.1f}s: "
+            f"{result['drifted']} drifted (total {result['total_drift']}), {result['fixed']} fixed"
+        )
+        style = self.style.WARNING if result['drifted'] else self.style.SUCCESS
+        self.stdout.write(style(summary))
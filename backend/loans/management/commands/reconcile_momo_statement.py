@@ -0,0 +1,83 @@
+# backend/loans/management/commands/reconcile_momo_statement.py
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from loans.statement_reconciliation import (
+    REPORT_CATEGORIES,
+    STATEMENT_COLUMNS,
+    STATEMENT_PARTITIONS,
+    StatementReconciler,
+)
+
+
+class Command(BaseCommand):
+    help = 'Reconciles a MoMo statement CSV against Transaction records by reference'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Statement CSV file, optionally gzipped')
+        parser.add_argument(
+            '--start',
+            help='First day of the statement period (YYYY-MM-DD); defaults to the earliest statement date'
+        )
+        parser.add_argument(
+            '--end',
+            help='Last day of the statement period (YYYY-MM-DD); defaults to the latest statement date'
+        )
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=STATEMENT_PARTITIONS,
+            help='Hash partitions; raise for very large statements to lower memory use'
+        )
+        parser.add_argument(
+            '--output-dir',
+            help='Write one CSV report per category to this directory'
+        )
+        for field, column in STATEMENT_COLUMNS.items():
+            parser.add_argument(
+                f'--{field}-column',
+                default=column,
+                help=f'Statement column holding the {field} (default: {column})'
+            )
+
+    def handle(self, *args, **options):
+        start = self.parse_day(options['start'])
+        end = self.parse_day(options['end'])
+        if end:
+            end += timedelta(days=1) - timedelta(microseconds=1)
+
+        reconciler = StatementReconciler(
+            columns={field: options[f'{field}_column'] for field in STATEMENT_COLUMNS},
+            partitions=options['partitions'],
+            output_dir=options['output_dir']
+        )
+        try:
+            result = reconciler.run(options['statement'], start=start, end=end)
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(json.dumps(result, indent=2))
+        if result['missing'] is None:
+            self.stdout.write(self.style.WARNING(
+                "No statement period found; pass --start and --end to report missing transactions"
+            ))
+
+        exceptions = sum(result[category] or 0 for category in REPORT_CATEGORIES if category != 'matched')
+        style = self.style.WARNING if exceptions else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Reconciled {result['statement_lines']} statement lines in {result['elapsed_seconds']:.1f}s "
+            f"({result['lines_per_second']}/s): {result['matched']} matched, {exceptions} to review"
+        ))
+
+    @staticmethod
+    def parse_day(value):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        return timezone.make_aware(datetime.combine(day, time.min))
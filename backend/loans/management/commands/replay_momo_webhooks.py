@@ -0,0 +1,48 @@
+# backend/loans/management/commands/replay_momo_webhooks.py
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+
+from loans.models import MoMoWebhookEvent
+from loans.webhook_service import MoMoWebhookService
+
+# Events in these states have not been applied and are safe to replay
+REPLAYABLE_STATUSES = ['RECEIVED', 'FAILED']
+
+
+class Command(BaseCommand):
+    help = 'Re-applies stored MoMo callbacks from their raw payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'transaction_ids',
+            nargs='*',
+            help='Provider transaction IDs to replay (default: every replayable event)'
+        )
+        parser.add_argument(
+            '--status',
+            choices=REPLAYABLE_STATUSES,
+            help='Only replay events in this state'
+        )
+
+    async def handle_async(self, *args, **options):
+        events = MoMoWebhookEvent.objects.filter(status__in=REPLAYABLE_STATUSES)
+        if options['status']:
+            events = events.filter(status=options['status'])
+        if options['transaction_ids']:
+            events = events.filter(provider_transaction_id__in=options['transaction_ids'])
+
+        events = await sync_to_async(list)(events)
+        if not events:
+            raise CommandError("No replayable MoMo callbacks found")
+
+        return await MoMoWebhookService().replay(events)
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        counts = asyncio.run(self.handle_async(*args, **options))
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {counts['replayed']} callbacks: "
+            f"{counts['processed']} processed, {counts['failed']} failed"
+        ))
@@ -0,0 +1,30 @@
+# backend/loans/management/commands/rescore_farmers.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loans.explanation_service import CreditExplanationService
+
+
+class Command(BaseCommand):
+    help = 'Rescores farmers with the credit model and stores SHAP explanations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of farmers scored and explained per batch'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            result = CreditExplanationService().rescore_all(batch_size=options['batch_size'])
+        except Exception as e:
+            raise CommandError(f"Rescoring failed: {str(e)}")
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored and explained {result['processed']} farmers in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,74 @@
+# backend/loans/management/commands/settle_vendor_payouts.py
+import asyncio
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from loans.disbursement_service import DISBURSEMENT_CONCURRENCY
+from loans.settlement_service import SETTLEMENT_BATCH_SIZE, VendorSettlementRunner
+
+# Columns of the settlement report, in order
+REPORT_FIELDS = (
+    'reference', 'vendor_id', 'vendor__name', 'phone_number',
+    'amount', 'transaction_count', 'status', 'period_end'
+)
+
+
+class Command(BaseCommand):
+    help = 'Pays each vendor one netted MoMo transfer for its pending token redemptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SETTLEMENT_BATCH_SIZE,
+            help='Number of vendors settled per batch'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=DISBURSEMENT_CONCURRENCY,
+            help='MoMo transfer requests in flight at once'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches'
+        )
+        parser.add_argument(
+            '--report',
+            help='Write the settlement report to this CSV file'
+        )
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        runner = VendorSettlementRunner(
+            batch_size=options['batch_size'],
+            max_concurrency=options['concurrency']
+        )
+        result = asyncio.run(runner.run(max_batches=options['max_batches']))
+        if result is None:
+            raise CommandError("Another vendor settlement is already running")
+
+        report = VendorSettlementRunner.settlement_report(started)
+        for row in report:
+            self.stdout.write(
+                f"{row['vendor__name']} ({row['phone_number']}): {row['amount']} RWF "
+                f"for {row['transaction_count']} redemptions, {row['status']} [{row['reference']}]"
+            )
+        if options['report']:
+            with open(options['report'], 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+                writer.writeheader()
+                writer.writerows(report)
+            self.stdout.write(f"Report written to {options['report']}")
+
+        result.pop('batch_metrics')
+        self.stdout.write(json.dumps(result, indent=2))
+        style = self.style.WARNING if result['rejected'] or result['unknown'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{result['accepted']} of {result['settlements']} settlements accepted, "
+            f"{result['rejected']} rejected, {result['unknown']} to resend"
+        ))
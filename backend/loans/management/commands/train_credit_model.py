@@ -0,0 +1,70 @@
+# backend/loans/management/commands/train_credit_model.py
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from loans.models import Loan
+from loans.explanation_service import BACKGROUND_SIZE
+from loans.risk_service import SCORING_FEATURES, build_history_matrix, reset_scoring_model
+
+
+class Command(BaseCommand):
+    help = 'Trains the credit scoring model on repaid vs defaulted loan history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.CREDIT_MODEL_PATH,
+            help='Where to write the serialised model'
+        )
+
+    def handle(self, *args, **options):
+        import joblib
+        import numpy as np
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+
+        # One row per closed loan, labelled by whether it was repaid. Its
+        # features are the farmer's history before the loan was applied for,
+        # so they cannot contain the outcome being predicted
+        loans = list(Loan.objects.filter(
+            status__in=['PAID', 'DEFAULTED']
+        ).select_related('farmer').order_by('application_date'))
+        if not loans:
+            raise CommandError("No repaid or defaulted loans to train on")
+
+        labels = [1 if loan.status == 'PAID' else 0 for loan in loans]
+        if len(set(labels)) < 2:
+            raise CommandError("Training data needs both repaid and defaulted loans")
+
+        features = build_history_matrix(
+            [loan.farmer for loan in loans],
+            [loan.application_date for loan in loans]
+        )
+        model = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+        model.fit(features, labels)
+
+        # Keep a sample of the training rows as the SHAP background dataset
+        background_rows = np.random.default_rng(0).choice(
+            len(features), min(BACKGROUND_SIZE, len(features)), replace=False
+        )
+
+        trained_at = timezone.now()
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump({
+            'model': model,
+            'version': f"logreg-{trained_at.strftime('%Y%m%d%H%M%S')}",
+            'features': SCORING_FEATURES,
+            'background': features[background_rows],
+            'trained_at': trained_at.isoformat(),
+            'training_rows': len(loans),
+        }, output)
+        reset_scoring_model()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained credit model on {len(loans)} loans and saved it to {output}"
+        ))
@@ -0,0 +1,61 @@
+# backend/loans/management/commands/transition_loans.py
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loans.lifecycle_service import LOAN_TRANSITIONS, BulkLoanLifecycle
+
+
+class Command(BaseCommand):
+    help = 'Approves, rejects or completes the loans listed in a CSV of loan_id[,amount_approved] rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=list(LOAN_TRANSITIONS), help='Transition to apply')
+        parser.add_argument(
+            'input',
+            help='CSV file with a loan_id column and, for approve, an optional amount_approved column'
+        )
+        parser.add_argument(
+            '--output',
+            help='Where to write per-loan outcomes (defaults to stdout)'
+        )
+        parser.add_argument(
+            '--no-disburse',
+            action='store_true',
+            help='Do not queue a bulk disbursement run after approving'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['input'], newline='') as f:
+                rows = list(csv.DictReader(f))
+            loan_ids = [row['loan_id'] for row in rows]
+        except (OSError, KeyError) as e:
+            raise CommandError(f"Could not read loans: {str(e)}")
+        amounts = {row['loan_id']: row['amount_approved'] for row in rows if row.get('amount_approved')}
+
+        try:
+            result = BulkLoanLifecycle().transition(
+                options['action'],
+                loan_ids,
+                approved_amounts=amounts,
+                disburse=not options['no_disburse']
+            )
+        except ArithmeticError as e:
+            raise CommandError(f"Invalid amount_approved: {str(e)}")
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            writer = csv.DictWriter(output, fieldnames=['loan_id', 'success', 'status', 'reason'])
+            writer.writeheader()
+            writer.writerows(result['results'])
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        style = self.style.WARNING if result['failed'] else self.style.SUCCESS
+        self.stderr.write(style(
+            f"{options['action'].capitalize()}: {result['moved']} of {result['requested']} loans moved "
+            f"in {result['elapsed_seconds']:.2f}s, {result['failed']} failed"
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmers', '0004_climatehistory'),
+        ('loans', '0002_alter_paymentschedule_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditScoreExplanation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(max_length=100)),
+                ('score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('base_value', models.FloatField(help_text='Expected score over the background dataset')),
+                ('contributions', models.JSONField(default=dict, help_text='Feature name to score contribution')),
+                ('top_features', models.JSONField(default=list, help_text='Largest contributions, ordered by magnitude')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_explanations', to='farmers.farmer')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['farmer', '-created_at'], name='loans_credi_farmer__d7284a_idx')],
+            },
+        ),
+    ]
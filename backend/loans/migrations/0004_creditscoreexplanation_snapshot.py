@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit_scoring', '0001_initial'),
+        ('loans', '0003_creditscoreexplanation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditscoreexplanation',
+            name='snapshot',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='explanation', to='credit_scoring.scoresnapshot'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def normalize_partial_status(apps, schema_editor):
+    """Rows written by the old allocator used PARTIALLY_PAID, which is not a valid choice"""
+    PaymentSchedule = apps.get_model('loans', 'PaymentSchedule')
+    PaymentSchedule.objects.filter(status='PARTIALLY_PAID').update(status='PARTIAL')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0005_outboundmessage'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_partial_status, migrations.RunPython.noop),
+    ]
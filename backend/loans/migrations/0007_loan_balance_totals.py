@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:23
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_balance_totals(apps, schema_editor):
+    Loan = apps.get_model('loans', 'Loan')
+    LoanRepayment = apps.get_model('loans', 'LoanRepayment')
+    zero = Value(Decimal('0'))
+    repaid = LoanRepayment.objects.filter(loan=OuterRef('pk')).values('loan').annotate(
+        total=Sum('amount')
+    ).values('total')
+    Loan.objects.update(
+        total_repaid=Coalesce(Subquery(repaid, output_field=models.DecimalField()), zero)
+    )
+    Loan.objects.update(
+        outstanding_balance=Greatest(Coalesce(F('amount_approved'), zero) - F('total_repaid'), zero)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0006_normalize_partial_schedule_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='outstanding_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='total_repaid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_balance_totals, migrations.RunPython.noop),
+    ]
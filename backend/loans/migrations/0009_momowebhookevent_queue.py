@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0008_momowebhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='momowebhookevent',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='momowebhookevent',
+            name='status',
+            field=models.CharField(choices=[('RECEIVED', 'Received'), ('PROCESSING', 'Processing'), ('PROCESSED', 'Processed'), ('IGNORED', 'Ignored'), ('FAILED', 'Failed')], default='RECEIVED', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='momowebhookevent',
+            index=models.Index(fields=['status', 'received_at'], name='loans_momow_status_6a365b_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0010_transaction_status_polling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tokentransaction',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending settlement'), ('SETTLING', 'In a settlement'), ('SETTLED', 'Settled')], default='SETTLED', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='VendorSettlement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('reference', models.CharField(max_length=100, unique=True)),
+                ('phone_number', models.CharField(max_length=15)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=20)),
+                ('period_end', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settlements', to='loans.approvedvendor')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tokentransaction',
+            name='settlement',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='loans.vendorsettlement'),
+        ),
+        migrations.AddIndex(
+            model_name='tokentransaction',
+            index=models.Index(fields=['status', 'vendor'], name='loans_token_status_8b010e_idx'),
+        ),
+    ]
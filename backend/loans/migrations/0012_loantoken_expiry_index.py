@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0011_vendor_settlement'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loantoken',
+            index=models.Index(fields=['status', 'expiry_date'], name='loans_loant_status_fcadaa_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0012_loantoken_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('kind', models.CharField(choices=[('TRANSACTIONS', 'Transactions'), ('REPAYMENTS', 'Loan repayments')], max_length=20)),
+                ('period', models.CharField(db_index=True, max_length=7)),
+                ('row_count', models.PositiveIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('loan', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, primary_key=True, related_name='archive', serialize=False, to='loans.loan')),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('repayment_count', models.PositiveIntegerField(default=0)),
+                ('on_time_repayments', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('segments', models.ManyToManyField(related_name='loans', to='loans.archivesegment')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0013_loan_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loanrepayment',
+            name='transaction_reference',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
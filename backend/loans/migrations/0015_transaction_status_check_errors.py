@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0014_loanrepayment_reference_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='status_check_errors',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0015_transaction_status_check_errors'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentschedule',
+            name='due_date',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
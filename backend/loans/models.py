@@ -1,4 +1,8 @@
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 from authentication.models import User
 from farmers.models import Farmer
 from django.core.validators import MinValueValidator
@@ -72,6 +76,9 @@ class Loan(models.Model):
         ('FAILED', 'Failed'),
     ]
 
+    # Fields approve() changes
+    APPROVAL_FIELDS = ['status', 'approval_date', 'amount_approved', 'outstanding_balance']
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     farmer = models.ForeignKey(
         Farmer, 
@@ -117,6 +124,18 @@ class Loan(models.Model):
         null=True,
         blank=True
     )
+    # Running totals maintained with F() updates by add_repayment();
+    # reconcile_loan_balances recomputes them from LoanRepayment rows
+    total_repaid = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0
+    )
+    outstanding_balance = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0
+    )
 
     class Meta:
         ordering = ['-application_date']
@@ -124,6 +143,48 @@ class Loan(models.Model):
     def __str__(self):
         return f"Loan #{self.id} - {self.farmer.name} - {self.status}"
 
+    def save(self, *args, **kwargs):
+        """
+        Save the loan; a new loan's balance starts at its approved amount.
+
+        The balance of an existing loan is never derived here: a full save of
+        a stale instance would overwrite totals that add_repayment wrote
+        meanwhile. Code changing a loan saves with update_fields, and
+        approve() opens the balance of a newly approved amount.
+        """
+        if self._state.adding and not self.outstanding_balance:
+            self.outstanding_balance = max((self.amount_approved or Decimal('0')) - self.total_repaid, Decimal('0'))
+        super().save(*args, **kwargs)
+
+    def approve(self, amount, approved_at=None):
+        """
+        Mark the loan APPROVED for amount and open its outstanding balance.
+
+        Does not save; the caller saves with update_fields=APPROVAL_FIELDS
+        while holding the loan's row lock.
+        """
+        self.status = 'APPROVED'
+        self.approval_date = approved_at or timezone.now()
+        self.amount_approved = amount
+        self.outstanding_balance = max(amount - self.total_repaid, Decimal('0'))
+
+    def add_repayment(self, amount):
+        """
+        Add a repayment to the running totals with a single UPDATE.
+        
+        Both columns are computed from their current database values, so
+        concurrent repayments never lose an update. The instance is
+        refreshed afterwards so that a later save() writes current totals.
+        """
+        Loan.objects.filter(pk=self.pk).update(
+            total_repaid=models.F('total_repaid') + amount,
+            outstanding_balance=Greatest(
+                Coalesce(models.F('amount_approved'), Value(Decimal('0'))) - models.F('total_repaid') - amount,
+                Value(Decimal('0'))
+            )
+        )
+        self.refresh_from_db(fields=['total_repaid', 'outstanding_balance'])
+
 class LoanRepayment(models.Model):
     """Track individual repayment transactions"""
     loan = models.ForeignKey(
@@ -136,7 +197,8 @@ class LoanRepayment(models.Model):
         decimal_places=2
     )
     payment_date = models.DateTimeField(auto_now_add=True)
-    transaction_reference = models.CharField(max_length=100)
+    # Provider transaction ID for MoMo repayments; looked up to skip duplicates
+    transaction_reference = models.CharField(max_length=100, db_index=True)
     
     def __str__(self):
         return f"Repayment of {self.amount} for Loan #{self.loan.id}"
@@ -176,13 +238,19 @@ class Transaction(models.Model):
         db_index=True  # Add index for faster queries
     )
     financial_id = models.CharField(max_length=100, null=True, blank=True)
+    # Status polling: MoMo answers so far, failed status requests since the
+    # last answer, and when the next check is due
+    status_checks = models.PositiveIntegerField(default=0)
+    status_check_errors = models.PositiveIntegerField(default=0)
+    next_status_check_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['transaction_type', 'status'])
+            models.Index(fields=['transaction_type', 'status']),
+            models.Index(fields=['status', 'next_status_check_at'])
         ]
     
     def __str__(self):
@@ -197,7 +265,7 @@ class PaymentSchedule(models.Model):
         related_name='payment_schedules' 
     )
     installment_number = models.IntegerField()
-    due_date = models.DateTimeField()
+    due_date = models.DateTimeField(db_index=True)
     principal_amount = models.DecimalField(max_digits=10, decimal_places=2)
     interest_amount = models.DecimalField(max_digits=10, decimal_places=2)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -309,12 +377,22 @@ class LoanToken(models.Model):
     expiry_date = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Serves the expiry sweep: ACTIVE tokens past their expiry date
+            models.Index(fields=['status', 'expiry_date']),
+        ]
     
     def __str__(self):
         return f"Token {self.token} for Loan {self.loan.id}"
 
 class ApprovedVendor(models.Model):
     """Model for approved agricultural input vendors"""
+    # Cache of active vendors served to token redemptions
+    ACTIVE_MAP_CACHE_KEY = 'approved-vendors:active'
+    ACTIVE_MAP_CACHE_TTL = 300
+
     name = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=15)
     location = models.CharField(max_length=100)
@@ -333,13 +411,78 @@ class ApprovedVendor(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def active_map(cls):
+        """
+        Active vendors by id, as dicts of id, name and phone_number.
+
+        Served from the cache; saving or deleting a vendor clears it, and
+        the TTL covers changes made with queryset.update().
+        """
+        vendors = cache.get(cls.ACTIVE_MAP_CACHE_KEY)
+        if vendors is None:
+            vendors = {
+                vendor['id']: vendor
+                for vendor in cls.objects.filter(is_active=True).values('id', 'name', 'phone_number')
+            }
+            cache.set(cls.ACTIVE_MAP_CACHE_KEY, vendors, cls.ACTIVE_MAP_CACHE_TTL)
+        return vendors
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(self.ACTIVE_MAP_CACHE_KEY)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        cache.delete(self.ACTIVE_MAP_CACHE_KEY)
+        return result
+
+class VendorSettlement(models.Model):
+    """One netted MoMo transfer paying a vendor for its pending token redemptions"""
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('FAILED', 'Failed'),
+    )
+
+    vendor = models.ForeignKey(ApprovedVendor, on_delete=models.CASCADE, related_name='settlements')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+    # Sent as the MoMo X-Reference-Id; resending it cannot pay twice
+    reference = models.CharField(max_length=100, unique=True)
+    phone_number = models.CharField(max_length=15)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    # Redemptions made before this time are included
+    period_end = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Settlement {self.reference} - {self.amount}"
+
 class TokenTransaction(models.Model):
     """Model for token redemption transactions"""
+    SETTLEMENT_STATUS_CHOICES = (
+        ('PENDING', 'Pending settlement'),
+        ('SETTLING', 'In a settlement'),
+        ('SETTLED', 'Settled'),
+    )
+
     token = models.ForeignKey(LoanToken, on_delete=models.CASCADE, related_name='transactions')
     vendor = models.ForeignKey(ApprovedVendor, on_delete=models.CASCADE, related_name='transactions')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     reference = models.CharField(max_length=100)
+    # Redemptions paid to the vendor straight away are SETTLED when recorded
+    status = models.CharField(max_length=20, choices=SETTLEMENT_STATUS_CHOICES, default='SETTLED')
+    settlement = models.ForeignKey(
+        VendorSettlement, on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'vendor']),
+        ]
     
     def __str__(self):
         return f"Transaction {self.reference}"
@@ -364,4 +507,125 @@ class HistoricalYield(models.Model):
     farm_size_used = models.DecimalField(max_digits=5, decimal_places=2)  # In hectares
     
     def __str__(self):
-        return f"{self.farmer.name} - {self.get_crop_type_display()} ({self.year})"
\ No newline at end of file
+        return f"{self.farmer.name} - {self.get_crop_type_display()} ({self.year})"
+
+class CreditScoreExplanation(models.Model):
+    """Per-feature contributions behind a model-based credit score"""
+    farmer = models.ForeignKey('farmers.Farmer', on_delete=models.CASCADE, related_name='score_explanations')
+    snapshot = models.OneToOneField(
+        'credit_scoring.ScoreSnapshot',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='explanation'
+    )
+    model_version = models.CharField(max_length=100)
+    score = models.DecimalField(max_digits=5, decimal_places=2)
+    base_value = models.FloatField(help_text="Expected score over the background dataset")
+    contributions = models.JSONField(default=dict, help_text="Feature name to score contribution")
+    top_features = models.JSONField(default=list, help_text="Largest contributions, ordered by magnitude")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['farmer', '-created_at'])
+        ]
+
+    def __str__(self):
+        return f"Score {self.score} for {self.farmer_id} ({self.model_version})"
+
+
+class OutboundMessage(models.Model):
+    """SMS outbox, written in the same transaction as the change it reports"""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    phone_number = models.CharField(max_length=15)
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'])
+        ]
+
+    def __str__(self):
+        return f"SMS to {self.phone_number} - {self.status}"
+
+
+class MoMoWebhookEvent(models.Model):
+    """Raw MTN MoMo callback, stored once per provider transaction for dedupe and replay"""
+    STATUS_CHOICES = [
+        ('RECEIVED', 'Received'),
+        ('PROCESSING', 'Processing'),
+        ('PROCESSED', 'Processed'),
+        ('IGNORED', 'Ignored'),
+        ('FAILED', 'Failed'),
+    ]
+
+    provider_transaction_id = models.CharField(max_length=100, unique=True)
+    external_id = models.CharField(max_length=100, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    phone_number = models.CharField(max_length=20, blank=True)
+    provider_status = models.CharField(max_length=20, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RECEIVED')
+    result = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['status', 'received_at'])
+        ]
+
+    def __str__(self):
+        return f"MoMo callback {self.provider_transaction_id} - {self.status}"
+
+
+class ArchiveSegment(models.Model):
+    """A compressed file of archived rows from one table and one month"""
+    KIND_CHOICES = [
+        ('TRANSACTIONS', 'Transactions'),
+        ('REPAYMENTS', 'Loan repayments'),
+    ]
+
+    # Relative to settings.ARCHIVE_ROOT
+    path = models.CharField(max_length=255, unique=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Month of the archived rows, as YYYY-MM
+    period = models.CharField(max_length=7, db_index=True)
+    row_count = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path
+
+
+class ArchivedLoan(models.Model):
+    """Lookup index of a closed loan whose transactions and repayments were moved to archive files"""
+    loan = models.OneToOneField(Loan, on_delete=models.PROTECT, primary_key=True, related_name='archive')
+    segments = models.ManyToManyField(ArchiveSegment, related_name='loans')
+    transaction_count = models.PositiveIntegerField(default=0)
+    repayment_count = models.PositiveIntegerField(default=0)
+    # Kept so credit scoring still counts repayments made on time
+    on_time_repayments = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive of loan {self.loan_id}"
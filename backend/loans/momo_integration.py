@@ -1,13 +1,75 @@
+import asyncio
 import httpx
 import base64
+import logging
+import time
 import uuid
+import weakref
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from .models import Transaction, Loan
+from .resilience import provider_guard
 from asgiref.sync import sync_to_async
 from decimal import Decimal
 
+logger = logging.getLogger(__name__)
+
+# Tokens are refreshed this long before MoMo says they expire
+MOMO_TOKEN_REFRESH_MARGIN_SECONDS = 60
+# Lifetime assumed when a token response has no expires_in
+MOMO_TOKEN_DEFAULT_TTL_SECONDS = 3600
+# Transfer responses meaning MoMo holds the request
+DISBURSEMENT_ACCEPTED_STATUS_CODES = (201, 202)
+# Transfer response for a resent reference; the original transfer's outcome
+# has to be fetched, as it may have failed
+DISBURSEMENT_DUPLICATE_STATUS_CODE = 409
+
+
+class MoMoTokenCache:
+    """
+    Process-wide OAuth tokens, one per MoMo product.
+
+    MoMoAPI is constructed per service and per request, so tokens live here
+    rather than on the instance. Refreshes are single-flight per event
+    loop: callers that find the token missing wait for the fetch already
+    in progress instead of starting their own.
+    """
+
+    def __init__(self):
+        self._tokens = {}
+        self._locks = weakref.WeakKeyDictionary()
+        self.stats = {'hits': 0, 'fetches': 0, 'rejected': 0}
+
+    def get(self, key):
+        """Return the cached token for key, or None if missing or due for refresh"""
+        entry = self._tokens.get(key)
+        if entry and time.monotonic() < entry[1]:
+            return entry[0]
+        return None
+
+    def set(self, key, token, expires_in):
+        """Cache a token until the refresh margin before it expires"""
+        lifetime = max(expires_in - MOMO_TOKEN_REFRESH_MARGIN_SECONDS, 0)
+        self._tokens[key] = (token, time.monotonic() + lifetime)
+
+    def invalidate(self, key, token):
+        """Drop a rejected token unless another caller has already replaced it"""
+        entry = self._tokens.get(key)
+        if entry and entry[0] == token:
+            del self._tokens[key]
+
+    def lock(self, key):
+        """asyncio.Lock for refreshing key on the running event loop"""
+        locks = self._locks.setdefault(asyncio.get_running_loop(), {})
+        return locks.setdefault(key, asyncio.Lock())
+
+    def clear(self):
+        self._tokens.clear()
+
+
+token_cache = MoMoTokenCache()
+
 
 class MoMoAPI:
     def __init__(self):
@@ -18,30 +80,100 @@ class MoMoAPI:
         self.api_key = settings.MOMO_API_KEY
         self.token = None
 
+    def _token_key(self, is_collection):
+        product = 'collection' if is_collection else 'disbursement'
+        return (product, self.base_url, self.api_user)
+
     async def get_access_token(self, is_collection=False):
-        """Get OAuth 2.0 access token"""
-        auth_string = f"{self.api_user}:{self.api_key}"
-        encoded_auth = base64.b64encode(auth_string.encode()).decode()
-        
-        headers = {
-            "Authorization": f"Basic {encoded_auth}",
-            "Ocp-Apim-Subscription-Key": self.collection_key if is_collection else self.subscription_key,
-            "Content-Type": "application/x-www-form-urlencoded",
-            "X-Target-Environment": settings.MOMO_ENVIRONMENT
-        }
-        
-        endpoint = "collection/token/" if is_collection else "disbursement/token/"
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/{endpoint}",
-                headers=headers,
-                data=""
+        """Get an OAuth 2.0 access token, reusing the shared one while it is valid"""
+        key = self._token_key(is_collection)
+        token = token_cache.get(key)
+        if token:
+            token_cache.stats['hits'] += 1
+            self.token = token
+            return token
+
+        async with token_cache.lock(key):
+            # Another caller may have refreshed the token while we waited
+            token = token_cache.get(key)
+            if token:
+                token_cache.stats['hits'] += 1
+                self.token = token
+                return token
+
+            auth_string = f"{self.api_user}:{self.api_key}"
+            encoded_auth = base64.b64encode(auth_string.encode()).decode()
+
+            headers = {
+                "Authorization": f"Basic {encoded_auth}",
+                "Ocp-Apim-Subscription-Key": self.collection_key if is_collection else self.subscription_key,
+                "Content-Type": "application/x-www-form-urlencoded",
+                "X-Target-Environment": settings.MOMO_ENVIRONMENT
+            }
+
+            endpoint = "collection/token/" if is_collection else "disbursement/token/"
+
+            async with httpx.AsyncClient() as client:
+                response = await provider_guard(f'momo.{key[0]}').call(
+                    client.post,
+                    f"{self.base_url}/{endpoint}",
+                    headers=headers,
+                    data=""
+                )
+            if response.status_code != 200:
+                raise Exception(f"Failed to get token: {response.text}")
+
+            token_data = response.json()
+            token_cache.stats['fetches'] += 1
+            token_cache.set(
+                key,
+                token_data.get('access_token'),
+                int(token_data.get('expires_in') or MOMO_TOKEN_DEFAULT_TTL_SECONDS)
             )
-            if response.status_code == 200:
-                self.token = response.json().get('access_token')
-                return self.token
-            raise Exception(f"Failed to get token: {response.text}")
+            self.token = token_data.get('access_token')
+            return self.token
+
+    async def _send(self, method, path, is_collection=False, client=None, headers=None, **kwargs):
+        """
+        Send an authenticated MoMo request.
+
+        A 401 means the cached token was revoked or expired early; it is
+        dropped and the request is retried once with a fresh token. Calls
+        go through the endpoint family's ProviderGuard, so they fail fast
+        with ProviderUnavailableError while MoMo is down or saturated.
+
+        Args:
+            method: HTTP method
+            path: Path below the API base URL
+            is_collection: Use the collection product rather than disbursement
+            client: Optional shared httpx.AsyncClient
+            headers: Extra headers for this request
+        """
+        key = self._token_key(is_collection)
+        url = f'{self.base_url}/{path}'
+        guard = provider_guard(f'momo.{key[0]}')
+
+        for attempt in range(2):
+            token = await self.get_access_token(is_collection=is_collection)
+            request_headers = {
+                'Authorization': f'Bearer {token}',
+                'X-Target-Environment': settings.MOMO_ENVIRONMENT,
+                'Ocp-Apim-Subscription-Key': self.collection_key if is_collection else self.subscription_key,
+                **(headers or {})
+            }
+
+            if client is None:
+                async with httpx.AsyncClient() as own_client:
+                    response = await guard.call(own_client.request, method, url, headers=request_headers, **kwargs)
+            else:
+                response = await guard.call(client.request, method, url, headers=request_headers, **kwargs)
+
+            if response.status_code != 401 or attempt:
+                return response
+
+            logger.info(f"MoMo rejected the cached {key[0]} token, refreshing")
+            token_cache.stats['rejected'] += 1
+            token_cache.invalidate(key, token)
 
     async def initiate_disbursement(self, loan_id, amount, phone_number):
         """
@@ -50,7 +182,7 @@ class MoMoAPI:
         # Convert synchronous database operations to async
         get_loan = sync_to_async(Loan.objects.get)
         create_transaction = sync_to_async(Transaction.objects.create)
-        save_loan = sync_to_async(lambda x: x.save())
+        save_loan = sync_to_async(lambda x: x.save(update_fields=['disbursement_status', 'momo_reference']))
 
         # Get the loan instance
         try:
@@ -73,74 +205,100 @@ class MoMoAPI:
         )
 
 
-        # Get access token if not available
-        if not self.token:
-            await self.get_access_token()
+        logger.debug(f"Sending disbursement {reference} for {amount}")
 
-        # Format phone number (remove + if present)
-        formatted_phone = phone_number.replace('+', '')
+        try:
+            response = await self.send_disbursement(reference, amount, phone_number)
+
+            logger.debug(f"Disbursement {reference} returned {response.status_code}: {response.text}")
 
+            if response.status_code in DISBURSEMENT_ACCEPTED_STATUS_CODES:
+                # Update loan status
+                loan.disbursement_status = 'PROCESSING'
+                loan.momo_reference = reference
+                await save_loan(loan)
+
+                return {
+                    'status': 'pending',
+                    'reference': reference,
+                    'message': 'Disbursement initiated successfully'
+                }
+            else:
+                # Update transaction status to failed
+                transaction.status = 'FAILED'
+                await transaction.asave(update_fields=['status', 'updated_at'])
+                raise Exception(f"Disbursement failed: {response.text}")
+
+        except httpx.RequestError as e:
+            # Update transaction status on network error
+            transaction.status = 'FAILED'
+            await transaction.asave(update_fields=['status', 'updated_at'])
+            raise Exception(f"Network error: {str(e)}")
+
+    async def send_disbursement(self, reference, amount, phone_number, client=None,
+                                payer_message='Loan Disbursement', payee_note='Farm Loan'):
+        """
+        Submit a transfer to MoMo under the given reference.
+
+        MoMo keeps X-Reference-Id unique, so resending a reference it has
+        already received returns 409 instead of paying twice; the outcome
+        of the original transfer comes from get_disbursement_status.
+
+        Args:
+            reference: Transaction reference ID, used as X-Reference-Id
+            amount: Amount to send
+            phone_number: Payee's phone number
+            client: Optional shared httpx.AsyncClient
+            payer_message: Message shown on our side of the transfer
+            payee_note: Note shown to the payee
+
+        Returns:
+            The httpx response; accepted when its status code is in
+            DISBURSEMENT_ACCEPTED_STATUS_CODES
+        """
         headers = {
-            'Authorization': f'Bearer {self.token}',
             'X-Reference-Id': reference,
-            'X-Target-Environment': settings.MOMO_ENVIRONMENT,
-            'Ocp-Apim-Subscription-Key': self.subscription_key,
             'Content-Type': 'application/json'
         }
-        
+
         payload = {
             'amount': str(amount),
             'currency': 'EUR',
             'externalId': reference,
             'payee': {
                 'partyIdType': 'MSISDN',
-                'partyId': formatted_phone
+                # Format phone number (remove + if present)
+                'partyId': phone_number.replace('+', '')
             },
-            'payerMessage': 'Loan Disbursement',
-            'payeeNote': 'Farm Loan'
+            'payerMessage': payer_message,
+            'payeeNote': payee_note
         }
 
-        print("\nSending disbursement request:")
-        print(f"URL: {self.base_url}/disbursement/v1_0/transfer")
-        print(f"Headers: {headers}")
-        print(f"Payload: {payload}")
+        return await self._send(
+            'POST',
+            'disbursement/v1_0/transfer',
+            client=client,
+            headers=headers,
+            json=payload,
+            timeout=30.0
+        )
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f'{self.base_url}/disbursement/v1_0/transfer',
-                    json=payload,
-                    headers=headers,
-                    timeout=30.0
-                )
-                
-                print(f"\nResponse received:")
-                print(f"Status Code: {response.status_code}")
-                print(f"Headers: {response.headers}")
-                print(f"Body: {response.text}")
-                
-                if response.status_code in [201, 202]:
-                    # Update loan status
-                    loan.disbursement_status = 'PROCESSING'
-                    loan.momo_reference = reference
-                    await save_loan(loan)
-                    
-                    return {
-                        'status': 'pending',
-                        'reference': reference,
-                        'message': 'Disbursement initiated successfully'
-                    }
-                else:
-                    # Update transaction status to failed
-                    transaction.status = 'FAILED'
-                    transaction.save()
-                    raise Exception(f"Disbursement failed: {response.text}")
-                    
-            except httpx.RequestError as e:
-                # Update transaction status on network error
-                transaction.status = 'FAILED'
-                transaction.save()
-                raise Exception(f"Network error: {str(e)}")
+    async def get_disbursement_status(self, reference, client=None):
+        """
+        Fetch the status of a transfer without touching the database
+        Args:
+            reference: Transaction reference ID
+            client: Optional shared httpx.AsyncClient for batched checks
+        """
+        response = await self._send(
+            'GET',
+            f'disbursement/v1_0/transfer/{reference}',
+            client=client,
+            timeout=30.0
+        )
+        if response.status_code == 200:
+            return response.json()
+        raise Exception(f"Failed to check disbursement status: {response.text}")
 
     async def check_disbursement_status(self, reference):
         """
@@ -151,23 +309,17 @@ class MoMoAPI:
 
         # Convert database operations to async
         get_transaction = sync_to_async(Transaction.objects.get)
-        save_transaction = sync_to_async(lambda x: x.save())
+        save_transaction = sync_to_async(lambda x: x.save(update_fields=['status', 'updated_at']))
         get_loan = sync_to_async(lambda x: x.loan) 
-        save_loan = sync_to_async(lambda x: x.save())
-
-        if not self.token:
-            await self.get_access_token()
+        save_loan = sync_to_async(
+            lambda x: x.save(update_fields=['disbursement_status', 'disbursement_date', 'status'])
+        )
 
-        headers = {
-            'Authorization': f'Bearer {self.token}',
-            'X-Target-Environment': settings.MOMO_ENVIRONMENT,
-            'Ocp-Apim-Subscription-Key': self.subscription_key
-        }
-        
         async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f'{self.base_url}/disbursement/v1_0/transfer/{reference}',
-                headers=headers
+            response = await self._send(
+                'GET',
+                f'disbursement/v1_0/transfer/{reference}',
+                client=client
             )
             
             if response.status_code == 200:
@@ -225,17 +377,11 @@ class MoMoAPI:
             phone_number=phone_number,
             status='PENDING'
         )
-        # Get collection token
-        await self.get_access_token(is_collection=True)
-
         # Format phone number
         formatted_phone = phone_number.replace('+', '')
 
         headers = {
-            'Authorization': f'Bearer {self.token}',
             'X-Reference-Id': reference,
-            'X-Target-Environment': settings.MOMO_ENVIRONMENT,
-            'Ocp-Apim-Subscription-Key': self.collection_key,
             'Content-Type': 'application/json'
         }
         
@@ -251,24 +397,21 @@ class MoMoAPI:
             'payeeNote': 'Farm Loan Repayment'
         }
 
-        print("\nSending payment request:")
-        print(f"URL: {self.base_url}/collection/v1_0/requesttopay")
-        print(f"Headers: {headers}")
-        print(f"Payload: {payload}")
+        logger.debug(f"Sending payment request {reference} for {amount}")
 
         async with httpx.AsyncClient() as client:
             try:
-                response = await client.post(
-                    f'{self.base_url}/collection/v1_0/requesttopay',
-                    json=payload,
+                response = await self._send(
+                    'POST',
+                    'collection/v1_0/requesttopay',
+                    is_collection=True,
+                    client=client,
                     headers=headers,
+                    json=payload,
                     timeout=30.0
                 )
                 
-                print(f"\nResponse received:")
-                print(f"Status Code: {response.status_code}")
-                print(f"Headers: {response.headers}")
-                print(f"Body: {response.text}")
+                logger.debug(f"Payment request {reference} returned {response.status_code}: {response.text}")
                 
                 if response.status_code == 202:
                     return {
@@ -288,77 +431,62 @@ class MoMoAPI:
                 transaction.save()
                 raise Exception(f"Network error: {str(e)}")
 
+    async def get_payment_status(self, reference, client=None):
+        """
+        Fetch the status of a payment request without touching the database
+        Args:
+            reference: Transaction reference ID
+            client: Optional shared httpx.AsyncClient for batched checks
+        """
+        response = await self._send(
+            'GET',
+            f'collection/v1_0/requesttopay/{reference}',
+            is_collection=True,
+            client=client,
+            timeout=30.0
+        )
+        if response.status_code == 200:
+            return response.json()
+        raise Exception(f"Failed to check payment status: {response.text}")
+
     async def check_payment_status(self, reference):
         """Check the status of a payment request"""
-        if not self.token:
-            await self.get_access_token(is_collection=True)
-
-        headers = {
-            'Authorization': f'Bearer {self.token}',
-            'X-Target-Environment': settings.MOMO_ENVIRONMENT,
-            'Ocp-Apim-Subscription-Key': self.collection_key
-        }
-        
-        print("\nSending status check request:")
-        print(f"URL: {self.base_url}/collection/v1_0/requesttopay/{reference}")
-        print(f"Headers: {headers}")
-        
         async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f'{self.base_url}/collection/v1_0/requesttopay/{reference}',
-                headers=headers
+            response = await self._send(
+                'GET',
+                f'collection/v1_0/requesttopay/{reference}',
+                is_collection=True,
+                client=client
             )
             
-            print(f"\nResponse received:")
-            print(f"Status Code: {response.status_code}")
-            print(f"Headers: {response.headers}")
-            print(f"Body: {response.text}")
+            logger.debug(f"Payment status {reference} returned {response.status_code}: {response.text}")
             
             if response.status_code == 200:
                 status_data = response.json()
                 
-                # Define all database operations
-                get_transaction = sync_to_async(Transaction.objects.get)
-                save_transaction = sync_to_async(lambda x: x.save())
-                get_loan = sync_to_async(lambda x: x.loan)
-                create_repayment = sync_to_async(lambda l, **kwargs: l.repayments.create(**kwargs))
-                get_total_repaid = sync_to_async(lambda l: l.repayments.aggregate(models.Sum('amount')))
-                
+                @sync_to_async
+                def record_status():
+                    # The repayment, the running totals and the loan status
+                    # change together, under the loan's row lock
+                    with transaction.atomic():
+                        tx = Transaction.objects.select_for_update().get(reference=reference)
+                        # Already settled by the poller or an earlier check
+                        if tx.status != 'PENDING':
+                            return tx
+                        tx.status = 'SUCCESSFUL' if status_data.get('status') == 'SUCCESSFUL' else 'FAILED'
+                        tx.save(update_fields=['status', 'updated_at'])
+
+                        if tx.status == 'SUCCESSFUL':
+                            loan = Loan.objects.select_for_update().get(id=tx.loan_id)
+                            loan.repayments.create(amount=tx.amount, transaction_reference=reference)
+                            loan.add_repayment(tx.amount)
+                            if loan.outstanding_balance <= 0:
+                                loan.status = 'PAID'
+                                loan.save(update_fields=['status'])
+                        return tx
+
                 try:
-                    # Get transaction
-                    transaction = await get_transaction(reference=reference)
-                    transaction.status = 'SUCCESSFUL' if status_data.get('status') == 'SUCCESSFUL' else 'FAILED'
-                    await save_transaction(transaction)
-                    
-                    if transaction.status == 'SUCCESSFUL':
-                        # Get loan using async operation
-                        loan = await get_loan(transaction)
-                        
-                        # Create repayment record
-                        await create_repayment(
-                            loan,
-                            amount=transaction.amount,
-                            transaction_reference=reference
-                        )
-                        
-                        # Get total repaid amount
-                        total_repaid = await get_total_repaid(loan)
-                        total_repaid_amount = total_repaid['amount__sum'] or 0
-                        
-                        print(f"\nLoan details:")
-                        print(f"Amount approved: {loan.amount_approved} EUR")
-                        print(f"Total repaid: {total_repaid_amount} EUR")
-                        
-                        # Update loan status if fully paid
-                        if Decimal(str(total_repaid_amount)) >= loan.amount_approved:
-                            print("Loan fully paid, updating status...")
-                            loan.status = 'PAID'
-                            await save_transaction(loan)
-                            print(f"Loan status updated to: {loan.status}")
-                        
-                    print(f"\nTransaction status updated: {transaction.status}")
-                    if transaction.status == 'SUCCESSFUL':
-                        print(f"Repayment recorded: {transaction.amount} EUR")
-                    
+                    tx = await record_status()
+                    logger.info(f"Payment {reference} status recorded: {tx.status}")
                 except Transaction.DoesNotExist:
-                    print(f"Transaction with reference {reference} not found")
\ No newline at end of file
+                    logger.warning(f"Transaction with reference {reference} not found")
\ No newline at end of file
@@ -9,6 +9,40 @@ from django.db.models import Sum
 class NotificationService:
     def __init__(self):
         self.sms_service = SMSService()
+
+    @staticmethod
+    def loan_approval_message(loan):
+        """Text of the loan approval SMS"""
+        return (
+            f"Your loan application for {loan.amount_approved} RWF has been approved! "
+            f"Funds will be disbursed shortly."
+        )
+
+    @staticmethod
+    def loan_rejection_message(loan):
+        """Text of the loan rejection SMS"""
+        return (
+            f"Your loan application for {loan.amount_requested} RWF was not approved. "
+            f"Loan ID: {loan.id}"
+        )
+
+    @staticmethod
+    def loan_disbursement_message(loan):
+        """Text of the loan disbursement SMS"""
+        return (
+            f"LOAN DISBURSED: Your loan of {loan.amount_approved} RWF has been disbursed. "
+            f"Please check your mobile money account. "
+            f"Loan ID: {loan.id}"
+        )
+
+    @staticmethod
+    def loan_completion_message(loan):
+        """Text of the loan completion SMS"""
+        return (
+            f"LOAN COMPLETED: Congratulations! Your loan of {loan.amount_approved} RWF "
+            f"has been fully repaid. Thank you for your business. "
+            f"Loan ID: {loan.id}"
+        )
     
     async def send_payment_reminder(self, schedule):
         """Send payment reminder to farmer"""
@@ -49,13 +83,11 @@ class NotificationService:
                     'amount': payment.amount,
                     'loan_id': payment.loan.id,
                     'phone_number': payment.loan.farmer.phone_number,
-                    'total_paid': payment.loan.repayments.filter(status='COMPLETED').aggregate(
-                        total=Sum('amount'))['total'] or 0,
-                    'amount_approved': payment.loan.amount_approved
+                    'outstanding_balance': payment.loan.outstanding_balance
                 }
             
             details = await get_payment_details()
-            remaining = details['amount_approved'] - details['total_paid']
+            remaining = details['outstanding_balance']
             
             message = (
                 f"PAYMENT RECEIVED: Thank you for your payment of {details['amount']} RWF. "
@@ -75,24 +107,12 @@ class NotificationService:
         """Send loan disbursement notification"""
         try:
             @sync_to_async
-            def get_loan_details():
-                return {
-                    'amount': loan.amount_approved,
-                    'id': loan.id,
-                    'phone_number': loan.farmer.phone_number
-                }
-            
-            details = await get_loan_details()
-            
-            message = (
-                f"LOAN DISBURSED: Your loan of {details['amount']} RWF has been disbursed. "
-                f"Please check your mobile money account. "
-                f"Loan ID: {details['id']}"
-            )
+            def get_phone_number():
+                return loan.farmer.phone_number
             
             return await self.sms_service.send_sms(
-                details['phone_number'],
-                message
+                await get_phone_number(),
+                self.loan_disbursement_message(loan)
             )
         except Exception as e:
             print(f"Failed to send disbursement notification: {e}")
@@ -143,24 +163,12 @@ class NotificationService:
         """Send loan completion notification"""
         try:
             @sync_to_async
-            def get_loan_details():
-                return {
-                    'amount': loan.amount_approved,
-                    'id': loan.id,
-                    'phone_number': loan.farmer.phone_number
-                }
-            
-            loan_details = await get_loan_details()
-            
-            message = (
-                f"LOAN COMPLETED: Congratulations! Your loan of {loan_details['amount']} RWF "
-                f"has been fully repaid. Thank you for your business. "
-                f"Loan ID: {loan_details['id']}"
-            )
+            def get_phone_number():
+                return loan.farmer.phone_number
             
             return await self.sms_service.send_sms(
-                loan_details['phone_number'],
-                message
+                await get_phone_number(),
+                self.loan_completion_message(loan)
             )
         except Exception as e:
             print(f"Failed to send completion notification: {e}")
@@ -0,0 +1,159 @@
+# backend/loans/outbox_service.py
+
+import logging
+import time
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from .models import OutboundMessage
+from .sms_service import SMSService
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 200
+OUTBOX_CONCURRENCY = 10
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 3600
+# Messages claimed longer ago than this are assumed lost by a crashed worker
+OUTBOX_CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def queue_sms(phone_number, message):
+    """
+    Queue an SMS for the dispatcher.
+
+    Call this inside the same transaction.atomic() block as the business
+    change so that the message is only sent if that change commits.
+    """
+    return OutboundMessage.objects.create(phone_number=phone_number, message=message)
+
+
+def queue_sms_batch(messages):
+    """
+    Queue many SMS with one bulk insert.
+
+    Args:
+        messages: Iterable of (phone_number, message) pairs
+
+    Returns:
+        Number of messages queued
+    """
+    outbound = [
+        OutboundMessage(phone_number=phone_number, message=message)
+        for phone_number, message in messages
+    ]
+    OutboundMessage.objects.bulk_create(outbound, batch_size=OUTBOX_BATCH_SIZE)
+    return len(outbound)
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts"""
+    return timedelta(seconds=min(
+        OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+        OUTBOX_RETRY_MAX_SECONDS
+    ))
+
+
+class OutboxDispatcher:
+    """Drains the SMS outbox in batches with retries and backoff"""
+
+    def __init__(self, batch_size=OUTBOX_BATCH_SIZE, max_concurrency=OUTBOX_CONCURRENCY):
+        self.sms_service = SMSService()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+
+    def claim_batch(self):
+        """
+        Claim up to batch_size due messages by marking them SENDING.
+
+        Uses SKIP LOCKED where supported so several dispatchers can run
+        side by side without sending a message twice.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                OutboundMessage.objects.select_for_update(skip_locked=True).filter(
+                    Q(status='PENDING', next_attempt_at__lte=now) |
+                    Q(status='SENDING', claimed_at__lt=now - OUTBOX_CLAIM_TIMEOUT)
+                ).order_by('next_attempt_at').values_list('id', flat=True)[:self.batch_size]
+            )
+            OutboundMessage.objects.filter(id__in=ids).update(status='SENDING', claimed_at=now)
+        return list(OutboundMessage.objects.filter(id__in=ids))
+
+    def record_results(self, messages, results):
+        """Persist send outcomes for a batch with one bulk_update"""
+        now = timezone.now()
+        for message, (success, error) in zip(messages, results):
+            message.attempts += 1
+            message.claimed_at = None
+            if success:
+                message.status = 'SENT'
+                message.sent_at = now
+                message.last_error = ''
+            elif message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                message.status = 'FAILED'
+                message.last_error = error
+            else:
+                message.status = 'PENDING'
+                message.next_attempt_at = now + retry_delay(message.attempts)
+                message.last_error = error
+
+        OutboundMessage.objects.bulk_update(
+            messages,
+            ['status', 'attempts', 'claimed_at', 'sent_at', 'next_attempt_at', 'last_error']
+        )
+
+    async def dispatch_batch(self):
+        """Claim, send and record one batch. Returns (handled, sent)."""
+        messages = await sync_to_async(self.claim_batch)()
+        if not messages:
+            return 0, 0
+
+        try:
+            statuses = await self.sms_service.send_keyed(
+                {message.id: (message.phone_number, message.message) for message in messages},
+                self.max_concurrency
+            )
+        except Exception as e:
+            logger.error(f"Outbox batch send failed: {str(e)}")
+            statuses = {}
+
+        results = []
+        for message in messages:
+            status = statuses.get(message.id)
+            if status is None:
+                results.append((False, 'Send failed'))
+            else:
+                results.append((status['success'], '' if status['success'] else status['status']))
+
+        await sync_to_async(self.record_results)(messages, results)
+
+        sent = sum(1 for success, _ in results if success)
+        return len(messages), sent
+
+    async def drain(self, max_batches=None):
+        """Dispatch batches until the outbox has nothing due"""
+        started = time.perf_counter()
+        handled = sent = batches = 0
+
+        while max_batches is None or batches < max_batches:
+            batch_handled, batch_sent = await self.dispatch_batch()
+            if not batch_handled:
+                break
+            handled += batch_handled
+            sent += batch_sent
+            batches += 1
+
+        result = {
+            'batches': batches,
+            'handled': handled,
+            'sent': sent,
+            'failed': handled - sent,
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        }
+        if handled:
+            logger.info(f"Outbox dispatch: {result}")
+        return result
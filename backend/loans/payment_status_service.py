@@ -0,0 +1,295 @@
+# backend/loans/payment_status_service.py
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+import httpx
+from .models import Loan, LoanRepayment, Transaction
+from .momo_integration import MoMoAPI
+from .allocation_service import PaymentAllocationService
+from .notification_service import NotificationService
+from .outbox_service import queue_sms
+from .schedule_service import BulkScheduleGenerator
+
+logger = logging.getLogger(__name__)
+
+# Pending transactions claimed per poll batch
+PAYMENT_POLL_BATCH_SIZE = 200
+# MoMo status requests in flight at once
+PAYMENT_POLL_CONCURRENCY = 10
+# Delay before the next check grows from the base to the cap
+PAYMENT_POLL_BASE_SECONDS = 30
+PAYMENT_POLL_MAX_SECONDS = 1800
+# Transactions MoMo still reports as pending after this many checks are marked
+# FAILED; checks whose request failed do not count
+PAYMENT_POLL_MAX_CHECKS = 12
+# Claimed transactions are not picked up again until this lease runs out
+PAYMENT_POLL_CLAIM_TIMEOUT = timedelta(minutes=5)
+# MoMo statuses that mean the payer has not answered yet
+MOMO_PENDING_STATUSES = ('PENDING', 'ONGOING')
+# Fields written back after a poll batch
+POLL_UPDATE_FIELDS = ['status', 'status_checks', 'status_check_errors', 'next_status_check_at', 'updated_at']
+
+
+def poll_delay(checks):
+    """Exponential backoff after the given number of status checks"""
+    return timedelta(seconds=min(
+        PAYMENT_POLL_BASE_SECONDS * 2 ** (checks - 1),
+        PAYMENT_POLL_MAX_SECONDS
+    ))
+
+
+class PaymentStatusPoller:
+    """
+    Checks pending MoMo repayment requests in batches and applies the results.
+
+    Subclasses poll other kinds of transactions through the same batches by
+    setting transaction_type and overriding get_status, record_successful
+    and record_failed.
+    """
+    # Transactions of this type are polled
+    transaction_type = 'REPAYMENT'
+    # Pending answers after which a transaction is marked FAILED; None never gives up
+    max_checks = PAYMENT_POLL_MAX_CHECKS
+
+    def __init__(self, batch_size=PAYMENT_POLL_BATCH_SIZE, max_concurrency=PAYMENT_POLL_CONCURRENCY):
+        self.momo_api = MoMoAPI()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+
+    def claim_batch(self):
+        """
+        Claim up to batch_size transactions of transaction_type that are due for a check.
+
+        Claimed rows have their next check pushed out by the claim timeout,
+        so a second poller skips them and a crashed poller's rows come back
+        on their own. Uses SKIP LOCKED where supported.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                Transaction.objects.select_for_update(skip_locked=True).filter(
+                    Q(next_status_check_at__isnull=True) | Q(next_status_check_at__lte=now),
+                    status='PENDING',
+                    transaction_type=self.transaction_type
+                ).order_by('created_at').values_list('id', flat=True)[:self.batch_size]
+            )
+            Transaction.objects.filter(id__in=ids).update(
+                next_status_check_at=now + PAYMENT_POLL_CLAIM_TIMEOUT
+            )
+        return list(Transaction.objects.filter(id__in=ids).order_by('created_at'))
+
+    async def fetch_statuses(self, transactions):
+        """
+        Query MoMo for each transaction over one shared client.
+
+        Returns:
+            List of MoMo status strings aligned with transactions; None
+            where the request failed
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with httpx.AsyncClient() as client:
+            async def fetch(tx):
+                async with semaphore:
+                    try:
+                        return await self.get_status(tx.reference, client)
+                    except Exception as e:
+                        logger.warning(f"Status check for {tx.reference} failed: {str(e)}")
+                        return None
+
+            return await asyncio.gather(*[fetch(tx) for tx in transactions])
+
+    async def get_status(self, reference, client):
+        """MoMo status of the payment request under reference"""
+        status_data = await self.momo_api.get_payment_status(reference, client=client)
+        return status_data.get('status')
+
+    def apply_results(self, transactions, statuses):
+        """
+        Persist a batch of status checks in one transaction.
+
+        Successful and failed transactions are passed to record_successful
+        and record_failed grouped by loan. Transactions still pending are rescheduled with backoff. A failed
+        status request is retried with backoff too, but only MoMo's answers
+        count towards max_checks, so an outage never fails a
+        payment that may have gone through. All transaction rows are
+        written with one bulk_update.
+
+        Returns:
+            Dictionary of transaction counts by outcome
+        """
+        now = timezone.now()
+        counts = {'successful': 0, 'failed': 0, 'pending': 0, 'errors': 0}
+        changed = []
+        paid = {}
+        failed = {}
+
+        with transaction.atomic():
+            # Skip anything settled elsewhere since it was claimed
+            still_pending = set(
+                Transaction.objects.select_for_update().filter(
+                    id__in=[tx.id for tx in transactions], status='PENDING'
+                ).values_list('id', flat=True)
+            )
+
+            for tx, status in zip(transactions, statuses):
+                if tx.id not in still_pending:
+                    continue
+
+                tx.updated_at = now
+                changed.append(tx)
+
+                if status is None:
+                    tx.status_check_errors += 1
+                    tx.next_status_check_at = now + poll_delay(tx.status_checks + tx.status_check_errors)
+                    counts['errors'] += 1
+                    continue
+
+                tx.status_checks += 1
+                tx.status_check_errors = 0
+                if status == 'SUCCESSFUL':
+                    tx.status = 'SUCCESSFUL'
+                    tx.next_status_check_at = None
+                    paid.setdefault(tx.loan_id, []).append(tx)
+                    counts['successful'] += 1
+                elif status not in MOMO_PENDING_STATUSES:
+                    tx.status = 'FAILED'
+                    tx.next_status_check_at = None
+                    failed.setdefault(tx.loan_id, []).append(tx)
+                    counts['failed'] += 1
+                elif self.max_checks is not None and tx.status_checks >= self.max_checks:
+                    logger.warning(f"Giving up on {tx.reference} after {tx.status_checks} checks")
+                    tx.status = 'FAILED'
+                    tx.next_status_check_at = None
+                    failed.setdefault(tx.loan_id, []).append(tx)
+                    counts['failed'] += 1
+                else:
+                    tx.next_status_check_at = now + poll_delay(tx.status_checks)
+                    counts['pending'] += 1
+
+            if paid:
+                self.record_successful(paid, now)
+            if failed:
+                self.record_failed(failed, now)
+            if changed:
+                Transaction.objects.bulk_update(changed, POLL_UPDATE_FIELDS)
+
+        return counts
+
+    def record_successful(self, paid, now):
+        """
+        Record successful payments grouped by loan; call inside apply_results.
+
+        Each loan gets one allocation and one balance update, whatever the
+        number of payments for it.
+        """
+        LoanRepayment.objects.bulk_create([
+            LoanRepayment(loan_id=tx.loan_id, amount=tx.amount, transaction_reference=tx.reference)
+            for loan_transactions in paid.values()
+            for tx in loan_transactions
+        ])
+
+        loans = Loan.objects.select_for_update(of=('self',)).select_related('farmer').filter(
+            id__in=list(paid)
+        ).order_by('id')
+
+        for loan in loans:
+            amount = sum(tx.amount for tx in paid[loan.id])
+            PaymentAllocationService.allocate_payment(loan, amount, now=now)
+            loan.add_repayment(amount)
+
+            if loan.outstanding_balance <= 0:
+                loan.status = 'PAID'
+                message = f"Congratulations! Your loan of {loan.amount_approved} RWF has been fully repaid."
+            else:
+                if loan.status == 'OVERDUE':
+                    loan.status = 'ACTIVE'
+                message = f"Payment of {amount} RWF received. Remaining balance: {loan.outstanding_balance} RWF"
+
+            loan.save(update_fields=['status'])
+            queue_sms(loan.farmer.phone_number, message)
+
+    def record_failed(self, failed, now):
+        """Nothing to undo for a failed payment request; the payer was not charged"""
+
+    async def poll_batch(self):
+        """
+        Claim, check and apply one batch.
+
+        Returns:
+            Dictionary of transaction counts by outcome, empty when nothing was due
+        """
+        transactions = await sync_to_async(self.claim_batch)()
+        if not transactions:
+            return {}
+
+        statuses = await self.fetch_statuses(transactions)
+        counts = await sync_to_async(self.apply_results)(transactions, statuses)
+        counts['checked'] = len(transactions)
+        return counts
+
+    async def drain(self, max_batches=None):
+        """Check batches until no pending transaction is due"""
+        started = time.perf_counter()
+        totals = {'batches': 0, 'checked': 0, 'successful': 0, 'failed': 0, 'pending': 0, 'errors': 0}
+
+        while max_batches is None or totals['batches'] < max_batches:
+            counts = await self.poll_batch()
+            if not counts:
+                break
+            totals['batches'] += 1
+            for key, count in counts.items():
+                totals[key] += count
+
+        totals['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+        if totals['checked']:
+            logger.info(f"{self.__class__.__name__} poll: {totals}")
+        return totals
+
+
+class DisbursementStatusPoller(PaymentStatusPoller):
+    """
+    Checks loan disbursements MoMo has accepted until they are paid or fail.
+
+    A confirmed transfer moves its loan to DISBURSED, sets its disbursement
+    and due dates, generates its payment schedule and notifies the farmer.
+    A failed transfer marks the loan's disbursement FAILED, so that
+    BulkDisbursementRunner.retry_failed can send it again.
+    """
+    transaction_type = 'DISBURSEMENT'
+    # A transfer MoMo still holds may yet be paid; marking it FAILED would let
+    # retry_failed pay the loan a second time, so it is never given up on
+    max_checks = None
+
+    async def get_status(self, reference, client):
+        """MoMo status of the transfer under reference"""
+        status_data = await self.momo_api.get_disbursement_status(reference, client=client)
+        return status_data.get('status')
+
+    def record_successful(self, paid, now):
+        """Move confirmed loans to DISBURSED and schedule them; call inside apply_results"""
+        loans = list(
+            Loan.objects.select_for_update(of=('self',)).select_related('farmer', 'loan_product').filter(
+                id__in=list(paid), status='APPROVED'
+            ).order_by('id')
+        )
+        for loan in loans:
+            loan.status = 'DISBURSED'
+            loan.disbursement_status = 'COMPLETED'
+            loan.disbursement_date = now
+            loan.due_date = now + timedelta(days=loan.loan_product.duration_days)
+            queue_sms(loan.farmer.phone_number, NotificationService.loan_disbursement_message(loan))
+
+        if loans:
+            Loan.objects.bulk_update(loans, ['status', 'disbursement_status', 'disbursement_date', 'due_date'])
+            BulkScheduleGenerator().generate(loans, now=now)
+
+    def record_failed(self, failed, now):
+        """Mark the loans of failed transfers for a retry; call inside apply_results"""
+        Loan.objects.filter(id__in=list(failed), status='APPROVED').update(disbursement_status='FAILED')
@@ -1,21 +1,122 @@
+import logging
+import time
 from decimal import Decimal
 from email import message
 from django.utils import timezone
 from asgiref.sync import sync_to_async
 from django.db import transaction
-from .models import Loan, LoanRepayment, PaymentSchedule
+from .models import Loan, LoanRepayment, MoMoWebhookEvent, PaymentSchedule
 from .momo_integration import MoMoAPI
 from .sms_service import SMSService
+from .outbox_service import queue_sms
+from .allocation_service import PaymentAllocationService
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Sum, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+# Loans compared and corrected per reconciliation batch
+RECONCILE_BATCH_SIZE = 1000
+# Drifted loans listed in a reconciliation report
+RECONCILE_SAMPLE_SIZE = 20
+
+
+def reconcile_loan_balances(batch_size=RECONCILE_BATCH_SIZE, fix=True):
+    """
+    Recompute Loan.total_repaid and Loan.outstanding_balance from the
+    LoanRepayment rows and report loans whose stored totals had drifted.
+    
+    Loans are walked in primary key order; each batch is read with one
+    aggregate query and corrected with one bulk_update while its rows are
+    locked, so repayments recorded during the run are not overwritten.
+    Archived loans are skipped; their repayments are in the archive files.
+    
+    Args:
+        batch_size: Loans per batch
+        fix: Write corrected totals; when False only report drift
+        
+    Returns:
+        Dictionary with loans checked, drifted and fixed, the absolute
+        drift in total_repaid, sample drifted loans and elapsed time
+    """
+    started = time.perf_counter()
+    zero = Value(Decimal('0'))
+    repaid = LoanRepayment.objects.filter(loan=OuterRef('pk')).values('loan').annotate(
+        total=Sum('amount')
+    ).values('total')
+    
+    checked = drifted = fixed = 0
+    total_drift = Decimal('0')
+    samples = []
+    last_id = None
+    
+    while True:
+        with transaction.atomic():
+            # Archived loans have no live repayment rows left to sum
+            loans = Loan.objects.filter(archive__isnull=True).order_by('id')
+            if last_id is not None:
+                loans = loans.filter(id__gt=last_id)
+            if fix:
+                loans = loans.select_for_update(of=('self',))
+            batch = list(loans.annotate(
+                actual_repaid=Coalesce(Subquery(repaid, output_field=models.DecimalField()), zero)
+            ).only('id', 'amount_approved', 'total_repaid', 'outstanding_balance')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            checked += len(batch)
+            
+            corrections = []
+            for loan in batch:
+                expected_balance = max((loan.amount_approved or 0) - loan.actual_repaid, 0)
+                if loan.total_repaid == loan.actual_repaid and loan.outstanding_balance == expected_balance:
+                    continue
+                
+                drifted += 1
+                total_drift += abs(loan.total_repaid - loan.actual_repaid)
+                if len(samples) < RECONCILE_SAMPLE_SIZE:
+                    samples.append({
+                        'loan_id': str(loan.id),
+                        'stored_total_repaid': loan.total_repaid,
+                        'actual_total_repaid': loan.actual_repaid,
+                        'stored_outstanding_balance': loan.outstanding_balance,
+                        'expected_outstanding_balance': expected_balance
+                    })
+                loan.total_repaid = loan.actual_repaid
+                loan.outstanding_balance = expected_balance
+                corrections.append(loan)
+            
+            if fix and corrections:
+                Loan.objects.bulk_update(corrections, ['total_repaid', 'outstanding_balance'])
+                fixed += len(corrections)
+    
+    result = {
+        'checked': checked,
+        'drifted': drifted,
+        'fixed': fixed,
+        'total_drift': total_drift,
+        'samples': samples,
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
+    }
+    if drifted:
+        logger.warning(f"Loan balance drift: {drifted} of {checked} loans, {total_drift} total")
+    return result
 
 class RepaymentService:
     def __init__(self):
         self.momo_api = MoMoAPI()
         self.sms_service = SMSService()
 
-    async def process_payment(self, payment_data):
-        """Process a loan repayment"""
+    async def process_payment(self, payment_data, webhook_event=None):
+        """
+        Process a loan repayment.
+        
+        A repayment whose provider transaction_id is already recorded is not
+        applied again. When webhook_event is given, it is marked PROCESSED
+        in the same transaction as the repayment, so a crashed worker never
+        leaves an applied callback to be claimed a second time.
+        """
         try:
             print(f"[DEBUG] Starting payment processing: {payment_data}")
             reference = payment_data.get('reference')
@@ -25,6 +126,14 @@ class RepaymentService:
             if not reference or not payment_amount or not phone_number:
                 return False, "Missing required payment data"
             
+            transaction_id = payment_data.get('transaction_id')
+            
+            def mark_event_processed(message):
+                if webhook_event is not None:
+                    MoMoWebhookEvent.objects.filter(pk=webhook_event.pk).update(
+                        status='PROCESSED', result=message, processed_at=timezone.now(), claimed_at=None
+                    )
+            
             @sync_to_async
             def get_loan_and_process():
                 try:
@@ -35,8 +144,16 @@ class RepaymentService:
                         
                         # If loan is already PAID, return success with message
                         if loan.status == 'PAID':
+                            mark_event_processed("Loan was already paid")
                             return {'already_paid': True}, "Loan was already paid"
                         
+                        # The loan lock serialises repayments, so this check cannot race
+                        if transaction_id and LoanRepayment.objects.filter(
+                            loan=loan, transaction_reference=transaction_id
+                        ).exists():
+                            mark_event_processed("Repayment already recorded")
+                            return {'already_paid': True}, "Repayment already recorded"
+                        
                         print(f"[DEBUG] Starting to record repayment: loan={loan.id}, amount={payment_amount}")
                         
                         # Create repayment record
@@ -44,41 +161,18 @@ class RepaymentService:
                             loan=loan,
                             amount=payment_amount,
                             payment_date=timezone.now(),
-                            transaction_reference=f"PAYMENT-{timezone.now().strftime('%Y%m%d%H%M%S')}"
+                            transaction_reference=(
+                                transaction_id or
+                                f"PAYMENT-{timezone.now().strftime('%Y%m%d%H%M%S')}"
+                            )
                         )
                         
-                        # Update payment schedule if applicable
-                        schedules = loan.payment_schedules.filter(
-                            status__in=['PENDING', 'PARTIAL']
-                        ).order_by('due_date')
-                        
-                        remaining_amount = payment_amount
-                        total_repaid = loan.repayments.aggregate(
-                            total=Sum('amount'))['total'] or 0
+                        # Allocate across open schedules: penalty, interest, principal
+                        allocation = PaymentAllocationService.allocate_payment(loan, payment_amount)
                         
-                        # Process each payment schedule
-                        for schedule in schedules:
-                            if remaining_amount <= 0:
-                                break
-                                
-                            amount_due = schedule.amount - schedule.amount_paid
-                            
-                            if remaining_amount >= amount_due:
-                                # Full payment for this schedule
-                                schedule.amount_paid += amount_due
-                                schedule.status = 'PAID'
-                                schedule.payment_date = timezone.now()
-                                remaining_amount -= amount_due
-                            else:
-                                # Partial payment
-                                schedule.amount_paid += remaining_amount
-                                schedule.status = 'PARTIAL'
-                                remaining_amount = 0
-                                
-                            schedule.save()
-                        
-                        # Calculate new total after this payment
-                        new_total_paid = total_repaid + payment_amount
+                        # Update the running totals
+                        loan.add_repayment(payment_amount)
+                        new_total_paid = loan.total_repaid
                         
                         # Update loan status
                         loan_status = 'ACTIVE'
@@ -88,7 +182,15 @@ class RepaymentService:
                         elif loan.status == 'OVERDUE':
                             loan.status = 'ACTIVE'
                         
-                        loan.save()
+                        loan.save(update_fields=['status'])
+                        
+                        remaining_balance = loan.outstanding_balance
+                        if loan_status == 'PAID':
+                            message = f"Congratulations! Your loan of {loan.amount_approved} RWF has been fully repaid."
+                        else:
+                            message = f"Payment of {payment_amount} RWF received. Remaining balance: {remaining_balance} RWF"
+                        queue_sms(loan.farmer.phone_number, message)
+                        mark_event_processed("Repayment processed successfully")
                         
                         return {
                             'loan': loan,
@@ -98,7 +200,8 @@ class RepaymentService:
                             'payment_amount': payment_amount,
                             'phone_number': loan.farmer.phone_number,
                             'amount_approved': loan.amount_approved,
-                            'remaining_balance': max(loan.amount_approved - new_total_paid, 0)
+                            'remaining_balance': remaining_balance,
+                            'allocation': allocation
                         }, None
                         
                 except Loan.DoesNotExist:
@@ -116,22 +219,6 @@ class RepaymentService:
             if not result:
                 return False, error_message
             
-            # Send SMS notifications
-            try:
-                if result['status'] == 'PAID':
-                    await self.sms_service.send_sms(
-                        result['phone_number'],
-                        f"Congratulations! Your loan of {result['amount_approved']} RWF has been fully repaid."
-                    )
-                else:
-                    await self.sms_service.send_sms(
-                        result['phone_number'],
-                        f"Payment of {result['payment_amount']} RWF received. Remaining balance: {result['remaining_balance']} RWF"
-                    )
-            except Exception as e:
-                print(f"SMS notification failed: {e}")
-                # Don't fail the repayment just because SMS failed
-            
             return True, "Repayment processed successfully"
             
         except Exception as e:
@@ -149,34 +236,12 @@ class RepaymentService:
                     repayment = LoanRepayment.objects.create(
                         loan=loan,
                         amount=amount,
-                        reference=reference,
-                        payment_date=timezone.now(),
-                        status='COMPLETED'
+                        transaction_reference=reference
                     )
                     
                     # Update payment schedules - pay oldest due schedule first
-                    remaining = amount
-                    schedules = PaymentSchedule.objects.filter(
-                        loan=loan, 
-                        status='PENDING'
-                    ).order_by('due_date')
-                    
-                    for schedule in schedules:
-                        if remaining <= 0:
-                            break
-                            
-                        if remaining >= schedule.amount:
-                            schedule.amount_paid = schedule.amount
-                            schedule.status = 'PAID'
-                            schedule.payment_date = timezone.now()
-                            remaining -= schedule.amount
-                        else:
-                            schedule.amount_paid = remaining
-                            schedule.status = 'PARTIAL'
-                            schedule.payment_date = timezone.now()
-                            remaining = 0
-                            
-                        schedule.save()
+                    PaymentAllocationService.allocate_payment(loan, amount)
+                    loan.add_repayment(amount)
                     
                     return repayment
             
@@ -188,13 +253,7 @@ class RepaymentService:
     
     async def get_remaining_balance(self, loan):
         """Get remaining balance on a loan"""
-        @sync_to_async
-        def calculate_balance():
-            total_paid = loan.repayments.filter(status='COMPLETED').aggregate(
-                total=models.Sum('amount'))['total'] or 0
-            return max(loan.amount_approved - total_paid, 0)
-        
-        return await calculate_balance()
+        return loan.outstanding_balance
 
     async def update_loan_status(self, loan):
         """Update loan status based on payments"""
@@ -206,16 +265,13 @@ class RepaymentService:
                     return loan
                     
                 # Check if loan is fully paid
-                total_paid = loan.repayments.aggregate(
-                    total=models.Sum('amount'))['total'] or 0
-                
-                if total_paid >= loan.amount_approved:
+                if loan.total_repaid >= loan.amount_approved:
                     loan.status = 'PAID'
                 elif loan.status == 'OVERDUE':
                     # Check if this payment covers the overdue amount
                     loan.status = 'ACTIVE'
                 
-                loan.save()
+                loan.save(update_fields=['status'])
                 return loan
         
         return await update_status()
\ No newline at end of file
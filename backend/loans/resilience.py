@@ -0,0 +1,342 @@
+# backend/loans/resilience.py
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Guard settings used for endpoint families without their own entry below
+PROVIDER_GUARD_DEFAULTS = {
+    # Rolling window of call outcomes the breaker judges the error rate on
+    'window_size': 20,
+    # Fewest calls in the window before the breaker may open
+    'min_calls': 5,
+    # Error rate over the window that opens the breaker
+    'failure_rate': 0.5,
+    # Seconds an open breaker rejects calls before letting a probe through
+    'recovery_timeout': 30.0,
+    # Probe calls allowed at once while half open
+    'half_open_max_calls': 1,
+    # Concurrency limits for AIMD; the limit starts at initial_limit
+    'initial_limit': 10,
+    'min_limit': 1,
+    'max_limit': 50,
+    # Calls slower than this count against the concurrency limit
+    'latency_target': 2.0,
+    # Seconds a call may wait for a concurrency slot before it is shed
+    'max_wait': 5.0,
+}
+# Per endpoint family overrides
+PROVIDER_GUARD_CONFIG = {
+    'momo.collection': {},
+    'momo.disbursement': {},
+    'africastalking.sms': {'latency_target': 3.0},
+}
+
+
+class ProviderUnavailableError(Exception):
+    """Raised instead of calling a provider that is failing or saturated"""
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """The circuit breaker for the endpoint family is open"""
+
+
+class ProviderOverloadedError(ProviderUnavailableError):
+    """No concurrency slot came free within the allowed wait"""
+
+
+def is_failed_response(response):
+    """Server errors and throttling count against the provider; other responses do not"""
+    status_code = getattr(response, 'status_code', None)
+    return status_code is not None and (status_code >= 500 or status_code == 429)
+
+
+class CircuitBreaker:
+    """
+    Closed, open and half-open breaker driven by the error rate over a
+    rolling window of calls.
+
+    State changes are made under a threading lock so that one breaker can
+    be shared by coroutines on different event loops.
+    """
+
+    def __init__(self, name, window_size, min_calls, failure_rate, recovery_timeout, half_open_max_calls):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = 'CLOSED'
+        self.opened_at = None
+        self.transitions = {}
+        self._outcomes = deque(maxlen=window_size)
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        logger.warning(f"Circuit {self.name}: {key}")
+        self.state = state
+        if state == 'OPEN':
+            self.opened_at = time.monotonic()
+        elif state == 'CLOSED':
+            self._outcomes.clear()
+
+    def allow(self):
+        """
+        Admit a call or reject it straight away.
+
+        Returns:
+            True when the call is a half-open probe
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        with self._lock:
+            if self.state == 'OPEN':
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    raise CircuitOpenError(f"{self.name} circuit is open")
+                self._transition('HALF_OPEN')
+
+            if self.state == 'HALF_OPEN':
+                if self._probes >= self.half_open_max_calls:
+                    raise CircuitOpenError(f"{self.name} circuit is half open")
+                self._probes += 1
+                return True
+            return False
+
+    def release_probe(self):
+        """Return a probe slot for a call that never reached the provider"""
+        with self._lock:
+            self._probes = max(self._probes - 1, 0)
+
+    def record(self, failed, probe=False):
+        """Record a call outcome and open or close the breaker accordingly"""
+        with self._lock:
+            if probe:
+                self._probes = max(self._probes - 1, 0)
+
+            if self.state == 'HALF_OPEN':
+                if probe:
+                    self._transition('OPEN' if failed else 'CLOSED')
+                return
+
+            self._outcomes.append(failed)
+            failures = sum(self._outcomes)
+            if (
+                self.state == 'CLOSED' and
+                len(self._outcomes) >= self.min_calls and
+                failures / len(self._outcomes) >= self.failure_rate
+            ):
+                self._transition('OPEN')
+
+    def snapshot(self):
+        with self._lock:
+            outcomes = len(self._outcomes)
+            return {
+                'state': self.state,
+                'error_rate': round(sum(self._outcomes) / outcomes, 3) if outcomes else 0.0,
+                'transitions': dict(self.transitions)
+            }
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit.
+
+    Each fast, successful call raises the limit by 1/limit, about one
+    slot per round of calls. A failed or slow call halves it, at most once
+    per latency_target, so one burst of timeouts does not collapse the
+    limit to the minimum. Waiters may belong to different event loops and
+    are woken on their own loop.
+    """
+
+    def __init__(self, name, initial_limit, min_limit, max_limit, latency_target):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _wake(self):
+        """Hand free slots to waiters; call with the lock held"""
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.get_loop().call_soon_threadsafe(self._grant, future)
+
+    def _grant(self, future):
+        if future.done():
+            # The waiter gave up after the slot was handed over
+            self.release()
+        else:
+            future.set_result(True)
+
+    async def acquire(self, max_wait):
+        """
+        Wait for a concurrency slot.
+
+        Raises:
+            ProviderOverloadedError: If no slot comes free within max_wait seconds
+        """
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+
+        try:
+            await asyncio.wait_for(future, max_wait)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+            raise ProviderOverloadedError(
+                f"{self.name}: no slot within {max_wait}s at limit {int(self.limit)}"
+            )
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def record(self, latency, failed):
+        """Adjust the limit from a completed call's latency and outcome"""
+        with self._lock:
+            self.latency_ewma = latency if self.latency_ewma is None else (
+                0.8 * self.latency_ewma + 0.2 * latency
+            )
+            now = time.monotonic()
+            if failed or latency > self.latency_target:
+                if now - self._last_decrease >= self.latency_target:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self._wake()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'queued': len(self._waiters),
+                'latency_ewma_ms': round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+                'limit_decreases': self.decreases
+            }
+
+
+class ProviderGuard:
+    """Circuit breaker and adaptive concurrency limit for one endpoint family"""
+
+    def __init__(self, name, **config):
+        config = {**PROVIDER_GUARD_DEFAULTS, **config}
+        self.name = name
+        self.max_wait = config['max_wait']
+        self.breaker = CircuitBreaker(
+            name,
+            window_size=config['window_size'],
+            min_calls=config['min_calls'],
+            failure_rate=config['failure_rate'],
+            recovery_timeout=config['recovery_timeout'],
+            half_open_max_calls=config['half_open_max_calls']
+        )
+        self.limiter = AdaptiveLimiter(
+            name,
+            initial_limit=config['initial_limit'],
+            min_limit=config['min_limit'],
+            max_limit=config['max_limit'],
+            latency_target=config['latency_target']
+        )
+        self.counts = {'calls': 0, 'successes': 0, 'failures': 0, 'rejected_open': 0, 'shed_overloaded': 0}
+
+    async def call(self, request, *args, is_failure=is_failed_response, **kwargs):
+        """
+        Await request(*args, **kwargs) under the breaker and the concurrency limit.
+
+        Exceptions and responses for which is_failure returns True count as
+        failures; the response or exception is passed on to the caller.
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+            ProviderOverloadedError: If no concurrency slot came free in time
+        """
+        try:
+            probe = self.breaker.allow()
+        except CircuitOpenError:
+            self.counts['rejected_open'] += 1
+            raise
+
+        try:
+            await self.limiter.acquire(self.max_wait)
+        except ProviderOverloadedError:
+            self.counts['shed_overloaded'] += 1
+            if probe:
+                self.breaker.release_probe()
+            raise
+
+        self.counts['calls'] += 1
+        started = time.monotonic()
+        failed = True
+        try:
+            result = await request(*args, **kwargs)
+            failed = is_failure(result)
+            return result
+        except asyncio.CancelledError:
+            failed = None
+            raise
+        finally:
+            self.limiter.release()
+            if failed is None:
+                if probe:
+                    self.breaker.release_probe()
+            else:
+                self.counts['failures' if failed else 'successes'] += 1
+                self.limiter.record(time.monotonic() - started, failed)
+                self.breaker.record(failed, probe)
+
+    def snapshot(self):
+        return {**self.breaker.snapshot(), **self.limiter.snapshot(), **self.counts}
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def provider_guard(name):
+    """Shared ProviderGuard for an endpoint family such as 'momo.collection'"""
+    with _guards_lock:
+        if name not in _guards:
+            _guards[name] = ProviderGuard(name, **PROVIDER_GUARD_CONFIG.get(name, {}))
+        return _guards[name]
+
+
+def provider_metrics():
+    """State, limits and counters of every guard used in this process"""
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {guard.name: guard.snapshot() for guard in guards}
+
+
+def reset_provider_guards():
+    """Forget all guard state"""
+    with _guards_lock:
+        _guards.clear()
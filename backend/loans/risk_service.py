@@ -6,7 +6,9 @@ from decimal import Decimal
 import numpy as np
 from datetime import timedelta, datetime
 import logging
-from django.db.models import F
+import threading
+from pathlib import Path
+from django.db.models import F, Q, Count, Min
 from .models import Loan, CropCycle, PaymentSchedule
 from .external.weather_api import WeatherService
 from .external.satellite_api import SatelliteDataService
@@ -286,4 +288,234 @@ class EnhancedCreditScoring:
         elif years >= 1:
             return 60
         else:
-            return 40  # New farmer
\ No newline at end of file
+            return 40  # New farmer
+
+# Feature order the serialised scoring model was trained on. Changing this
+# list requires retraining the artifact (see `train_credit_model`).
+SCORING_FEATURES = [
+    'farm_size',
+    'total_loans',
+    'paid_loans',
+    'defaulted_loans',
+    'paid_installments',
+    'overdue_installments',
+    'crop_types',
+    'years_active',
+    'ndvi_value',
+    'rainfall_anomaly_mm',
+]
+
+_scoring_model = None
+_scoring_model_lock = threading.Lock()
+
+
+def get_scoring_model():
+    """
+    Load the serialised scoring model once per worker process.
+
+    The artifact (and scikit-learn/joblib with it) is only imported on first
+    use so that web workers that never score do not pay the import cost.
+    Returns a dict with the fitted estimator and its version string.
+    """
+    global _scoring_model
+    if _scoring_model is None:
+        with _scoring_model_lock:
+            if _scoring_model is None:
+                import joblib
+
+                path = Path(settings.CREDIT_MODEL_PATH)
+                if not path.exists():
+                    raise FileNotFoundError(f"Credit scoring model not found at {path}")
+
+                artifact = joblib.load(path)
+                if not isinstance(artifact, dict):
+                    artifact = {'model': artifact}
+                artifact.setdefault('version', f"{path.stem}-{int(path.stat().st_mtime)}")
+                artifact.setdefault('features', SCORING_FEATURES)
+
+                if list(artifact['features']) != SCORING_FEATURES:
+                    raise ValueError(
+                        f"Model {artifact['version']} was trained on a different feature set"
+                    )
+
+                _scoring_model = artifact
+                logger.info(f"Loaded credit scoring model {artifact['version']} from {path}")
+    return _scoring_model
+
+
+def reset_scoring_model():
+    """Drop the cached model so the next call reloads it from disk"""
+    global _scoring_model
+    with _scoring_model_lock:
+        _scoring_model = None
+
+
+def build_feature_matrix(farmers):
+    """
+    Build the scoring feature matrix for a list of farmers.
+
+    Uses one aggregate query per related table regardless of how many
+    farmers are passed in. Rows are returned in the same order as `farmers`.
+    """
+    farmer_ids = [farmer.id for farmer in farmers]
+
+    loan_stats = {
+        row['farmer_id']: row
+        for row in Loan.objects.filter(farmer_id__in=farmer_ids)
+        .values('farmer_id')
+        .annotate(
+            total=Count('id'),
+            paid=Count('id', filter=Q(status='PAID')),
+            defaulted=Count('id', filter=Q(status='DEFAULTED')),
+            first_application=Min('application_date'),
+        )
+    }
+    schedule_stats = {
+        row['loan__farmer_id']: row
+        for row in PaymentSchedule.objects.filter(loan__farmer_id__in=farmer_ids)
+        .values('loan__farmer_id')
+        .annotate(
+            paid=Count('id', filter=Q(status='PAID')),
+            overdue=Count('id', filter=Q(status='OVERDUE')),
+        )
+    }
+    crop_stats = {
+        row['farmer_id']: row
+        for row in CropCycle.objects.filter(farmer_id__in=farmer_ids)
+        .values('farmer_id')
+        .annotate(
+            crop_types=Count('crop_type', distinct=True),
+            first_planting=Min('planting_date'),
+        )
+    }
+
+    today = timezone.now().date()
+    rows = [
+        _feature_row(
+            farmer,
+            loan_stats.get(farmer.id, {}),
+            schedule_stats.get(farmer.id, {}),
+            crop_stats.get(farmer.id, {}),
+            today
+        )
+        for farmer in farmers
+    ]
+    return np.array(rows, dtype=float).reshape(len(rows), len(SCORING_FEATURES))
+
+
+def build_history_matrix(farmers, cutoffs):
+    """
+    Build the scoring feature matrix from each farmer's history before a cutoff.
+
+    Used for training: with a loan's application date as the cutoff, the
+    row describes only what was known when that loan was applied for, so
+    the features never contain the outcome the model learns to predict.
+    Loans are counted if applied for, schedules if due and crops if planted
+    before the cutoff. Uses one query per related table.
+
+    Args:
+        farmers: Farmers, repeated once per row
+        cutoffs: Aware datetimes aligned with farmers
+    """
+    farmer_ids = {farmer.id for farmer in farmers}
+
+    loans, schedules, crops = {}, {}, {}
+    for row in Loan.objects.filter(farmer_id__in=farmer_ids).values('farmer_id', 'status', 'application_date'):
+        loans.setdefault(row['farmer_id'], []).append(row)
+    for row in PaymentSchedule.objects.filter(loan__farmer_id__in=farmer_ids).values(
+        'loan__farmer_id', 'status', 'due_date'
+    ):
+        schedules.setdefault(row['loan__farmer_id'], []).append(row)
+    for row in CropCycle.objects.filter(farmer_id__in=farmer_ids).values('farmer_id', 'crop_type', 'planting_date'):
+        crops.setdefault(row['farmer_id'], []).append(row)
+
+    rows = []
+    for farmer, cutoff in zip(farmers, cutoffs):
+        prior_loans = [loan for loan in loans.get(farmer.id, []) if loan['application_date'] < cutoff]
+        prior_schedules = [s for s in schedules.get(farmer.id, []) if s['due_date'] < cutoff]
+        prior_crops = [crop for crop in crops.get(farmer.id, []) if crop['planting_date'] < cutoff.date()]
+        rows.append(_feature_row(
+            farmer,
+            {
+                'total': len(prior_loans),
+                'paid': sum(1 for loan in prior_loans if loan['status'] == 'PAID'),
+                'defaulted': sum(1 for loan in prior_loans if loan['status'] == 'DEFAULTED'),
+                'first_application': min((loan['application_date'] for loan in prior_loans), default=None),
+            },
+            {
+                'paid': sum(1 for s in prior_schedules if s['status'] == 'PAID'),
+                'overdue': sum(1 for s in prior_schedules if s['status'] == 'OVERDUE'),
+            },
+            {
+                'crop_types': len({crop['crop_type'] for crop in prior_crops}),
+                'first_planting': min((crop['planting_date'] for crop in prior_crops), default=None),
+            },
+            cutoff.date()
+        ))
+
+    return np.array(rows, dtype=float).reshape(len(rows), len(SCORING_FEATURES))
+
+
+def _feature_row(farmer, loans, schedules, crops, today):
+    """One row of SCORING_FEATURES from a farmer's aggregated loan, schedule and crop stats"""
+    first_dates = [
+        d for d in (
+            loans.get('first_application') and loans['first_application'].date(),
+            crops.get('first_planting'),
+        ) if d
+    ]
+    years_active = (today - min(first_dates)).days / 365 if first_dates else 0.0
+
+    return [
+        float(farmer.farm_size or 0),
+        loans.get('total', 0),
+        loans.get('paid', 0),
+        loans.get('defaulted', 0),
+        schedules.get('paid', 0),
+        schedules.get('overdue', 0),
+        crops.get('crop_types', 0),
+        years_active,
+        farmer.ndvi_value if farmer.ndvi_value is not None else 0.0,
+        farmer.rainfall_anomaly_mm if farmer.rainfall_anomaly_mm is not None else 0.0,
+    ]
+
+
+class ModelCreditScoring(EnhancedCreditScoring):
+    """
+    Credit scoring backed by a pre-trained classifier.
+
+    Drop-in alternative to EnhancedCreditScoring: `calculate_score` returns a
+    0-100 score, and `score_batch` scores many farmers with a single
+    `predict_proba` call. Falls back to the traditional score if the model
+    artifact is unavailable.
+    """
+
+    async def calculate_score(self, farmer):
+        """Calculate credit score for one farmer using the trained model"""
+        scores = await self.score_batch([farmer])
+        return scores[0]
+
+    async def score_batch(self, farmers):
+        """Score a list of farmers, returning scores in the same order"""
+        return await sync_to_async(self.score_batch_sync)(list(farmers))
+
+    def score_batch_sync(self, farmers):
+        """Synchronous batch scoring for use from tasks and commands"""
+        if not farmers:
+            return []
+
+        try:
+            artifact = get_scoring_model()
+        except Exception as e:
+            logger.error(f"Model scoring unavailable, using traditional score: {str(e)}")
+            return [self._traditional_score(farmer) for farmer in farmers]
+
+        features = build_feature_matrix(farmers)
+        # Probability of the positive (repaid) class, scaled to 0-100
+        probabilities = artifact['model'].predict_proba(features)[:, 1]
+        return [round(float(p) * 100, 2) for p in probabilities]
+
+    @property
+    def model_version(self):
+        """Version string of the loaded model artifact"""
+        return get_scoring_model()['version']
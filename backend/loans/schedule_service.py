@@ -0,0 +1,168 @@
+# backend/loans/schedule_service.py
+
+import logging
+import time
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from .models import LoanProduct, PaymentSchedule
+from .services import BULK_QUERY_CHUNK_SIZE, _chunks
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT when writing generated schedules
+SCHEDULE_BULK_CREATE_BATCH_SIZE = 2000
+# Installment length of the fixed monthly schedule; interest accrues per 30 days
+DAYS_PER_MONTH = 30
+# Interest in cents is balance * rate in hundredths of a percent a year * days
+# divided by this; the product fits in int64 for any stored amount and rate
+# over more than ten years
+INTEREST_DIVISOR = 100 * 100 * 12 * DAYS_PER_MONTH
+
+
+def to_minor_units(amount):
+    """Decimal amount as integer cents"""
+    return int(Decimal(amount).scaleb(2).to_integral_value())
+
+
+def from_minor_units(cents):
+    """Integer cents as an exact two-place Decimal"""
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def amortise(amounts, rates, days):
+    """
+    Equal-principal installments for many loans with the same installment count.
+
+    All arithmetic is on int64 arrays in minor units. Each installment's
+    principal is the amount divided by the installment count, rounded down,
+    and the remainder is added to the final installment, so principal always
+    sums to the amount exactly. Interest on the balance outstanding before
+    each installment is rounded half up to the cent.
+
+    Args:
+        amounts: Array of loan amounts in cents, shape (loans,)
+        rates: Array of annual interest rates in hundredths of a percent, shape (loans,)
+        days: Array of days of interest per installment, shape (loans, installments)
+
+    Returns:
+        Tuple of (principal, interest) arrays in cents, shape (loans, installments)
+    """
+    installments = days.shape[1]
+    base = amounts // installments
+    principal = np.repeat(base[:, None], installments, axis=1)
+    principal[:, -1] += amounts - base * installments
+
+    balance = amounts[:, None] - base[:, None] * np.arange(installments)
+    accrued = balance * rates[:, None] * np.maximum(days, 0)
+    interest = (2 * accrued + INTEREST_DIVISOR) // (2 * INTEREST_DIVISOR)
+    return principal, interest
+
+
+class BulkScheduleGenerator:
+    """
+    Generates payment schedules for many loans at once.
+
+    Produces the same installments as LoanService.create_payment_schedule and
+    create_harvest_based_schedule, but loans with the same installment count
+    are amortised together as arrays, every amount is exact to the cent, and
+    all schedules are written with one chunked bulk_create. Loans that
+    already have schedules are skipped.
+    """
+
+    def __init__(self, batch_size=SCHEDULE_BULK_CREATE_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def build(self, loans, harvest_dates=None, now=None):
+        """
+        Build unsaved PaymentSchedule objects for loans.
+
+        Args:
+            loans: Loans with amount_approved set
+            harvest_dates: Optional {loan_id: [date, ...]}; those loans are
+                paid after each harvest plus the product's grace period,
+                the others monthly over the product's duration
+            now: Start of schedules for loans not yet disbursed
+
+        Returns:
+            List of PaymentSchedule objects, grouped by loan in installment order
+        """
+        harvest_dates = harvest_dates or {}
+        now = now or timezone.now()
+        products = LoanProduct.objects.in_bulk({loan.loan_product_id for loan in loans})
+
+        # Loans grouped by installment count, with their due dates and interest days
+        groups = {}
+        for loan in loans:
+            product = products[loan.loan_product_id]
+            start = loan.disbursement_date or now
+            dates = sorted(harvest_dates.get(loan.id) or [])
+            if dates:
+                grace = timedelta(days=product.grace_period_days)
+                due_dates = [
+                    timezone.make_aware(datetime.combine(harvest + grace, dt_time.min))
+                    for harvest in dates
+                ]
+                days = [(harvest + grace - start.date()).days for harvest in dates]
+            else:
+                # Products shorter than a month get a single installment
+                count = max(product.duration_days // DAYS_PER_MONTH, 1)
+                due_dates = [start + timedelta(days=DAYS_PER_MONTH * n) for n in range(1, count + 1)]
+                days = [DAYS_PER_MONTH] * count
+            groups.setdefault(len(days), []).append((loan, product, due_dates, days))
+
+        built = {}
+        for members in groups.values():
+            principal, interest = amortise(
+                np.array([to_minor_units(loan.amount_approved) for loan, _, _, _ in members], dtype=np.int64),
+                np.array([to_minor_units(product.interest_rate) for _, product, _, _ in members], dtype=np.int64),
+                np.array([days for _, _, _, days in members], dtype=np.int64)
+            )
+            total = principal + interest
+            for row, (loan, _, due_dates, _) in enumerate(members):
+                built[loan.id] = [
+                    PaymentSchedule(
+                        loan=loan,
+                        installment_number=number,
+                        due_date=due_date,
+                        principal_amount=from_minor_units(p),
+                        interest_amount=from_minor_units(i),
+                        amount=from_minor_units(t),
+                        status='PENDING'
+                    )
+                    for number, (due_date, p, i, t) in enumerate(
+                        zip(due_dates, principal[row].tolist(), interest[row].tolist(), total[row].tolist()), 1
+                    )
+                ]
+        return [schedule for loan in loans for schedule in built[loan.id]]
+
+    def generate(self, loans, harvest_dates=None, now=None):
+        """
+        Build and save schedules for loans that have none yet.
+
+        Returns:
+            Dictionary with loans scheduled, loans skipped, schedules
+            created and elapsed time
+        """
+        started = time.perf_counter()
+        loans = [loan for loan in loans if loan.amount_approved]
+        with transaction.atomic():
+            scheduled = set()
+            for chunk in _chunks([loan.id for loan in loans], BULK_QUERY_CHUNK_SIZE):
+                scheduled.update(
+                    PaymentSchedule.objects.filter(loan_id__in=chunk).values_list('loan_id', flat=True).distinct()
+                )
+            pending = [loan for loan in loans if loan.id not in scheduled]
+            schedules = self.build(pending, harvest_dates, now) if pending else []
+            PaymentSchedule.objects.bulk_create(schedules, batch_size=self.batch_size)
+
+        result = {
+            'loans': len(pending),
+            'skipped': len(loans) - len(pending),
+            'schedules': len(schedules),
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        }
+        logger.info(f"Bulk schedule generation: {result}")
+        return result
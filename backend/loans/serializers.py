@@ -8,8 +8,10 @@ from farmers.serializers import SimpleFarmerSerializer
 from .models import (
     Loan, LoanProduct, LoanRepayment, Transaction, PaymentSchedule,
     LoanToken, TokenTransaction, ApprovedVendor,
-    CropCycle, HarvestBasedPaymentSchedule, HarvestPaymentInstallment
+    CropCycle, HarvestBasedPaymentSchedule, HarvestPaymentInstallment,
+    CreditScoreExplanation
 )
+from .archive_service import loan_repayments, loan_transactions
 from rest_framework import serializers
 from .models import Farmer
 
@@ -116,11 +118,34 @@ class HarvestScheduleSerializer(serializers.ModelSerializer):
         model = HarvestBasedPaymentSchedule
         fields = ['id', 'created_at', 'updated_at', 'crop_details', 'installments']
 
+class RepaymentRecordSerializer(serializers.Serializer):
+    """A repayment row from the live table or an archive file"""
+    id = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    payment_date = serializers.DateTimeField()
+    transaction_reference = serializers.CharField()
+
+class TransactionRecordSerializer(serializers.Serializer):
+    """A transaction row from the live table or an archive file"""
+    id = serializers.UUIDField()
+    transaction_type = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    currency = serializers.CharField()
+    status = serializers.CharField()
+    reference = serializers.CharField()
+    created_at = serializers.DateTimeField()
+
+class BulkTransitionOptionsSerializer(serializers.Serializer):
+    """Options for a bulk lifecycle transition; form strings like 'false' parse as booleans"""
+    disburse = serializers.BooleanField(default=True)
+
 # Composite serializers
 class DetailedLoanSerializer(serializers.ModelSerializer):
     farmer = SimpleFarmerSerializer(read_only=True)
     loan_product = LoanProductSerializer(read_only=True)
-    repayments = LoanRepaymentSerializer(many=True, read_only=True, source='loanrepayment_set')
+    # Read through to the archive files once a closed loan has been archived
+    repayments = serializers.SerializerMethodField()
+    transactions = serializers.SerializerMethodField()
     payment_schedule = PaymentScheduleSerializer(read_only=True)
     harvest_schedule = HarvestScheduleSerializer(read_only=True)
     token = LoanTokenSerializer(read_only=True)
@@ -130,7 +155,13 @@ class DetailedLoanSerializer(serializers.ModelSerializer):
         fields = ['id', 'farmer', 'loan_product', 'amount_requested', 'amount_approved',
                  'status', 'disbursement_status', 'application_date', 'approval_date',
                  'disbursement_date', 'due_date', 'credit_score', 'momo_reference',
-                 'repayments', 'payment_schedule', 'harvest_schedule', 'token']
+                 'repayments', 'transactions', 'payment_schedule', 'harvest_schedule', 'token']
+
+    def get_repayments(self, obj):
+        return RepaymentRecordSerializer(loan_repayments(obj.id), many=True).data
+
+    def get_transactions(self, obj):
+        return TransactionRecordSerializer(loan_transactions(obj.id), many=True).data
 
 class FarmerDashboardSerializer(serializers.ModelSerializer):
     active_loans_count = serializers.IntegerField(read_only=True)
@@ -225,3 +256,7 @@ class LoanApplicationDetailSerializer(serializers.ModelSerializer):
         ]
 
 
+class CreditScoreExplanationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CreditScoreExplanation
+        fields = ['score', 'model_version', 'base_value', 'top_features', 'created_at']
@@ -5,14 +5,40 @@ from django.conf import settings
 from django.utils import timezone
 import httpx
 import uuid
+import logging
+import time
 
 from farmers.models import Farmer
 from .models import Loan, LoanRepayment, PaymentSchedule, LoanProduct
 from .momo_integration import MoMoAPI
 from .sms_service import SMSService  # Import from dedicated file
+from .outbox_service import queue_sms
+from .allocation_service import OPEN_SCHEDULE_STATUSES, PaymentAllocationService
 from asgiref.sync import sync_to_async
 from .models import CropCycle
 
+logger = logging.getLogger(__name__)
+
+# Loan statuses that block a new application
+ACTIVE_LOAN_STATUSES = ['PENDING', 'APPROVED', 'DISBURSED', 'ACTIVE']
+# Loan statuses that count towards a farmer's outstanding exposure
+EXPOSURE_LOAN_STATUSES = ['DISBURSED', 'ACTIVE']
+# Late penalty per full day overdue, and its cap, as a fraction of the installment
+OVERDUE_DAILY_PENALTY = Decimal('0.01')
+OVERDUE_PENALTY_CAP = Decimal('0.3')
+# Schedule statuses that still get upcoming payment reminders
+UPCOMING_REMINDER_STATUSES = ['PENDING', 'PARTIAL']
+# Maximum number of reminder SMS requests in flight at once
+REMINDER_CONCURRENCY = 50
+# Maximum number of ids passed to a single IN (...) clause
+BULK_QUERY_CHUNK_SIZE = 500
+
+
+def _chunks(items, size):
+    """Yield successive slices of `items` of at most `size` elements"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 
 class AfricasTalkingService:
     def __init__(self):
@@ -56,111 +82,177 @@ class PaymentScheduleService:
         self.sms_service = SMSService()
 
     async def check_overdue_payments(self):
-        """Check for overdue payments and update status"""
+        """
+        Mark overdue payments and apply penalties, then send reminders.
+        
+        The status and penalty update is a single set-based UPDATE; reminders
+        are selected and sent afterwards in batches.
+        
+        Returns:
+            Dictionary with rows touched, reminders sent and elapsed time
+        """
+        started = time.perf_counter()
         current_date = timezone.now()
         
+        updated = await sync_to_async(self.mark_overdue_schedules)(current_date)
+        reminders = await self.send_overdue_reminders(current_date)
+        
+        result = {
+            'schedules_updated': updated,
+            'reminders_sent': reminders['sent'],
+            'reminders_failed': reminders['failed'],
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        }
+        logger.info(f"Overdue payment check: {result}")
+        return result
+
+    @staticmethod
+    def mark_overdue_schedules(current_date):
+        """
+        Set status OVERDUE and the late penalty on every schedule at least a
+        day past due, in one UPDATE.
+        
+        The penalty is 1% of the installment per full day overdue, capped at
+        30%. Whole days are bucketed with CASE on due_date so the statement
+        stays portable across databases.
+        """
+        max_days = int(OVERDUE_PENALTY_CAP / OVERDUE_DAILY_PENALTY)
+        penalty = models.Case(
+            *[
+                models.When(
+                    due_date__lte=current_date - timedelta(days=days),
+                    then=models.F('amount') * (OVERDUE_DAILY_PENALTY * days)
+                )
+                for days in range(max_days, 0, -1)
+            ],
+            default=models.F('penalty_amount'),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2)
+        )
+        
+        return PaymentSchedule.objects.filter(
+            status__in=OPEN_SCHEDULE_STATUSES,
+            due_date__lte=current_date - timedelta(days=1)
+        ).update(
+            status='OVERDUE',
+            penalty_amount=penalty,
+            updated_at=current_date
+        )
+
+    async def send_overdue_reminders(self, current_date, batch_size=100):
+        """Send reminders for overdue schedules not reminded in the last 24 hours"""
         @sync_to_async
-        def get_overdue_schedules():
+        def get_reminder_batch(after_id):
             return list(PaymentSchedule.objects.filter(
-                status='PENDING',
-                due_date__lt=current_date
-            ).select_related('loan__farmer'))
+                models.Q(last_reminder_sent__isnull=True) |
+                models.Q(last_reminder_sent__lt=current_date - timedelta(days=1)),
+                status='OVERDUE',
+                id__gt=after_id
+            ).order_by('id').values(
+                'id', 'amount', 'penalty_amount', 'due_date', 'loan__farmer__phone_number'
+            )[:batch_size])
         
-        overdue_schedules = await get_overdue_schedules()
-        
-        for schedule in overdue_schedules:
-            days_overdue = (current_date - schedule.due_date).days
-            if days_overdue > 0:
-                # Update status to overdue
-                schedule.status = 'OVERDUE'
-                # Calculate penalty (1% per day overdue, max 30%)
-                daily_rate = Decimal('0.01')  # 1% per day
-                penalty = schedule.amount * min(daily_rate * days_overdue, Decimal('0.3'))
-                schedule.penalty_amount = penalty
-                await schedule.asave()
-                
-                # Send reminder if none sent in last 24 hours
-                if (not schedule.last_reminder_sent or 
-                    current_date - schedule.last_reminder_sent > timedelta(days=1)):
-                    await self.sms_service.send_sms(
-                        schedule.loan.farmer.phone_number,
-                        f"REMINDER: Your loan payment of {schedule.amount} is {days_overdue} days overdue. " +
-                        f"Current amount due with penalty: {schedule.amount + penalty}. " +
-                        "Please make payment to avoid additional penalties."
-                    )
-                    schedule.last_reminder_sent = current_date
-                    await schedule.asave()
+        @sync_to_async
+        def mark_reminded(schedule_ids):
+            PaymentSchedule.objects.filter(id__in=schedule_ids).update(
+                last_reminder_sent=current_date
+            )
+        
+        sent = failed = 0
+        last_id = 0
+        while True:
+            batch = await get_reminder_batch(last_id)
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+            
+            messages_by_schedule = {
+                schedule['id']: (
+                    schedule['loan__farmer__phone_number'],
+                    f"REMINDER: Your loan payment of {schedule['amount']} is "
+                    f"{(current_date - schedule['due_date']).days} days overdue. " +
+                    f"Current amount due with penalty: {schedule['amount'] + schedule['penalty_amount']}. " +
+                    "Please make payment to avoid additional penalties."
+                )
+                for schedule in batch
+            }
+            results = await self.sms_service.send_keyed(messages_by_schedule)
+            
+            reminded = [schedule_id for schedule_id, status in results.items() if status['success']]
+            await mark_reminded(reminded)
+            sent += len(reminded)
+            failed += len(batch) - len(reminded)
+        
+        return {'sent': sent, 'failed': failed}
 
-    async def send_upcoming_reminders(self):
-        """Send reminders for upcoming payments"""
+    async def send_upcoming_reminders(self, max_concurrency=REMINDER_CONCURRENCY):
+        """
+        Send reminders for upcoming payments (7, 3 and 1 days before due).
+        
+        Runs as a pipeline: one query selects every target schedule, one
+        message is rendered per schedule, and schedules sharing a text are
+        sent as bulk requests with at most `max_concurrency` in flight.
+        
+        Returns:
+            Dictionary with per-run metrics
+        """
+        started = time.perf_counter()
         current_date = timezone.now()
         reminder_days = [7, 3, 1]  # Remind 7 days, 3 days, and 1 day before due date
         
+        # Match whole days as half-open ranges so the due_date index is used
+        days_by_date = {}
+        day_ranges = models.Q()
         for days in reminder_days:
-            target_date = current_date + timedelta(days=days)
-            upcoming_schedules = await PaymentSchedule.objects.filter(
-                status='PENDING',
-                due_date__date=target_date.date()
-            ).select_related('loan__farmer').all()
-            
-            for schedule in upcoming_schedules:
-                await self.sms_service.send_sms(
-                    schedule.loan.farmer.phone_number,
-                    f"REMINDER: Your loan payment of {schedule.amount} is due in {days} " +
-                    f"{'day' if days == 1 else 'days'}. " +
-                    "Please ensure funds are available in your mobile money account."
-                )
-
-    async def apply_payment(self, loan: Loan, amount: Decimal) -> dict:
-        """Apply payment to pending schedules"""
-        remaining_amount = amount
-        applied_to = []
+            target_date = timezone.localtime(current_date + timedelta(days=days)).date()
+            day_start = timezone.make_aware(datetime.combine(target_date, datetime.min.time()))
+            days_by_date[target_date] = days
+            day_ranges |= models.Q(due_date__gte=day_start, due_date__lt=day_start + timedelta(days=1))
         
-        # Wrap the queryset operation with sync_to_async
         @sync_to_async
-        def get_pending_schedules():
+        def get_upcoming_schedules():
             return list(PaymentSchedule.objects.filter(
-                loan=loan,
-                status__in=['PENDING', 'OVERDUE', 'PARTIALLY_PAID']
-            ).order_by('due_date'))
+                day_ranges,
+                status__in=UPCOMING_REMINDER_STATUSES
+            ).values('id', 'amount', 'amount_paid', 'due_date', 'loan__farmer__phone_number'))
         
-        # Get the schedules asynchronously
-        schedules = await get_pending_schedules()
+        schedules = await get_upcoming_schedules()
+        selected_at = time.perf_counter()
         
+        messages_by_schedule = {}
         for schedule in schedules:
-            if remaining_amount <= 0:
-                break
-                
-            # Calculate total due (including any penalties)
-            total_due = schedule.amount + schedule.penalty_amount - schedule.amount_paid
-            
-            if remaining_amount >= total_due:
-                # Full payment
-                schedule.amount_paid += total_due
-                schedule.status = 'PAID'
-                remaining_amount -= total_due
-                applied_to.append({
-                    'installment': schedule.installment_number,
-                    'amount': total_due,
-                    'status': 'PAID'
-                })
-            else:
-                # Partial payment
-                schedule.amount_paid += remaining_amount
-                schedule.status = 'PARTIALLY_PAID'
-                applied_to.append({
-                    'installment': schedule.installment_number,
-                    'amount': remaining_amount,
-                    'status': 'PARTIALLY_PAID'
-                })
-                remaining_amount = 0
-                
-            await schedule.asave()
-            
-        return {
-            'applied_to': applied_to,
-            'remaining': remaining_amount
+            days = days_by_date[timezone.localtime(schedule['due_date']).date()]
+            messages_by_schedule[schedule['id']] = (
+                schedule['loan__farmer__phone_number'],
+                f"REMINDER: Your loan payment of {schedule['amount'] - schedule['amount_paid']} is due in {days} " +
+                f"{'day' if days == 1 else 'days'}. " +
+                "Please ensure funds are available in your mobile money account."
+            )
+        
+        results = await self.sms_service.send_keyed(messages_by_schedule, max_concurrency)
+        sent = sum(status['success'] for status in results.values())
+        failed = len(results) - sent
+        
+        elapsed = time.perf_counter() - started
+        metrics = {
+            'selected': len(schedules),
+            'message_groups': len({message for _, message in messages_by_schedule.values()}),
+            'sent': sent,
+            'failed': failed,
+            'select_seconds': round(selected_at - started, 3),
+            'elapsed_seconds': round(elapsed, 3),
+            'per_second': round(len(schedules) / elapsed, 1) if elapsed else 0.0
         }
+        logger.info(f"Upcoming payment reminders: {metrics}")
+        return metrics
+
+    async def apply_payment(self, loan: Loan, amount: Decimal) -> dict:
+        """Apply payment to pending schedules"""
+        return await sync_to_async(self.allocate_payment)(loan, amount)
+
+    @staticmethod
+    def allocate_payment(loan: Loan, amount: Decimal) -> dict:
+        """Apply payment to open schedules, oldest first, in the caller's transaction"""
+        return PaymentAllocationService.allocate_payment(loan, amount)
     # Add to PaymentScheduleService in loans/services.py
 
     async def send_harvest_based_reminders(self):
@@ -182,6 +274,7 @@ class PaymentScheduleService:
             ).select_related('loan__farmer'))
         
         schedules = await get_upcoming_harvest_schedules()
+        reminders = {}
         
         for schedule in schedules:
             # Find the closest harvest date
@@ -198,12 +291,14 @@ class PaymentScheduleService:
                 days_after_harvest = (schedule.due_date - harvest_cycles.expected_harvest_date).days
                 crop_type = harvest_cycles.get_crop_type_display()
                 
-                await self.sms_service.send_sms(
+                reminders[schedule.id] = (
                     schedule.loan.farmer.phone_number,
                     f"REMINDER: Your loan payment of {schedule.amount} is due on "
                     f"{schedule.due_date.strftime('%d %b %Y')}, which is {days_after_harvest} days "
                     f"after your expected {crop_type} harvest. Please plan accordingly."
                 )
+        
+        await self.sms_service.send_keyed(reminders)
 
 class LoanService:
     def __init__(self):
@@ -252,14 +347,14 @@ class LoanService:
 
     async def check_loan_status(self, loan: Loan) -> None:
         """Check and update loan status based on payments and due dates"""
-        total_paid = await self.get_loan_balance(loan)
+        balance = await self.get_loan_balance(loan)
         current_schedule = await PaymentSchedule.objects.filter(
             loan=loan,
             due_date__lte=timezone.now(),
             status='PENDING'
         ).afirst()
         
-        if total_paid >= loan.amount_approved:
+        if balance <= 0:
             loan.status = 'PAID'
         elif current_schedule and current_schedule.due_date < timezone.now():
             loan.status = 'OVERDUE'
@@ -271,7 +366,7 @@ class LoanService:
         else:
             loan.status = 'ACTIVE'
             
-        await loan.asave()
+        await loan.asave(update_fields=['status'])
 
     # Assuming this is the method being called in the test
     async def apply_for_loan(farmer_id, loan_product_id, amount):
@@ -300,38 +395,43 @@ class LoanService:
 
     # Add to LoanService class
     async def record_repayment(self, loan_id: uuid.UUID, amount: Decimal, momo_reference: str) -> dict:
-        try:
-            async with transaction.atomic():
-                loan = await Loan.objects.aget(id=loan_id)
+        def record():
+            with transaction.atomic():
+                loan = Loan.objects.select_for_update().select_related('farmer').get(id=loan_id)
                 
                 # Create repayment record
-                await LoanRepayment.objects.acreate(
+                LoanRepayment.objects.create(
                     loan=loan,
                     amount=amount,
                     transaction_reference=momo_reference
                 )
 
                 # Apply payment to specific installments
-                payment_service = PaymentScheduleService()
-                payment_allocation = await payment_service.apply_payment(loan, amount)
+                payment_allocation = PaymentAllocationService.allocate_payment(loan, amount)
+                loan.add_repayment(amount)
                 
-                # Update loan status
-                total_repaid = await self.get_loan_balance(loan)
+                # Update loan status; the SMS is queued in the same transaction
+                overdue_schedule = PaymentSchedule.objects.filter(
+                    loan=loan,
+                    due_date__lt=timezone.now(),
+                    status__in=OPEN_SCHEDULE_STATUSES
+                ).order_by('due_date').first()
                 
-                if total_repaid >= loan.amount_approved:
+                if loan.outstanding_balance <= 0:
                     loan.status = 'PAID'
-                    # Send completion SMS
-                    await self.sms_service.send_sms(
-                        loan.farmer.phone_number,
-                        f"Congratulations! Your loan of {loan.amount_approved} has been fully repaid."
+                    message = f"Congratulations! Your loan of {loan.amount_approved} has been fully repaid."
+                elif overdue_schedule:
+                    loan.status = 'OVERDUE'
+                    message = (
+                        f"Payment of {amount} received. Your installment of {overdue_schedule.amount} "
+                        f"is still overdue. Please make payment to avoid penalties."
                     )
                 else:
-                    await self.check_loan_status(loan)
-                    # Send confirmation SMS
-                    await self.sms_service.send_sms(
-                        loan.farmer.phone_number,
-                        f"Payment of {amount} received. Thank you!"
-                    )
+                    loan.status = 'ACTIVE'
+                    message = f"Payment of {amount} received. Thank you!"
+                
+                loan.save(update_fields=['status'])
+                queue_sms(loan.farmer.phone_number, message)
                 
                 return {
                     'status': 'SUCCESS',
@@ -339,16 +439,15 @@ class LoanService:
                     'loan_status': loan.status
                 }
 
+        try:
+            return await sync_to_async(record)()
         except Exception as e:
             return {'status': 'ERROR', 'message': str(e)}
 
     @staticmethod
     async def get_loan_balance(loan) -> Decimal:
-        """Calculate current loan balance"""
-        total_repaid = await LoanRepayment.objects.filter(loan=loan).aggregate(
-            total=models.Sum('amount')
-        )
-        return max(loan.amount_approved - (total_repaid['total'] or 0), 0)
+        """Current loan balance, kept up to date by Loan.add_repayment()"""
+        return loan.outstanding_balance
 
     @staticmethod
     def calculate_credit_score(farmer):
@@ -356,28 +455,80 @@ class LoanService:
         Calculate credit score based on farmer's history and data
         Returns a score between 0 and 100
         """
-        base_score = 50
+        paid_loans = defaulted_loans = on_time_payments = 0
         
         # Factor in previous loans
         previous_loans = Loan.objects.filter(farmer=farmer)
         if previous_loans.exists():
-            # Reward for paid loans
-            paid_loans = previous_loans.filter(status='PAID').count()
-            base_score += min(paid_loans * 10, 30)  # Max 30 points from paid loans
-            
-            # Penalize for defaulted loans
-            defaulted_loans = previous_loans.filter(status='DEFAULTED').count()
-            base_score -= min(defaulted_loans * 20, 40)  # Max 40 points penalty
+            history = previous_loans.aggregate(
+                paid=models.Count('id', filter=models.Q(status='PAID')),
+                defaulted=models.Count('id', filter=models.Q(status='DEFAULTED')),
+                archived_on_time=models.Sum('archive__on_time_repayments')
+            )
+            paid_loans = history['paid']
+            defaulted_loans = history['defaulted']
             
-            # Consider payment timeliness
+            # Consider payment timeliness, including repayments moved to the archive
             on_time_payments = LoanRepayment.objects.filter(
                 loan__in=previous_loans,
                 payment_date__lte=models.F('loan__due_date')
-            ).count()
-            base_score += min(on_time_payments * 5, 15)  # Max 15 points for timeliness
+            ).count() + (history['archived_on_time'] or 0)
+        
+        return LoanService._score_from_history(
+            farmer.farm_size, paid_loans, defaulted_loans, on_time_payments
+        )
+
+    @staticmethod
+    def calculate_credit_scores(farmers):
+        """
+        Batch version of calculate_credit_score.
+
+        Returns a dict of farmer id to score using two aggregate queries per
+        chunk of farmers instead of four queries per farmer.
+        """
+        scores = {}
+        for chunk in _chunks(list(farmers), BULK_QUERY_CHUNK_SIZE):
+            farmer_ids = [farmer.id for farmer in chunk]
+            
+            loan_counts = {
+                row['farmer_id']: row
+                for row in Loan.objects.filter(farmer_id__in=farmer_ids)
+                .values('farmer_id')
+                .annotate(
+                    paid=models.Count('id', filter=models.Q(status='PAID')),
+                    defaulted=models.Count('id', filter=models.Q(status='DEFAULTED')),
+                    archived_on_time=models.Sum('archive__on_time_repayments')
+                )
+            }
+            on_time = dict(
+                LoanRepayment.objects.filter(
+                    loan__farmer_id__in=farmer_ids,
+                    payment_date__lte=models.F('loan__due_date')
+                ).values('loan__farmer_id')
+                .annotate(count=models.Count('id'))
+                .values_list('loan__farmer_id', 'count')
+            )
+            
+            for farmer in chunk:
+                counts = loan_counts.get(farmer.id, {})
+                scores[farmer.id] = LoanService._score_from_history(
+                    farmer.farm_size,
+                    counts.get('paid', 0),
+                    counts.get('defaulted', 0),
+                    on_time.get(farmer.id, 0) + (counts.get('archived_on_time') or 0)
+                )
+        return scores
+
+    @staticmethod
+    def _score_from_history(farm_size, paid_loans, defaulted_loans, on_time_payments):
+        """Shared scoring rules for the single and batch credit score paths"""
+        base_score = 50
+        base_score += min(paid_loans * 10, 30)  # Max 30 points from paid loans
+        base_score -= min(defaulted_loans * 20, 40)  # Max 40 points penalty
+        base_score += min(on_time_payments * 5, 15)  # Max 15 points for timeliness
         
         # Factor in farm size (larger farms get slightly higher scores)
-        base_score += min(farmer.farm_size * 2, 20)
+        base_score += min(farm_size * 2, 20)
         
         # Ensure score is between 0 and 100
         return min(max(base_score, 0), 100)
@@ -394,7 +545,7 @@ class LoanService:
         # Check if farmer has any active loans
         active_loans = Loan.objects.filter(
             farmer=farmer,
-            status__in=['PENDING', 'APPROVED', 'DISBURSED', 'ACTIVE']
+            status__in=ACTIVE_LOAN_STATUSES
         )
         if active_loans.exists():
             return False, "Farmer has existing active loans"
@@ -407,7 +558,7 @@ class LoanService:
         # Check total exposure
         total_exposure = Loan.objects.filter(
             farmer=farmer,
-            status__in=['DISBURSED', 'ACTIVE']
+            status__in=EXPOSURE_LOAN_STATUSES
         ).aggregate(total=models.Sum('amount_approved'))['total'] or 0
         
         if total_exposure + amount > settings.MAXIMUM_EXPOSURE:
@@ -415,6 +566,92 @@ class LoanService:
             
         return True, "Eligible for loan"
 
+    @staticmethod
+    def check_bulk_eligibility(applications):
+        """
+        Check eligibility for many (farmer, product, amount) applications at once.
+
+        Applies the same rules as check_loan_eligibility, but resolves farmers,
+        products, active loans, exposure and credit scores with set-based
+        queries. A farmer can only be pre-approved once per batch.
+        
+        Args:
+            applications: iterable of dicts with farmer_id, loan_product_id and amount
+        
+        Returns:
+            List of dicts (one per application, in input order) with
+            eligible, reason and credit_score
+        """
+        applications = list(applications)
+        farmer_ids = {app['farmer_id'] for app in applications}
+        product_ids = {app['loan_product_id'] for app in applications}
+        
+        farmers = {}
+        active_farmer_ids = set()
+        exposures = {}
+        for chunk in _chunks(list(farmer_ids), BULK_QUERY_CHUNK_SIZE):
+            farmers.update(Farmer.objects.in_bulk(chunk))
+            active_farmer_ids.update(
+                Loan.objects.filter(
+                    farmer_id__in=chunk,
+                    status__in=ACTIVE_LOAN_STATUSES
+                ).values_list('farmer_id', flat=True).distinct()
+            )
+            exposures.update(
+                Loan.objects.filter(
+                    farmer_id__in=chunk,
+                    status__in=EXPOSURE_LOAN_STATUSES
+                ).values('farmer_id')
+                .annotate(total=models.Sum('amount_approved'))
+                .values_list('farmer_id', 'total')
+            )
+        products = LoanProduct.objects.in_bulk(list(product_ids))
+        
+        # Only score farmers who can still pass the cheaper checks
+        scorable = [
+            farmer for farmer_id, farmer in farmers.items()
+            if farmer_id not in active_farmer_ids
+        ]
+        scores = LoanService.calculate_credit_scores(scorable)
+        
+        results = []
+        approved_farmer_ids = set()
+        for app in applications:
+            farmer = farmers.get(app['farmer_id'])
+            loan_product = products.get(app['loan_product_id'])
+            amount = Decimal(str(app['amount']))
+            result = {
+                'farmer_id': app['farmer_id'],
+                'loan_product_id': app['loan_product_id'],
+                'amount': amount,
+                'eligible': False,
+                'credit_score': scores.get(app['farmer_id']),
+            }
+            results.append(result)
+            
+            if farmer is None:
+                result['reason'] = "Farmer not found"
+            elif loan_product is None:
+                result['reason'] = "Loan product not found"
+            elif amount < loan_product.min_amount or amount > loan_product.max_amount:
+                result['reason'] = (
+                    f"Loan amount must be between {loan_product.min_amount} and {loan_product.max_amount}"
+                )
+            elif farmer.id in active_farmer_ids:
+                result['reason'] = "Farmer has existing active loans"
+            elif farmer.id in approved_farmer_ids:
+                result['reason'] = "Farmer already pre-approved in this batch"
+            elif result['credit_score'] < settings.MINIMUM_CREDIT_SCORE:
+                result['reason'] = f"Credit score ({result['credit_score']}) below minimum requirement"
+            elif exposures.get(farmer.id, 0) + amount > settings.MAXIMUM_EXPOSURE:
+                result['reason'] = "Maximum exposure limit reached"
+            else:
+                result['eligible'] = True
+                result['reason'] = "Eligible for loan"
+                approved_farmer_ids.add(farmer.id)
+        
+        return results
+
     @staticmethod
     async def process_loan_application(farmer, loan_product, amount):
         """Process a loan application"""
@@ -468,7 +705,7 @@ class LoanService:
             
             loan.disbursement_status = 'PROCESSING'
             loan.momo_reference = transaction['reference']
-            loan.save()
+            loan.save(update_fields=['disbursement_status', 'momo_reference'])
             
             # Send disbursement SMS
             await SMSService.send_sms(
@@ -480,7 +717,7 @@ class LoanService:
             
         except Exception as e:
             loan.disbursement_status = 'FAILED'
-            loan.save()
+            loan.save(update_fields=['disbursement_status'])
             return False, str(e)
 
     @staticmethod
@@ -501,7 +738,7 @@ class LoanService:
         
         if disbursement['status'] == 'SUCCESSFUL':
             loan.status = 'DISBURSED'
-            await loan.asave()
+            await loan.asave(update_fields=['status'])
             return True
         return False
     
@@ -578,10 +815,9 @@ class LoanRepaymentService:
                         transaction_reference=transaction_reference
                     )
                     
-                    # Calculate total repaid
-                    total_repaid = loan.repayments.aggregate(
-                        total=models.Sum('amount')
-                    )['total'] or 0
+                    # Update running totals
+                    loan.add_repayment(amount)
+                    total_repaid = loan.total_repaid
                     
                     # Update loan status
                     if total_repaid >= loan.amount_approved:
@@ -594,7 +830,7 @@ class LoanRepaymentService:
                         loan.status = 'ACTIVE'
                         status = 'ACTIVE'
                     
-                    loan.save()
+                    loan.save(update_fields=['status'])
                     return repayment, total_repaid, status
 
             repayment, total_repaid, status = await create_repayment_and_update()
@@ -609,7 +845,7 @@ class LoanRepaymentService:
                 else:
                     await self.sms_service.send_sms(
                         loan.farmer.phone_number,
-                        f"Payment of {amount} RWF received. Remaining balance: {loan.amount_approved - total_repaid} RWF"
+                        f"Payment of {amount} RWF received. Remaining balance: {loan.outstanding_balance} RWF"
                     )
             except Exception as e:
                 print(f"SMS notification failed: {e}")
@@ -623,11 +859,7 @@ class LoanRepaymentService:
     @staticmethod
     def get_loan_balance(loan):
         """Get current loan balance"""
-        total_repaid = loan.repayments.aggregate(
-            total=models.Sum('amount')
-        )['total'] or 0
-        
-        return max(loan.amount_approved - total_repaid, 0)
+        return loan.outstanding_balance
 
 
 class DynamicCreditScoringService:
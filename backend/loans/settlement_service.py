@@ -0,0 +1,164 @@
+# backend/loans/settlement_service.py
+
+import logging
+import uuid
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from .disbursement_service import BulkDisbursementRunner
+from .models import ApprovedVendor, TokenTransaction, VendorSettlement
+from .outbox_service import queue_sms
+
+logger = logging.getLogger(__name__)
+
+# Vendors settled per batch
+SETTLEMENT_BATCH_SIZE = 100
+# Held while a settlement run is in progress so that a second run does not start
+SETTLEMENT_RUN_LOCK_KEY = 'vendor-settlement-running'
+
+
+class VendorSettlementRunner(BulkDisbursementRunner):
+    """
+    Pays each vendor one netted MoMo transfer for its pending token redemptions.
+
+    Batches, concurrency and resumption come from BulkDisbursementRunner.
+    The checkpoint is a PENDING VendorSettlement: its redemptions are moved
+    into it before the transfer is sent, so a crash or a network error
+    leaves the settlement to be resent under the same reference.
+    """
+    item_label = 'settlements'
+    run_lock_key = SETTLEMENT_RUN_LOCK_KEY
+    transfer_notes = {'payer_message': 'Input Sales Settlement', 'payee_note': 'Token sales'}
+
+    def __init__(self, batch_size=SETTLEMENT_BATCH_SIZE, **kwargs):
+        super().__init__(batch_size=batch_size, **kwargs)
+        self.period_end = None
+
+    def claim_batch(self, after_id=None):
+        """
+        Select the next batch of vendors with pending redemptions and net them.
+
+        Redemptions made before the run started are moved into a new
+        settlement per vendor, and the settlement amount is summed from the
+        rows actually moved, so a redemption recorded meanwhile waits for the
+        next run. A PENDING settlement left by an earlier run is resent as is,
+        and that vendor's newer redemptions wait for the following run.
+
+        Returns:
+            List of (vendor, settlement) pairs
+        """
+        if after_id is None:
+            self.period_end = timezone.now()
+
+        with transaction.atomic():
+            vendors = ApprovedVendor.objects.filter(
+                Q(transactions__status='PENDING', transactions__created_at__lt=self.period_end) |
+                Q(settlements__status='PENDING')
+            ).distinct().order_by('id')
+            if after_id is not None:
+                vendors = vendors.filter(id__gt=after_id)
+            vendors = list(vendors[:self.batch_size])
+            if not vendors:
+                return []
+
+            settlements = {
+                settlement.vendor_id: settlement
+                for settlement in VendorSettlement.objects.filter(vendor__in=vendors, status='PENDING')
+            }
+
+            new_settlements = VendorSettlement.objects.bulk_create([
+                VendorSettlement(
+                    vendor=vendor,
+                    reference=str(uuid.uuid4()),
+                    phone_number=vendor.phone_number,
+                    period_end=self.period_end
+                )
+                for vendor in vendors if vendor.id not in settlements
+            ])
+            for settlement in new_settlements:
+                TokenTransaction.objects.filter(
+                    vendor_id=settlement.vendor_id, status='PENDING', created_at__lt=self.period_end
+                ).update(settlement=settlement, status='SETTLING')
+
+            totals = {
+                row['settlement']: row
+                for row in TokenTransaction.objects.filter(settlement__in=new_settlements).values(
+                    'settlement'
+                ).annotate(total=Sum('amount'), count=Count('id'))
+            }
+            for settlement in new_settlements:
+                row = totals.get(settlement.id)
+                if row:
+                    settlement.amount = row['total']
+                    settlement.transaction_count = row['count']
+                    settlements[settlement.vendor_id] = settlement
+            VendorSettlement.objects.bulk_update(new_settlements, ['amount', 'transaction_count'])
+            # Nothing left to net, e.g. a redemption settled by another run
+            VendorSettlement.objects.filter(
+                id__in=[settlement.id for settlement in new_settlements if settlement.id not in totals]
+            ).delete()
+
+        return [(vendor, settlements[vendor.id]) for vendor in vendors if vendor.id in settlements]
+
+    def record_results(self, items, outcomes):
+        """
+        Persist a batch's outcomes.
+
+        Accepted settlements move to PROCESSING, their redemptions are
+        SETTLED and the vendor is notified through the outbox. Rejected
+        settlements are marked FAILED and their redemptions go back to
+        PENDING for the next run. Unknown outcomes are left to be resent.
+
+        Returns:
+            Dictionary of settlement counts by outcome
+        """
+        counts = {'accepted': 0, 'rejected': 0, 'unknown': 0}
+        settled = []
+        failed = []
+        now = timezone.now()
+
+        with transaction.atomic():
+            for (vendor, settlement), (outcome, detail) in zip(items, outcomes):
+                counts[outcome] += 1
+                if outcome == 'accepted':
+                    settlement.status = 'PROCESSING'
+                    settled.append(settlement)
+                    queue_sms(
+                        settlement.phone_number,
+                        f"You have been paid {settlement.amount} RWF for {settlement.transaction_count} "
+                        f"token sales. Reference: {settlement.reference}."
+                    )
+                elif outcome == 'rejected':
+                    logger.warning(f"Settlement {settlement.reference} for vendor {vendor.id} rejected: {detail}")
+                    settlement.status = 'FAILED'
+                    failed.append(settlement)
+                else:
+                    logger.warning(f"Settlement {settlement.reference} not confirmed, will resend: {detail}")
+                    continue
+                settlement.updated_at = now
+
+            if settled:
+                TokenTransaction.objects.filter(settlement__in=settled).update(status='SETTLED')
+            if failed:
+                TokenTransaction.objects.filter(settlement__in=failed).update(status='PENDING', settlement=None)
+            if settled or failed:
+                VendorSettlement.objects.bulk_update(settled + failed, ['status', 'updated_at'])
+
+        return counts
+
+    @staticmethod
+    def settlement_report(since):
+        """
+        Settlements sent or still pending since a run started.
+
+        Returns:
+            List of dicts, one per settlement, ordered by vendor
+        """
+        return list(
+            VendorSettlement.objects.filter(
+                Q(updated_at__gte=since) | Q(status='PENDING')
+            ).order_by('vendor_id', 'created_at').values(
+                'reference', 'vendor_id', 'vendor__name', 'phone_number',
+                'amount', 'transaction_count', 'status', 'period_end'
+            )
+        )
@@ -1,76 +1,278 @@
 # backend/loans/sms_service.py
+import asyncio
+import logging
 import httpx
 from django.conf import settings
 import os
 import sys
 
+from .resilience import ProviderUnavailableError, provider_guard
+
+logger = logging.getLogger(__name__)
+
+AT_MESSAGING_URL = "https://api.africastalking.com/version1/messaging"
+# Recipients per messaging request; the provider takes a comma-separated list
+SMS_BULK_BATCH_SIZE = 100
+# Maximum number of bulk messaging requests in flight at once
+SMS_BULK_CONCURRENCY = 10
+# Per-recipient status codes meaning the message was accepted for delivery
+SMS_ACCEPTED_STATUS_CODES = {100, 101, 102}
+# Circuit breaker and concurrency limit shared by all messaging calls
+SMS_PROVIDER_FAMILY = 'africastalking.sms'
+# Country code assumed for numbers stored in local 0XXX form
+SMS_DEFAULT_COUNTRY_CODE = '250'
+
+
+def normalize_phone_number(phone_number):
+    """
+    Reduce a phone number to its international digits.
+    
+    '+250 788-000-001', '00250788000001' and '0788000001' all become
+    '250788000001', so provider statuses can be matched to the numbers sent.
+    """
+    digits = ''.join(ch for ch in str(phone_number) if ch.isdigit())
+    if digits.startswith('00'):
+        return digits[2:]
+    if digits.startswith('0'):
+        return SMS_DEFAULT_COUNTRY_CODE + digits[1:]
+    return digits
+
+
 class SMSService:
+    @staticmethod
+    def is_test_env():
+        """Check multiple ways to detect a test environment"""
+        return any([
+            'test' in sys.argv,
+            os.environ.get('DJANGO_TESTING') == 'True',
+            os.environ.get('TEST_MODE') == 'True',
+            'test' in str(settings.DATABASES.get('default', {}).get('NAME', '')),
+            hasattr(settings, 'TESTING') and settings.TESTING
+        ])
+
     async def send_sms(self, phone_number, message):
-        """Send SMS using Africa's Talking API"""
+        """
+        Send SMS using Africa's Talking API
+        
+        Returns:
+            Tuple of (success, response data); success is False when the
+            provider is unavailable, rejects the request or cannot be reached
+        """
+        # In test environment, don't make real API calls
+        if self.is_test_env():
+            logger.debug(f"Test mode: SMS to {phone_number} not sent")
+            return True, {
+                "SMSMessageData": {
+                    "Message": "Sent", 
+                    "Recipients": [{"number": phone_number, "status": "Success"}]
+                }
+            }
+        
         try:
-            print(f"[DEBUG] Sending SMS to {phone_number}: {message[:20]}...")
+            headers = {
+                'ApiKey': settings.AT_API_KEY,
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Accept': 'application/json'
+            }
+            data = {
+                'username': settings.AT_USERNAME,
+                'to': phone_number,
+                'message': message
+            }
             
-            # *** ENHANCED TEST DETECTION ***
-            # Check multiple ways to detect test environment
-            is_test_env = any([
-                'test' in sys.argv,
-                os.environ.get('DJANGO_TESTING') == 'True',
-                os.environ.get('TEST_MODE') == 'True',
-                'test' in settings.DATABASES.get('default', {}).get('NAME', ''),
-                hasattr(settings, 'TESTING') and settings.TESTING
-            ])
+            async with httpx.AsyncClient() as client:
+                response = await provider_guard(SMS_PROVIDER_FAMILY).call(
+                    client.post, AT_MESSAGING_URL, headers=headers, data=data
+                )
+        except ProviderUnavailableError as e:
+            logger.warning(f"SMS to {phone_number} not sent, provider unavailable: {str(e)}")
+            return False, {"error": str(e), "status": "provider_unavailable"}
+        except Exception as e:
+            logger.error(f"Failed to send SMS to {phone_number}: {str(e)}")
+            return False, {"error": str(e), "status": "error"}
+        
+        raw_content = response.content.decode('utf-8', errors='replace')
+        if response.status_code >= 400:
+            logger.warning(f"SMS to {phone_number} rejected with HTTP {response.status_code}")
+            return False, {
+                "error": f"HTTP {response.status_code}",
+                "status": "error",
+                "raw_content": raw_content
+            }
+        
+        if not response.content:
+            return True, {"status": "success", "message": "Request sent (empty response)"}
+        
+        try:
+            return True, response.json()
+        except ValueError:
+            return True, {"status": "success", "raw_content": raw_content}
+
+    async def send_bulk(self, message, recipients, max_concurrency=SMS_BULK_CONCURRENCY):
+        """
+        Send one message to many recipients.
+        
+        Args:
+            message: Message text
+            recipients: Iterable of phone numbers; duplicates are sent once
+            max_concurrency: Maximum number of batch requests in flight
             
-            # Explicitly log whether we detected test mode
-            print(f"[SMS SERVICE] Test environment detected: {is_test_env}")
+        Returns:
+            Dictionary mapping each phone number to a status dict with
+            'success', 'status' and 'message_id' keys
+        """
+        results = await self.send_grouped({message: recipients}, max_concurrency)
+        return results.get(message, {})
+
+    async def send_grouped(self, recipients_by_message, max_concurrency=SMS_BULK_CONCURRENCY):
+        """
+        Send several messages, each to its own recipients.
+        
+        Identical message bodies are merged, recipients are split into
+        batches of SMS_BULK_BATCH_SIZE, and batches from every message share
+        one pool of `max_concurrency` workers and one HTTP connection pool.
+        The same text to the same number is sent once; use send_keyed when
+        every item needs its own SMS.
+        
+        Args:
+            recipients_by_message: Mapping of message text to phone numbers,
+                or an iterable of (phone_number, message) pairs
+            max_concurrency: Maximum number of batch requests in flight
             
-            # In test environment, don't make real API calls
-            if is_test_env:
-                print(f"[TEST MODE] SMS would be sent to {phone_number}: {message}")
-                # Return mock response for test environment
-                return True, {
-                    "SMSMessageData": {
-                        "Message": "Sent", 
-                        "Recipients": [{"number": phone_number, "status": "Success"}]
-                    }
-                }
+        Returns:
+            Dictionary mapping message text to {phone_number: status}
+        """
+        if hasattr(recipients_by_message, 'items'):
+            pairs = (
+                (phone_number, message)
+                for message, phone_numbers in recipients_by_message.items()
+                for phone_number in phone_numbers
+            )
+        else:
+            pairs = recipients_by_message
+        
+        # dict keys keep first-seen order while dropping duplicates
+        grouped = {}
+        for phone_number, message in pairs:
+            grouped.setdefault(message, {})[phone_number] = None
+        
+        batches = []
+        for message, phone_numbers in grouped.items():
+            phone_numbers = list(phone_numbers)
+            batches.extend(
+                (message, phone_numbers[i:i + SMS_BULK_BATCH_SIZE])
+                for i in range(0, len(phone_numbers), SMS_BULK_BATCH_SIZE)
+            )
+        
+        results = {message: {} for message in grouped}
+        for (message, _), statuses in zip(batches, await self._send_batches(batches, max_concurrency)):
+            results[message].update(statuses)
+        return results
+
+    async def send_keyed(self, messages_by_key, max_concurrency=SMS_BULK_CONCURRENCY):
+        """
+        Send one SMS per key, batching keys that share a message body.
+        
+        Nothing is merged: two keys with the same number and text are sent
+        as two SMS, in separate requests, so each key gets its own status.
+        
+        Args:
+            messages_by_key: Mapping of key to a (phone_number, message) pair
+            max_concurrency: Maximum number of batch requests in flight
+            
+        Returns:
+            Dictionary mapping each key to a status dict
+        """
+        # Per message, layers of {phone_number: key}; a number repeated
+        # under one message goes to the next layer and so the next request
+        layers_by_message = {}
+        for key, (phone_number, message) in messages_by_key.items():
+            layers = layers_by_message.setdefault(message, [])
+            for layer in layers:
+                if phone_number not in layer:
+                    layer[phone_number] = key
+                    break
+            else:
+                layers.append({phone_number: key})
+        
+        batches = []
+        batch_keys = []
+        for message, layers in layers_by_message.items():
+            for layer in layers:
+                items = list(layer.items())
+                for i in range(0, len(items), SMS_BULK_BATCH_SIZE):
+                    chunk = items[i:i + SMS_BULK_BATCH_SIZE]
+                    batches.append((message, [phone_number for phone_number, _ in chunk]))
+                    batch_keys.append(chunk)
+        
+        results = {}
+        for chunk, statuses in zip(batch_keys, await self._send_batches(batches, max_concurrency)):
+            for phone_number, key in chunk:
+                results[key] = statuses[phone_number]
+        return results
+
+    async def _send_batches(self, batches, max_concurrency):
+        """Send (message, phone_numbers) batches over one client; returns statuses per batch"""
+        statuses = [None] * len(batches)
+        if not batches:
+            return statuses
+        
+        pending = iter(enumerate(batches))
+        
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            async def worker():
+                for index, (message, phone_numbers) in pending:
+                    statuses[index] = await self._send_batch(client, message, phone_numbers)
             
-            # For real SMS sending
-            try:
-                url = "https://api.africastalking.com/version1/messaging"
-                headers = {
+            await asyncio.gather(*[
+                worker() for _ in range(min(max_concurrency, len(batches)))
+            ])
+        
+        return statuses
+
+    async def _send_batch(self, client, message, phone_numbers):
+        """Post one message to a batch of recipients and map statuses back"""
+        if self.is_test_env():
+            return {
+                phone_number: {'success': True, 'status': 'Success', 'message_id': None}
+                for phone_number in phone_numbers
+            }
+        
+        try:
+            response = await provider_guard(SMS_PROVIDER_FAMILY).call(
+                client.post,
+                AT_MESSAGING_URL,
+                headers={
                     'ApiKey': settings.AT_API_KEY,
                     'Content-Type': 'application/x-www-form-urlencoded',
                     'Accept': 'application/json'
-                }
-                
-                data = {
+                },
+                data={
                     'username': settings.AT_USERNAME,
-                    'to': phone_number,
+                    'to': ','.join(phone_numbers),
                     'message': message
                 }
-                
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(url, headers=headers, data=data)
-                    
-                    # Better handling of response parsing
-                    if not response.content:
-                        return True, {"status": "success", "message": "Request sent (empty response)"}
-                    
-                    try:
-                        return True, response.json()
-                    except ValueError:
-                        # If JSON parsing fails, return success with raw content
-                        return True, {
-                            "status": "success", 
-                            "raw_content": response.content.decode('utf-8', errors='replace')
-                        }
-                        
-            except Exception as e:
-                print(f"Failed to send SMS: {str(e)}")
-                # Always return a successful result in the same format
-                return True, {"error": str(e), "status": "error_handled"}
-                    
+            )
+            recipients = response.json()['SMSMessageData']['Recipients']
         except Exception as e:
-            print(f"Failed to send SMS: {str(e)}")
-            # Return success with error info to not break tests
-            return True, {"error": str(e), "status": "outer_error_handled"}
\ No newline at end of file
+            logger.warning(f"Bulk SMS batch of {len(phone_numbers)} failed: {str(e)}")
+            return {
+                phone_number: {'success': False, 'status': str(e), 'message_id': None}
+                for phone_number in phone_numbers
+            }
+        
+        statuses = {
+            normalize_phone_number(recipient.get('number', '')): {
+                'success': recipient.get('statusCode') in SMS_ACCEPTED_STATUS_CODES,
+                'status': recipient.get('status', ''),
+                'message_id': recipient.get('messageId')
+            }
+            for recipient in recipients
+        }
+        return {
+            phone_number: statuses.get(
+                normalize_phone_number(phone_number),
+                {'success': False, 'status': 'No status returned', 'message_id': None}
+            )
+            for phone_number in phone_numbers
+        }
@@ -0,0 +1,299 @@
+# backend/loans/statement_reconciliation.py
+
+import csv
+import gzip
+import logging
+import os
+import tempfile
+import time
+import zlib
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal, InvalidOperation
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import LoanRepayment, Transaction, VendorSettlement
+
+logger = logging.getLogger(__name__)
+
+# Statement CSV column holding each field; MoMo puts our reference in externalId
+STATEMENT_COLUMNS = {
+    'reference': 'External Transaction Id',
+    'amount': 'Amount',
+    'status': 'Status',
+    'date': 'Date',
+}
+# Statement statuses that mean the money moved
+STATEMENT_SUCCESS_STATUSES = {'SUCCESSFUL', 'SUCCESS', 'COMPLETED'}
+# Buckets both sides are hash partitioned into; each is joined in memory on its own
+STATEMENT_PARTITIONS = 64
+# Transactions read per database round trip
+STATEMENT_DB_CHUNK_SIZE = 5000
+# Transactions this far outside the statement period are still matched against it,
+# so a payment recorded just before midnight is not reported as an orphan
+STATEMENT_PERIOD_SLACK = timedelta(days=1)
+# Vendor settlements are sent under their own reference with no Transaction row;
+# they are joined as this type, PROCESSING meaning MoMo accepted the transfer
+SETTLEMENT_TRANSACTION_TYPE = 'SETTLEMENT'
+SETTLEMENT_STATUSES = {'PENDING': 'PENDING', 'PROCESSING': 'SUCCESSFUL', 'FAILED': 'FAILED'}
+# Report categories, each written to <category>.csv
+REPORT_CATEGORIES = (
+    'matched', 'amount_mismatch', 'status_mismatch', 'unapplied_repayment', 'missing', 'orphan'
+)
+REPORT_FIELDS = (
+    'reference', 'statement_amount', 'statement_status', 'statement_date',
+    'transaction_type', 'amount', 'status', 'created_at'
+)
+
+
+def parse_amount(value):
+    """Statement amount as a positive Decimal; debits are exported as negative"""
+    try:
+        return abs(Decimal(value.replace(',', '').strip()))
+    except (AttributeError, InvalidOperation):
+        return None
+
+
+def parse_statement_date(value, tz=None):
+    """Aware datetime from an ISO date or datetime, or None"""
+    value = (value or '').strip()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=tz or timezone.get_current_timezone())
+    return parsed
+
+
+def partition_of(reference, partitions):
+    return zlib.crc32(reference.encode()) % partitions
+
+
+class StatementReconciler:
+    """
+    Reconciles a MoMo statement CSV against Transaction and VendorSettlement
+    records by reference.
+
+    Runs as a partitioned hash join in three passes, so memory stays bounded
+    however long the statement is:
+
+    1. Stream the statement and spill each line to a partition file chosen
+       by hashing its reference.
+    2. Stream our transactions for the statement period, flagged with
+       whether a LoanRepayment records them, and the vendor settlements
+       for the period into partitions with the same hash.
+    3. For each partition, load its statement lines into a dict by reference
+       and probe it with that partition's transactions.
+
+    Categories:
+        matched: Same reference, amount and outcome on both sides
+        amount_mismatch: Same reference, different amount
+        status_mismatch: Same reference and amount, but one side succeeded
+            and the other did not
+        unapplied_repayment: Matched repayment with no LoanRepayment row
+        missing: Successful transaction in the period absent from the statement
+        orphan: Statement line with no transaction
+    """
+
+    def __init__(self, columns=None, partitions=STATEMENT_PARTITIONS,
+                 chunk_size=STATEMENT_DB_CHUNK_SIZE, output_dir=None):
+        self.columns = {**STATEMENT_COLUMNS, **(columns or {})}
+        self.partitions = partitions
+        self.chunk_size = chunk_size
+        self.output_dir = output_dir
+
+    def run(self, path, start=None, end=None):
+        """
+        Reconcile the statement at path (plain or .gz CSV).
+
+        Args:
+            path: Statement file
+            start, end: Statement period; taken from the statement's dates
+                when not given. Without a period, missing is not computed.
+
+        Returns:
+            Dictionary with counts per category, pass timings and throughput
+        """
+        started = time.perf_counter()
+        counts = {category: 0 for category in REPORT_CATEGORIES}
+        stats = {'statement_lines': 0, 'unparseable_lines': 0, 'transactions_scanned': 0}
+
+        with tempfile.TemporaryDirectory(prefix='momo-statement-') as workdir:
+            statement_files = self._partition_files(workdir, 'statement')
+            transaction_files = self._partition_files(workdir, 'transactions')
+            reports = self._open_reports()
+            try:
+                first, last = self._partition_statement(path, statement_files, stats)
+                start = start or first
+                end = end or last
+                statement_seconds = time.perf_counter() - started
+
+                if start and end:
+                    self._partition_transactions(start, end, transaction_files, stats)
+                transactions_seconds = time.perf_counter() - started - statement_seconds
+
+                peak = 0
+                for index in range(self.partitions):
+                    peak = max(peak, self._join_partition(
+                        statement_files[index], transaction_files[index], start, end, counts, reports
+                    ))
+            finally:
+                for f in statement_files + transaction_files:
+                    f.close()
+                for report in reports.values():
+                    report['file'].close()
+
+        elapsed = time.perf_counter() - started
+        result = {
+            **stats,
+            **counts,
+            'missing': counts['missing'] if start and end else None,
+            'period_start': start.isoformat() if start else None,
+            'period_end': end.isoformat() if end else None,
+            'peak_partition_lines': peak,
+            'statement_pass_seconds': round(statement_seconds, 3),
+            'transaction_pass_seconds': round(transactions_seconds, 3),
+            'elapsed_seconds': round(elapsed, 3),
+            'lines_per_second': round(stats['statement_lines'] / elapsed, 1) if elapsed else 0.0
+        }
+        logger.info(f"Statement reconciliation: {result}")
+        return result
+
+    def _partition_files(self, workdir, name):
+        return [
+            open(os.path.join(workdir, f"{name}-{index}.csv"), 'w+', newline='')
+            for index in range(self.partitions)
+        ]
+
+    def _open_reports(self):
+        if not self.output_dir:
+            return {}
+        os.makedirs(self.output_dir, exist_ok=True)
+        reports = {}
+        for category in REPORT_CATEGORIES:
+            f = open(os.path.join(self.output_dir, f"{category}.csv"), 'w', newline='')
+            writer = csv.writer(f)
+            writer.writerow(REPORT_FIELDS)
+            reports[category] = {'file': f, 'writer': writer}
+        return reports
+
+    def _partition_statement(self, path, files, stats):
+        """Pass 1: spill statement lines by reference hash; returns the first and last dates seen"""
+        writers = [csv.writer(f) for f in files]
+        first = last = None
+        tz = timezone.get_current_timezone()
+        opener = gzip.open if path.endswith('.gz') else open
+
+        with opener(path, 'rt', newline='') as statement:
+            reader = csv.reader(statement)
+            header = next(reader, [])
+            for field in ('reference', 'amount'):
+                if self.columns[field] not in header:
+                    raise ValueError(f"Statement has no {field} column '{self.columns[field]}'")
+            # Status and date are optional; without them lines read as successful and undated
+            reference_at, amount_at, status_at, date_at = (
+                header.index(self.columns[field]) if self.columns[field] in header else None
+                for field in ('reference', 'amount', 'status', 'date')
+            )
+
+            for line in reader:
+                stats['statement_lines'] += 1
+                try:
+                    reference = line[reference_at].strip()
+                    amount = parse_amount(line[amount_at])
+                    raw_date = line[date_at] if date_at is not None else ''
+                    line_status = line[status_at].strip().upper() if status_at is not None else 'SUCCESSFUL'
+                except IndexError:
+                    reference = amount = None
+                if not reference or amount is None:
+                    stats['unparseable_lines'] += 1
+                    continue
+
+                date = parse_statement_date(raw_date, tz) if raw_date else None
+                if date:
+                    if first is None or date < first:
+                        first = date
+                    if last is None or date > last:
+                        last = date
+
+                writers[partition_of(reference, self.partitions)].writerow([
+                    reference, amount, line_status, raw_date
+                ])
+        return first, last
+
+    def _partition_transactions(self, start, end, files, stats):
+        """Pass 2: spill our transactions and settlements around the period by the same hash"""
+        writers = [csv.writer(f) for f in files]
+        period = {
+            'created_at__gte': start - STATEMENT_PERIOD_SLACK,
+            'created_at__lte': end + STATEMENT_PERIOD_SLACK
+        }
+        rows = Transaction.objects.filter(**period).annotate(
+            recorded=Exists(LoanRepayment.objects.filter(transaction_reference=OuterRef('reference')))
+        ).values_list(
+            'reference', 'transaction_type', 'amount', 'status', 'created_at', 'recorded'
+        ).iterator(chunk_size=self.chunk_size)
+
+        for reference, transaction_type, amount, tx_status, created_at, recorded in rows:
+            stats['transactions_scanned'] += 1
+            writers[partition_of(reference, self.partitions)].writerow([
+                reference, transaction_type, amount, tx_status, created_at.isoformat(), int(recorded)
+            ])
+
+        settlements = VendorSettlement.objects.filter(**period).values_list(
+            'reference', 'amount', 'status', 'created_at'
+        ).iterator(chunk_size=self.chunk_size)
+        for reference, amount, settlement_status, created_at in settlements:
+            stats['transactions_scanned'] += 1
+            writers[partition_of(reference, self.partitions)].writerow([
+                reference, SETTLEMENT_TRANSACTION_TYPE, amount,
+                SETTLEMENT_STATUSES[settlement_status], created_at.isoformat(), 0
+            ])
+
+    def _join_partition(self, statement_file, transaction_file, start, end, counts, reports):
+        """Pass 3: build a dict from one statement partition and probe it; returns its size"""
+        statement_file.seek(0)
+        lines = {}
+        for reference, amount, line_status, date in csv.reader(statement_file):
+            # A reference listed twice on the statement is itself an anomaly
+            if reference in lines:
+                self._report('orphan', counts, reports, reference, lines[reference])
+            lines[reference] = (Decimal(amount), line_status, date)
+        size = len(lines)
+
+        transaction_file.seek(0)
+        for reference, transaction_type, amount, tx_status, created_at, recorded in csv.reader(transaction_file):
+            tx = (transaction_type, Decimal(amount), tx_status, created_at)
+            line = lines.pop(reference, None)
+
+            if line is None:
+                created = parse_datetime(created_at)
+                if tx_status == 'SUCCESSFUL' and start <= created <= end:
+                    self._report('missing', counts, reports, reference, None, tx)
+                continue
+
+            if line[0] != tx[1]:
+                category = 'amount_mismatch'
+            elif (line[1] in STATEMENT_SUCCESS_STATUSES) != (tx_status == 'SUCCESSFUL'):
+                category = 'status_mismatch'
+            elif transaction_type == 'REPAYMENT' and tx_status == 'SUCCESSFUL' and recorded == '0':
+                category = 'unapplied_repayment'
+            else:
+                category = 'matched'
+            self._report(category, counts, reports, reference, line, tx)
+
+        for reference, line in lines.items():
+            self._report('orphan', counts, reports, reference, line)
+        return size
+
+    @staticmethod
+    def _report(category, counts, reports, reference, line=None, tx=None):
+        counts[category] += 1
+        if category in reports:
+            reports[category]['writer'].writerow([reference, *(line or ('', '', '')), *(tx or ('', '', '', ''))])
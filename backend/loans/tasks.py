@@ -1,55 +1,22 @@
 from backend.celery import app as celery_app
 from asgiref.sync import sync_to_async
-from .models import Transaction, Loan
-from .services import LoanService
-from django.conf import settings
-import asyncio
 from .services import PaymentScheduleService
 
 
 @celery_app.task
-async def monitor_payment_status(transaction_reference: str, max_attempts: int = 5):
-    """
-    Monitor payment status for a given transaction
-    """
-    from .momo_integration import MoMoAPI
-    from .services import PaymentScheduleService
+async def poll_payment_statuses(max_batches: int = None):
+    """Check pending MoMo repayment requests that are due and apply the results"""
+    from .payment_status_service import PaymentStatusPoller
 
-    payment_service = PaymentScheduleService()
-    await payment_service.check_overdue_payments()
-    await payment_service.send_upcoming_reminders()
+    return await PaymentStatusPoller().drain(max_batches=max_batches)
 
-    momo = MoMoAPI()
-    loan_service = LoanService()
-    attempt = 0
-    
-    while attempt < max_attempts:
-        try:
-            status = await momo.check_payment_status(transaction_reference)
-            
-            if status.get('status') == 'SUCCESSFUL':
-                # Get transaction details
-                transaction = await Transaction.objects.aget(reference=transaction_reference)
-                
-                # Record the payment
-                await loan_service.record_repayment(
-                    loan_id=transaction.loan.id,
-                    amount=transaction.amount,
-                    momo_reference=transaction_reference
-                )
-                return True
-                
-            elif status.get('status') == 'FAILED':
-                return False
-                
-            attempt += 1
-            await asyncio.sleep(settings.PAYMENT_CHECK_INTERVAL)
-            
-        except Exception as e:
-            print(f"Error checking payment status: {str(e)}")
-            return False
-            
-    return False
+
+@celery_app.task
+async def poll_disbursement_statuses(max_batches: int = None):
+    """Check accepted MoMo loan disbursements that are due and move their loans on"""
+    from .payment_status_service import DisbursementStatusPoller
+
+    return await DisbursementStatusPoller().drain(max_batches=max_batches)
 
 
 # Modify the task in loans/tasks.py
@@ -68,4 +35,73 @@ async def check_schedules_and_send_reminders():
     # Send harvest-based reminders
     await payment_service.send_harvest_based_reminders()
     
-    return True
\ No newline at end of file
+    return True
+
+@celery_app.task
+async def rescore_credit_scores(batch_size: int = 500):
+    """Rescore all farmers and store explanations for their scores"""
+    from .explanation_service import CreditExplanationService
+
+    return await CreditExplanationService().arescore_all(batch_size=batch_size)
+
+@celery_app.task
+async def dispatch_outbound_messages(max_batches: int = None):
+    """Send queued SMS from the outbox, retrying failures with backoff"""
+    from .outbox_service import OutboxDispatcher
+
+    return await OutboxDispatcher().drain(max_batches=max_batches)
+
+@celery_app.task
+async def reconcile_loan_balances(batch_size: int = 1000):
+    """Recompute loan repayment totals and report drift"""
+    from .repayment_service import reconcile_loan_balances as reconcile
+
+    result = await sync_to_async(reconcile)(batch_size=batch_size)
+    return {
+        'checked': result['checked'],
+        'drifted': result['drifted'],
+        'fixed': result['fixed'],
+        'total_drift': str(result['total_drift']),
+        'elapsed_seconds': result['elapsed_seconds']
+    }
+
+@celery_app.task
+async def process_momo_webhook_events(max_batches: int = None):
+    """Apply received MoMo callbacks in micro-batches grouped by loan"""
+    from .webhook_service import WebhookEventWorker
+
+    return await WebhookEventWorker().drain(max_batches=max_batches)
+
+@celery_app.task
+async def disburse_approved_loans(batch_size: int = 100, max_batches: int = None):
+    """Disburse APPROVED loans through MoMo in resumable batches"""
+    from .disbursement_service import BulkDisbursementRunner
+
+    result = await BulkDisbursementRunner(batch_size=batch_size).run(max_batches=max_batches)
+    if result is None:
+        return {'skipped': 'Another bulk disbursement is already running'}
+    return result
+
+@celery_app.task
+async def settle_vendor_payouts(batch_size: int = 100, max_batches: int = None):
+    """Pay each vendor one netted MoMo transfer for its pending token redemptions"""
+    from .settlement_service import VendorSettlementRunner
+
+    result = await VendorSettlementRunner(batch_size=batch_size).run(max_batches=max_batches)
+    if result is None:
+        return {'skipped': 'Another vendor settlement is already running'}
+    return result
+
+@celery_app.task
+async def expire_loan_tokens():
+    """Expire ACTIVE loan tokens past their expiry date and notify their farmers"""
+    from .tokenization_service import TokenizedLoanService
+
+    return await sync_to_async(TokenizedLoanService.expire_tokens)()
+
+@celery_app.task
+async def archive_closed_loans(batch_size: int = 200, max_batches: int = None):
+    """Move transactions and repayments of long-closed loans to archive files"""
+    from .archive_service import LoanArchiver
+
+    return await sync_to_async(LoanArchiver(batch_size=batch_size).run)(max_batches=max_batches)
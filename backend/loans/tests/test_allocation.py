@@ -0,0 +1,100 @@
+# backend/loans/tests/test_allocation.py
+
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+from authentication.models import User
+from farmers.models import Farmer
+from loans.allocation_service import PaymentAllocationService
+from loans.models import Loan, LoanProduct, PaymentSchedule
+
+
+class TestPaymentAllocation(TestCase):
+    def setUp(self):
+        user = User.objects.create(
+            username="allocation_test_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789333444"
+        )
+        farmer = Farmer.objects.create(
+            user=user,
+            name="Allocation Test Farmer",
+            phone_number="+250789333444",
+            location="Kigali",
+            farm_size=2.5
+        )
+        product = LoanProduct.objects.create(
+            name="Allocation Test Product",
+            description="For testing payment allocation",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("10.00"),
+            duration_days=90
+        )
+        self.loan = Loan.objects.create(
+            farmer=farmer,
+            loan_product=product,
+            amount_requested=Decimal("300.00"),
+            amount_approved=Decimal("300.00"),
+            status='ACTIVE'
+        )
+        self.overdue = self.create_schedule(1, -10, status='OVERDUE', penalty=Decimal("11.00"))
+        self.current = self.create_schedule(2, 20)
+        self.future = self.create_schedule(3, 50)
+
+    def create_schedule(self, installment, days_from_now, status='PENDING', penalty=Decimal("0.00")):
+        return PaymentSchedule.objects.create(
+            loan=self.loan,
+            installment_number=installment,
+            due_date=timezone.now() + timedelta(days=days_from_now),
+            principal_amount=Decimal("100.00"),
+            interest_amount=Decimal("10.00"),
+            amount=Decimal("110.00"),
+            penalty_amount=penalty,
+            status=status
+        )
+
+    def test_allocates_penalty_interest_then_principal(self):
+        # One locking SELECT and one bulk UPDATE
+        with self.assertNumQueries(2):
+            result = PaymentAllocationService.allocate_payment(self.loan, Decimal("141.00"))
+
+        self.assertEqual(result['applied'], Decimal("141.00"))
+        self.assertEqual(result['unapplied'], Decimal("0.00"))
+        self.assertEqual(result['penalty_paid'], Decimal("11.00"))
+        self.assertEqual(result['interest_paid'], Decimal("20.00"))
+        self.assertEqual(result['principal_paid'], Decimal("110.00"))
+        self.assertFalse(result['schedules_paid_off'])
+        self.assertEqual(
+            [(i['installment'], i['amount'], i['status']) for i in result['installments']],
+            [(1, Decimal("121.00"), 'PAID'), (2, Decimal("20.00"), 'PARTIAL')]
+        )
+
+        self.current.refresh_from_db()
+        self.assertEqual(self.current.status, 'PARTIAL')
+        self.assertEqual(self.current.amount_paid, Decimal("20.00"))
+
+        # The next payment picks up where the partial one stopped
+        result = PaymentAllocationService.allocate_payment(self.loan.id, Decimal("90.00"))
+        self.assertEqual(result['interest_paid'], Decimal("0.00"))
+        self.assertEqual(result['principal_paid'], Decimal("90.00"))
+        self.assertEqual(result['installments'][0]['status'], 'PAID')
+
+    def test_partial_overdue_payment_stays_overdue(self):
+        result = PaymentAllocationService.allocate_payment(self.loan, Decimal("5.00"))
+
+        self.assertEqual(result['penalty_paid'], Decimal("5.00"))
+        self.overdue.refresh_from_db()
+        self.assertEqual(self.overdue.status, 'OVERDUE')
+
+    def test_overpayment_is_left_unapplied(self):
+        result = PaymentAllocationService.allocate_payment(self.loan, Decimal("400.00"))
+
+        self.assertEqual(result['applied'], Decimal("341.00"))
+        self.assertEqual(result['unapplied'], Decimal("59.00"))
+        self.assertTrue(result['schedules_paid_off'])
+        self.assertFalse(
+            PaymentSchedule.objects.filter(loan=self.loan).exclude(status='PAID').exists()
+        )
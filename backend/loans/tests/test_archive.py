@@ -0,0 +1,119 @@
+# backend/loans/tests/test_archive.py
+
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from authentication.models import User
+from farmers.models import Farmer
+from loans.archive_service import LoanArchiver, loan_repayments, loan_transactions
+from loans.models import ArchivedLoan, ArchiveSegment, Loan, LoanProduct, LoanRepayment, Transaction
+from loans.repayment_service import reconcile_loan_balances
+from loans.serializers import DetailedLoanSerializer
+from loans.services import LoanService
+
+
+class TestLoanArchive(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(ARCHIVE_ROOT=self.archive_dir.name)
+        self.settings_override.enable()
+
+        user = User.objects.create(
+            username="archive_test_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789555666"
+        )
+        self.farmer = Farmer.objects.create(
+            user=user,
+            name="Archive Test Farmer",
+            phone_number="+250789555666",
+            location="Kigali",
+            farm_size=2.5
+        )
+        self.product = LoanProduct.objects.create(
+            name="Archive Test Product",
+            description="For testing archival",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=90
+        )
+        two_years_ago = timezone.now() - timedelta(days=730)
+        self.old_loans = [self.create_loan('PAID', two_years_ago) for _ in range(3)]
+        self.recent_loan = self.create_loan('PAID', timezone.now() - timedelta(days=10))
+        self.open_loan = self.create_loan('ACTIVE', two_years_ago)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.archive_dir.cleanup()
+
+    def create_loan(self, loan_status, paid_at):
+        loan = Loan.objects.create(
+            farmer=self.farmer,
+            loan_product=self.product,
+            amount_requested=Decimal("500.00"),
+            amount_approved=Decimal("500.00"),
+            total_repaid=Decimal("500.00"),
+            status=loan_status,
+            due_date=paid_at + timedelta(days=5)
+        )
+        for installment, reference in enumerate([f"{loan.id}-1", f"{loan.id}-2"]):
+            Transaction.objects.create(
+                loan=loan,
+                transaction_type='REPAYMENT',
+                amount=Decimal("250.00"),
+                reference=reference,
+                phone_number=self.farmer.phone_number,
+                status='SUCCESSFUL'
+            )
+            repayment = LoanRepayment.objects.create(
+                loan=loan, amount=Decimal("250.00"), transaction_reference=reference
+            )
+            LoanRepayment.objects.filter(pk=repayment.pk).update(payment_date=paid_at + timedelta(days=installment))
+        Transaction.objects.filter(loan=loan).update(created_at=paid_at, updated_at=paid_at)
+        return loan
+
+    def test_archive_is_resumable_and_reads_through(self):
+        loan = self.old_loans[0]
+        repayments_before = DetailedLoanSerializer().get_repayments(loan)
+        score_before = LoanService.calculate_credit_score(self.farmer)
+
+        first = LoanArchiver(batch_size=2).run(max_batches=1)
+        self.assertEqual((first['loans'], first['transactions'], first['repayments']), (2, 4, 4))
+
+        # The next run carries on with the loan left over
+        second = LoanArchiver(batch_size=2).run()
+        self.assertEqual(second['loans'], 1)
+        self.assertEqual(LoanArchiver().run()['loans'], 0)
+
+        archived_ids = {old.id for old in self.old_loans}
+        self.assertEqual(set(ArchivedLoan.objects.values_list('loan_id', flat=True)), archived_ids)
+        self.assertFalse(Transaction.objects.filter(loan_id__in=archived_ids).exists())
+        self.assertFalse(LoanRepayment.objects.filter(loan_id__in=archived_ids).exists())
+        self.assertEqual(Transaction.objects.filter(loan__in=[self.recent_loan, self.open_loan]).count(), 4)
+        for segment in ArchiveSegment.objects.all():
+            self.assertTrue(os.path.exists(os.path.join(self.archive_dir.name, segment.path)))
+
+        self.assertEqual(DetailedLoanSerializer().get_repayments(loan), repayments_before)
+        self.assertEqual(
+            [row['reference'] for row in loan_transactions(loan.id)], [f"{loan.id}-1", f"{loan.id}-2"]
+        )
+        self.assertEqual(len(loan_repayments(self.recent_loan.id)), 2)
+
+        # Archived on-time repayments still count, and reconciliation leaves archived totals alone
+        self.assertEqual(LoanService.calculate_credit_score(self.farmer), score_before)
+        self.assertEqual(
+            LoanService.calculate_credit_scores([self.farmer])[self.farmer.id], score_before
+        )
+        self.assertEqual(reconcile_loan_balances()['drifted'], 0)
+
+    def test_dry_run_changes_nothing(self):
+        result = LoanArchiver().run(dry_run=True)
+
+        self.assertEqual((result['loans'], result['transactions']), (3, 6))
+        self.assertFalse(ArchivedLoan.objects.exists())
+        self.assertEqual(os.listdir(self.archive_dir.name), [])
@@ -0,0 +1,44 @@
+# backend/loans/tests/test_benchmarks.py
+
+import json
+import os
+import tempfile
+from django.test import TestCase
+from farmers.models import Farmer
+from loans.benchmarks import compare_to_baseline, generate_population, percentile, summarise
+from loans.models import Loan, LoanRepayment
+
+
+class TestBenchmarkHelpers(TestCase):
+    def test_generate_population(self):
+        farmers = generate_population(50, seed=3)
+
+        self.assertEqual(len(farmers), 50)
+        self.assertEqual(Farmer.objects.count(), 50)
+        self.assertTrue(Loan.objects.filter(farmer__in=farmers).exists())
+        references = list(LoanRepayment.objects.values_list('transaction_reference', flat=True))
+        self.assertEqual(len(references), len(set(references)))
+        self.assertFalse(any('None' in reference for reference in references))
+
+    def test_percentile_interpolates_between_ranks(self):
+        self.assertEqual(percentile([1, 2, 3, 10], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 10], 0), 1)
+        self.assertEqual(percentile([1, 2, 3, 10], 100), 10)
+        self.assertEqual(percentile([4], 99), 4)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_summarise_and_compare_to_baseline(self):
+        summary = summarise([0.001, 0.002, 0.003, 0.010])
+        self.assertEqual(summary['samples'], 4)
+        self.assertEqual(summary['p50_ms'], 2.5)
+        self.assertEqual(summary['p99_ms'], 9.79)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            with open(path, 'w') as f:
+                json.dump({'scales': {'1000': {'enhanced': {'p50_ms': 1.0, 'queries_per_call': 4}}}}, f)
+
+            current = {'scales': {'1000': {'enhanced': {'p50_ms': 2.0, 'queries_per_call': 4}}}}
+            regressions = compare_to_baseline(current, path)
+
+        self.assertEqual(regressions, ["1000/enhanced p50_ms: 1.0 -> 2.0"])
@@ -0,0 +1,145 @@
+# backend/loans/tests/test_disbursement.py
+
+import httpx
+from decimal import Decimal
+from unittest.mock import AsyncMock
+from django.core.cache import cache
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from authentication.models import User
+from farmers.models import Farmer
+from loans.disbursement_service import DISBURSEMENT_RUN_LOCK_KEY, BulkDisbursementRunner
+from loans.models import Loan, LoanProduct, OutboundMessage, PaymentSchedule, Transaction
+
+
+class TestBulkDisbursement(TestCase):
+    def setUp(self):
+        user = User.objects.create(
+            username="disburse_test_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789444555"
+        )
+        farmer = Farmer.objects.create(
+            user=user,
+            name="Disbursement Test Farmer",
+            phone_number="+250789444555",
+            location="Kigali",
+            farm_size=2.5
+        )
+        product = LoanProduct.objects.create(
+            name="Disbursement Test Product",
+            description="For testing bulk disbursement",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=90
+        )
+        for amount in ["100.00", "200.00", "300.00"]:
+            Loan.objects.create(
+                farmer=farmer,
+                loan_product=product,
+                amount_requested=Decimal(amount),
+                amount_approved=Decimal(amount),
+                status='APPROVED'
+            )
+        Loan.objects.create(
+            farmer=farmer,
+            loan_product=product,
+            amount_requested=Decimal("400.00"),
+            status='PENDING'
+        )
+
+        # 100 is accepted, 200 is rejected and 300 times out on the first run
+        self.responses = {
+            Decimal("100.00"): httpx.Response(202),
+            Decimal("200.00"): httpx.Response(400, text="Payee not found"),
+        }
+        self.sent = []
+
+        async def send_disbursement(reference, amount, phone_number, client=None):
+            self.sent.append((reference, amount))
+            if amount in self.responses:
+                return self.responses[amount]
+            raise httpx.ConnectTimeout("timed out")
+
+        self.runner = BulkDisbursementRunner(batch_size=2)
+        self.runner.momo_api.send_disbursement = AsyncMock(side_effect=send_disbursement)
+
+    def test_run_reports_batches_and_resumes_unknown_transfers(self):
+        result = async_to_sync(self.runner.run)()
+
+        self.assertEqual(result['batches'], 2)
+        self.assertEqual(
+            (result['loans'], result['accepted'], result['rejected'], result['unknown']),
+            (3, 1, 1, 1)
+        )
+        self.assertEqual([batch['loans'] for batch in result['batch_metrics']], [2, 1])
+
+        statuses = dict(Loan.objects.filter(status='APPROVED').values_list('amount_approved', 'disbursement_status'))
+        self.assertEqual(statuses, {
+            Decimal("100.00"): 'PROCESSING',
+            Decimal("200.00"): 'FAILED',
+            Decimal("300.00"): 'PENDING',
+        })
+        self.assertEqual(OutboundMessage.objects.count(), 1)
+        # Schedules wait until MoMo confirms the transfer
+        self.assertFalse(PaymentSchedule.objects.exists())
+
+        # The timed-out transfer is resent under its checkpointed reference
+        first_reference = dict((amount, ref) for ref, amount in self.sent)[Decimal("300.00")]
+        self.responses[Decimal("300.00")] = httpx.Response(409, text="RESOURCE_ALREADY_EXIST")
+        self.runner.momo_api.get_disbursement_status = AsyncMock(return_value={'status': 'PENDING'})
+        self.sent.clear()
+
+        result = async_to_sync(self.runner.run)()
+
+        self.assertEqual(self.sent, [(first_reference, Decimal("300.00"))])
+        self.runner.momo_api.get_disbursement_status.assert_awaited_once()
+        self.assertEqual(result['accepted'], 1)
+        self.assertEqual(
+            Transaction.objects.filter(transaction_type='DISBURSEMENT', amount=Decimal("300.00")).count(), 1
+        )
+        self.assertEqual(
+            Loan.objects.get(amount_approved=Decimal("300.00")).momo_reference, first_reference
+        )
+
+    def test_retry_failed_makes_rejected_loans_eligible(self):
+        async_to_sync(self.runner.run)()
+        self.sent.clear()
+
+        self.assertEqual(BulkDisbursementRunner.retry_failed(), 1)
+        self.responses[Decimal("200.00")] = httpx.Response(202)
+        self.responses[Decimal("300.00")] = httpx.Response(202)
+        result = async_to_sync(self.runner.run)()
+
+        self.assertEqual(result['accepted'], 2)
+        # A rejected transfer is retried under a new reference
+        self.assertEqual(
+            Transaction.objects.filter(transaction_type='DISBURSEMENT', amount=Decimal("200.00")).count(), 2
+        )
+
+    def test_run_is_skipped_while_another_process_holds_the_lock(self):
+        cache.set(DISBURSEMENT_RUN_LOCK_KEY, 'other-run')
+
+        self.assertIsNone(async_to_sync(self.runner.run)())
+        self.assertEqual(self.sent, [])
+        self.assertEqual(cache.get(DISBURSEMENT_RUN_LOCK_KEY), 'other-run')
+
+        cache.delete(DISBURSEMENT_RUN_LOCK_KEY)
+        self.assertIsNotNone(async_to_sync(self.runner.run)())
+        self.assertIsNone(cache.get(DISBURSEMENT_RUN_LOCK_KEY))
+
+    def test_resent_reference_records_the_original_transfer_outcome(self):
+        # The first transfer timed out at our end but failed at MoMo
+        self.responses[Decimal("300.00")] = httpx.Response(409, text="RESOURCE_ALREADY_EXIST")
+        self.runner.momo_api.get_disbursement_status = AsyncMock(
+            return_value={'status': 'FAILED', 'reason': 'PAYEE_NOT_FOUND'}
+        )
+
+        result = async_to_sync(self.runner.run)()
+
+        self.assertEqual((result['accepted'], result['rejected']), (1, 2))
+        loan = Loan.objects.get(amount_approved=Decimal("300.00"))
+        self.assertEqual(loan.disbursement_status, 'FAILED')
+        self.assertEqual(Transaction.objects.get(reference=loan.momo_reference).status, 'FAILED')
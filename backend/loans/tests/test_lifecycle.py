@@ -6,10 +6,10 @@ from decimal import Decimal
 from django.utils import timezone
 from authentication.models import User
 from farmers.models import Farmer
-from loans.models import Loan, LoanProduct, PaymentSchedule, LoanRepayment
-from loans.lifecycle_service import LoanLifecycleService
+from loans.models import Loan, LoanProduct, OutboundMessage, PaymentSchedule, LoanRepayment
+from loans.lifecycle_service import BulkLoanLifecycle, LoanLifecycleService
 from loans.repayment_service import RepaymentService
-from asgiref.sync import sync_to_async
+from asgiref.sync import async_to_sync, sync_to_async
 from unittest.mock import patch, AsyncMock
 
 class TestLoanLifecycle(TestCase):
@@ -155,5 +155,119 @@ class TestLoanLifecycle(TestCase):
         final_status = await final_status_check()
         self.assertEqual(final_status, 'PAID', "Loan should be marked as PAID after completion")
         
-        # Verify SMS notifications
-        self.assertTrue(self.mock_sms.called, "SMS notifications should have been sent")
\ No newline at end of file
+        # Notifications are queued in the outbox with each change
+        @sync_to_async
+        def queued_messages():
+            return list(
+                OutboundMessage.objects.filter(phone_number=self.farmer.phone_number)
+                .order_by('id').values_list('message', flat=True)
+            )
+
+        messages = await queued_messages()
+        self.assertEqual(len(messages), 2, "Approval and repayment SMS should have been queued")
+        self.assertIn("has been approved", messages[0])
+        self.assertIn("fully repaid", messages[1])
+
+class TestBulkLoanLifecycle(TestCase):
+    def setUp(self):
+        self.product = LoanProduct.objects.create(
+            name="Bulk Lifecycle Product",
+            description="For testing bulk transitions",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=30
+        )
+        self.loans = []
+        for i, loan_status in enumerate(['PENDING', 'PENDING', 'PENDING', 'DISBURSED']):
+            user = User.objects.create(
+                username=f"bulk_lifecycle_user_{i}",
+                password="password123",
+                role="FARMER",
+                phone_number=f"+25078900010{i}"
+            )
+            farmer = Farmer.objects.create(
+                user=user,
+                name=f"Bulk Lifecycle Farmer {i}",
+                phone_number=f"+25078900010{i}",
+                location="Kigali",
+                farm_size=2.5
+            )
+            self.loans.append(Loan.objects.create(
+                farmer=farmer,
+                loan_product=self.product,
+                amount_requested=Decimal("500.00"),
+                status=loan_status
+            ))
+
+    def test_approve_batch_validates_up_front_and_reports_per_loan(self):
+        pending, reduced, approved_before, disbursed = self.loans
+        BulkLoanLifecycle().transition('approve', [approved_before.id])
+        missing = '00000000-0000-0000-0000-000000000000'
+        loan_ids = [pending.id, str(reduced.id), approved_before.id, disbursed.id, missing, 'not-a-uuid']
+
+        with patch('loans.lifecycle_service.BulkLoanLifecycle.schedule_disbursement') as schedule, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            result = BulkLoanLifecycle(chunk_size=2).transition(
+                'approve', loan_ids, approved_amounts={str(reduced.id): '450.00'}
+            )
+
+        self.assertEqual(
+            [(r['success'], r['status'], r['reason']) for r in result['results']],
+            [
+                (True, 'APPROVED', None),
+                (True, 'APPROVED', None),
+                (True, 'APPROVED', 'Already APPROVED'),
+                (False, 'DISBURSED', 'Cannot approve a loan in DISBURSED status'),
+                (False, None, 'Loan not found'),
+                (False, None, 'Invalid loan id'),
+            ]
+        )
+        self.assertEqual((result['moved'], result['succeeded'], result['failed']), (2, 3, 3))
+        self.assertEqual(len(callbacks), 1)
+        schedule.assert_called_once()
+
+        reduced.refresh_from_db()
+        self.assertEqual((reduced.status, reduced.amount_approved), ('APPROVED', Decimal('450.00')))
+        self.assertEqual(reduced.outstanding_balance, Decimal('450.00'))
+        self.assertIsNotNone(reduced.approval_date)
+        disbursed.refresh_from_db()
+        self.assertEqual(disbursed.status, 'DISBURSED')
+        # One SMS per approval, none for loans that did not move
+        self.assertEqual(OutboundMessage.objects.count(), 3)
+        self.assertTrue(OutboundMessage.objects.filter(
+            phone_number=reduced.farmer.phone_number, message__contains="450.00 RWF has been approved"
+        ).exists())
+
+    def test_complete_requires_paid_schedules(self):
+        disbursed = self.loans[3]
+        schedule = PaymentSchedule.objects.create(
+            loan=disbursed,
+            installment_number=1,
+            due_date=timezone.now() + timedelta(days=30),
+            principal_amount=Decimal('500.00'),
+            interest_amount=Decimal('25.00'),
+            amount=Decimal('525.00'),
+            status='PENDING'
+        )
+
+        result = BulkLoanLifecycle().transition('complete', [disbursed.id])
+        self.assertEqual(result['results'][0]['reason'], "Loan has unpaid schedules")
+
+        # An overdue installment is still unpaid
+        schedule.status = 'OVERDUE'
+        schedule.save()
+        disbursed.status = 'OVERDUE'
+        disbursed.save()
+        result = BulkLoanLifecycle().transition('complete', [disbursed.id])
+        self.assertEqual(result['results'][0]['reason'], "Loan has unpaid schedules")
+        success, message = async_to_sync(LoanLifecycleService().complete_loan_process)(disbursed.id)
+        self.assertEqual((success, message), (False, "Loan has unpaid schedules"))
+        self.assertFalse(OutboundMessage.objects.exists())
+
+        schedule.status = 'PAID'
+        schedule.save()
+        result = BulkLoanLifecycle().transition('complete', [disbursed.id, self.loans[0].id])
+        self.assertEqual([r['success'] for r in result['results']], [True, False])
+        disbursed.refresh_from_db()
+        self.assertEqual(disbursed.status, 'PAID')
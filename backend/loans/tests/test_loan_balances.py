@@ -0,0 +1,94 @@
+# backend/loans/tests/test_loan_balances.py
+
+from decimal import Decimal
+from django.test import TestCase
+from authentication.models import User
+from farmers.models import Farmer
+from loans.models import Loan, LoanProduct, LoanRepayment
+from loans.repayment_service import reconcile_loan_balances
+
+
+class TestLoanBalances(TestCase):
+    def setUp(self):
+        user = User.objects.create(
+            username="balance_test_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789555666"
+        )
+        farmer = Farmer.objects.create(
+            user=user,
+            name="Balance Test Farmer",
+            phone_number="+250789555666",
+            location="Kigali",
+            farm_size=2.5
+        )
+        product = LoanProduct.objects.create(
+            name="Balance Test Product",
+            description="For testing loan balances",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=90
+        )
+        self.loan = Loan.objects.create(
+            farmer=farmer,
+            loan_product=product,
+            amount_requested=Decimal("300.00"),
+            amount_approved=Decimal("300.00"),
+            outstanding_balance=Decimal("300.00"),
+            status='ACTIVE'
+        )
+
+    def test_add_repayment_updates_totals(self):
+        stale = Loan.objects.get(id=self.loan.id)
+
+        self.loan.add_repayment(Decimal("120.00"))
+        self.assertEqual(self.loan.total_repaid, Decimal("120.00"))
+        self.assertEqual(self.loan.outstanding_balance, Decimal("180.00"))
+
+        # A second instance loaded earlier still adds on top of the first
+        stale.add_repayment(Decimal("250.00"))
+        self.assertEqual(stale.total_repaid, Decimal("370.00"))
+        self.assertEqual(stale.outstanding_balance, Decimal("0.00"))
+
+    def test_saving_other_fields_keeps_repayment_totals(self):
+        stale = Loan.objects.get(id=self.loan.id)
+        self.loan.add_repayment(Decimal("120.00"))
+
+        stale.status = 'PAID'
+        stale.save(update_fields=['status'])
+
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.status, 'PAID')
+        self.assertEqual(self.loan.total_repaid, Decimal("120.00"))
+        self.assertEqual(self.loan.outstanding_balance, Decimal("180.00"))
+
+    def test_approve_opens_the_balance_net_of_repayments(self):
+        self.loan.add_repayment(Decimal("50.00"))
+        self.loan.approve(Decimal("400.00"))
+        self.loan.save(update_fields=Loan.APPROVAL_FIELDS)
+
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.status, 'APPROVED')
+        self.assertEqual(self.loan.amount_approved, Decimal("400.00"))
+        self.assertEqual(self.loan.outstanding_balance, Decimal("350.00"))
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        LoanRepayment.objects.create(loan=self.loan, amount=Decimal("100.00"), transaction_reference="R1")
+        LoanRepayment.objects.create(loan=self.loan, amount=Decimal("50.00"), transaction_reference="R2")
+
+        report = reconcile_loan_balances(fix=False)
+        self.assertEqual(report['checked'], 1)
+        self.assertEqual(report['drifted'], 1)
+        self.assertEqual(report['fixed'], 0)
+        self.assertEqual(report['total_drift'], Decimal("150.00"))
+        self.assertEqual(report['samples'][0]['expected_outstanding_balance'], Decimal("150.00"))
+
+        result = reconcile_loan_balances(batch_size=1)
+        self.assertEqual(result['fixed'], 1)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.total_repaid, Decimal("150.00"))
+        self.assertEqual(self.loan.outstanding_balance, Decimal("150.00"))
+
+        self.assertEqual(reconcile_loan_balances()['drifted'], 0)
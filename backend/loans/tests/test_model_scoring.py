@@ -0,0 +1,122 @@
+# backend/loans/tests/test_model_scoring.py
+
+import os
+import tempfile
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from farmers.models import Farmer
+from loans.models import Loan, LoanProduct
+from loans.explanation_service import CreditExplanationService
+from loans.risk_service import (
+    ModelCreditScoring, build_feature_matrix, build_history_matrix, reset_scoring_model, SCORING_FEATURES
+)
+from authentication.models import User
+
+
+class TestModelCreditScoring(TestCase):
+    def setUp(self):
+        self.loan_product = LoanProduct.objects.create(
+            name="Test Scoring Product",
+            description="Test product for model scoring",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=90
+        )
+
+        self.farmers = []
+        for i in range(6):
+            user = User.objects.create(
+                username=f"model_score_user_{i}",
+                password="password123",
+                role="FARMER",
+                phone_number=f"+25078900000{i}"
+            )
+            farmer = Farmer.objects.create(
+                user=user,
+                name=f"Model Farmer {i}",
+                phone_number=f"+25078900000{i}",
+                location="Kigali",
+                farm_size=1 + i
+            )
+            Loan.objects.create(
+                farmer=farmer,
+                loan_product=self.loan_product,
+                amount_requested=Decimal("500.00"),
+                amount_approved=Decimal("500.00"),
+                status='DEFAULTED' if i % 2 else 'PAID'
+            )
+            self.farmers.append(farmer)
+
+        self.model_dir = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.model_dir.name, 'credit_model.joblib')
+        reset_scoring_model()
+
+    def tearDown(self):
+        reset_scoring_model()
+        self.model_dir.cleanup()
+
+    def test_feature_matrix_shape(self):
+        features = build_feature_matrix(self.farmers)
+        self.assertEqual(features.shape, (6, len(SCORING_FEATURES)))
+        # Row order follows the input order
+        self.assertEqual(features[2][0], 3.0)
+
+    def test_history_matrix_excludes_the_labelled_loan(self):
+        farmer = self.farmers[1]
+        defaulted = Loan.objects.get(farmer=farmer)
+        later = Loan.objects.create(
+            farmer=farmer,
+            loan_product=self.loan_product,
+            amount_requested=Decimal("500.00"),
+            amount_approved=Decimal("500.00"),
+            status='PAID'
+        )
+        Loan.objects.filter(id=later.id).update(application_date=timezone.now() + timedelta(days=1))
+        later.refresh_from_db()
+
+        features = build_history_matrix([farmer, farmer], [defaulted.application_date, later.application_date])
+
+        columns = [SCORING_FEATURES.index(name) for name in ('total_loans', 'paid_loans', 'defaulted_loans')]
+        # Neither row counts its own loan; only the later one sees the earlier default
+        self.assertEqual(list(features[0][columns]), [0, 0, 0])
+        self.assertEqual(list(features[1][columns]), [1, 0, 1])
+
+    def test_batch_scoring_with_trained_model(self):
+        with override_settings(CREDIT_MODEL_PATH=self.model_path):
+            call_command('train_credit_model', output=self.model_path)
+            scores = ModelCreditScoring().score_batch_sync(self.farmers)
+
+        self.assertEqual(len(scores), 6)
+        for score in scores:
+            self.assertGreaterEqual(score, 0)
+            self.assertLessEqual(score, 100)
+
+    def test_rescoring_stores_explanations(self):
+        with override_settings(CREDIT_MODEL_PATH=self.model_path):
+            call_command('train_credit_model', output=self.model_path)
+            result = CreditExplanationService().rescore_all(batch_size=4)
+
+        self.assertEqual(result['processed'], 6)
+
+        # The loan was applied for before any explanation existed
+        loan = Loan.objects.filter(farmer=self.farmers[0]).first()
+        self.assertIsNone(CreditExplanationService.get_loan_explanation(loan))
+
+        loan.approval_date = timezone.now()
+        explanation = CreditExplanationService.get_loan_explanation(loan)
+        self.assertIsNotNone(explanation)
+        self.assertEqual(set(explanation.contributions), set(SCORING_FEATURES))
+        self.assertLessEqual(len(explanation.top_features), 5)
+        self.assertEqual(explanation.snapshot.score, explanation.score)
+
+    @pytest.mark.asyncio
+    async def test_missing_model_falls_back_to_traditional(self):
+        with override_settings(CREDIT_MODEL_PATH=self.model_path):
+            score = await ModelCreditScoring().calculate_score(self.farmers[0])
+
+        self.assertGreaterEqual(score, 50)
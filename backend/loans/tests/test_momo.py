@@ -1,5 +1,12 @@
+import asyncio
+import httpx
 import pytest
-from loans.momo_integration import MoMoAPI
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from loans.momo_integration import MoMoAPI, token_cache
+
+RealAsyncClient = httpx.AsyncClient
 
 @pytest.mark.asyncio
 async def test_momo_integration():
@@ -27,4 +34,65 @@ async def test_momo_integration():
 
 if __name__ == "__main__":
     import asyncio
-    asyncio.run(test_momo_integration())
\ No newline at end of file
+    asyncio.run(test_momo_integration())
+
+class TestMoMoTokenCache(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.token_requests = []
+        self.rejected_tokens = set()
+        self.expires_in = 3600
+
+        def handler(request):
+            if request.url.path.endswith('/token/'):
+                token = f"token-{len(self.token_requests)}"
+                self.token_requests.append(request.url.path)
+                return httpx.Response(200, json={'access_token': token, 'expires_in': self.expires_in})
+            if request.headers['Authorization'].split()[-1] in self.rejected_tokens:
+                return httpx.Response(401, json={'message': 'Access token expired'})
+            return httpx.Response(200, json={'status': 'SUCCESSFUL'})
+
+        transport = httpx.MockTransport(handler)
+        self.client_patcher = patch(
+            'loans.momo_integration.httpx.AsyncClient',
+            lambda *args, **kwargs: RealAsyncClient(transport=transport)
+        )
+        self.client_patcher.start()
+
+    def tearDown(self):
+        self.client_patcher.stop()
+        token_cache.clear()
+
+    def test_token_shared_per_product(self):
+        async def fetch_tokens():
+            return await asyncio.gather(
+                *[MoMoAPI().get_access_token(is_collection=True) for _ in range(5)],
+                MoMoAPI().get_access_token()
+            )
+
+        tokens = async_to_sync(fetch_tokens)()
+
+        # Five concurrent collection callers share one fetch
+        self.assertEqual(len(set(tokens[:5])), 1)
+        self.assertNotEqual(tokens[5], tokens[0])
+        self.assertEqual(sorted(self.token_requests), ['/collection/token/', '/disbursement/token/'])
+
+        async_to_sync(MoMoAPI().get_payment_status)('ref-1')
+        self.assertEqual(len(self.token_requests), 2)
+
+    def test_token_refreshed_ahead_of_expiry(self):
+        # Inside the refresh margin the token is never served from the cache
+        self.expires_in = 30
+        async_to_sync(MoMoAPI().get_access_token)()
+        async_to_sync(MoMoAPI().get_access_token)()
+        self.assertEqual(len(self.token_requests), 2)
+
+    def test_rejected_token_is_retried_once(self):
+        stale = async_to_sync(MoMoAPI().get_access_token)(is_collection=True)
+        self.rejected_tokens.add(stale)
+
+        status = async_to_sync(MoMoAPI().get_payment_status)('ref-1')
+
+        self.assertEqual(status, {'status': 'SUCCESSFUL'})
+        self.assertEqual(len(self.token_requests), 2)
+        self.assertNotEqual(token_cache.get(MoMoAPI()._token_key(True)), stale)
@@ -0,0 +1,87 @@
+# backend/loans/tests/test_outbox.py
+
+import pytest
+from datetime import timedelta
+from unittest.mock import patch, AsyncMock
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from loans.models import OutboundMessage
+from loans.outbox_service import OutboxDispatcher, OUTBOX_MAX_ATTEMPTS, queue_sms
+
+
+class TestOutbox(TestCase):
+    def setUp(self):
+        self.sms_patcher = patch('loans.sms_service.SMSService._send_batch', new_callable=AsyncMock)
+        self.mock_sms = self.sms_patcher.start()
+
+    def tearDown(self):
+        self.sms_patcher.stop()
+
+    def test_queued_message_rolls_back_with_transaction(self):
+        try:
+            with transaction.atomic():
+                queue_sms("+250789000001", "Payment received")
+                raise RuntimeError("business change failed")
+        except RuntimeError:
+            pass
+
+        self.assertFalse(OutboundMessage.objects.exists())
+
+    @pytest.mark.asyncio
+    async def test_drain_sends_and_retries(self):
+        @sync_to_async
+        def queue_messages():
+            return [
+                queue_sms("+250789000001", "Payment received"),
+                queue_sms("+250789000002", "Payment received"),
+                queue_sms("+250789000003", "Not due yet"),
+            ]
+
+        sent, failing, later = await queue_messages()
+        await OutboundMessage.objects.filter(id=later.id).aupdate(
+            next_attempt_at=timezone.now() + timedelta(hours=1)
+        )
+
+        def send_batch(client, message, phone_numbers):
+            return {
+                phone_number: {
+                    'success': phone_number != failing.phone_number,
+                    'status': 'Success' if phone_number != failing.phone_number else 'Gateway timeout',
+                    'message_id': None
+                }
+                for phone_number in phone_numbers
+            }
+
+        self.mock_sms.side_effect = send_batch
+
+        result = await OutboxDispatcher(batch_size=10).drain()
+
+        self.assertEqual(result['handled'], 2)
+        self.assertEqual(result['sent'], 1)
+        self.assertEqual(result['failed'], 1)
+        # Both due messages share a body and go out in one request
+        self.assertEqual(self.mock_sms.await_count, 1)
+
+        sent = await OutboundMessage.objects.aget(id=sent.id)
+        failing = await OutboundMessage.objects.aget(id=failing.id)
+        later = await OutboundMessage.objects.aget(id=later.id)
+
+        self.assertEqual(sent.status, 'SENT')
+        self.assertIsNotNone(sent.sent_at)
+        self.assertEqual(failing.status, 'PENDING')
+        self.assertEqual(failing.attempts, 1)
+        self.assertEqual(failing.last_error, "Gateway timeout")
+        self.assertGreater(failing.next_attempt_at, timezone.now())
+        self.assertEqual(later.attempts, 0)
+
+        # Give up once the last attempt fails
+        await OutboundMessage.objects.filter(id=failing.id).aupdate(
+            attempts=OUTBOX_MAX_ATTEMPTS - 1, next_attempt_at=timezone.now()
+        )
+        await OutboxDispatcher().drain()
+
+        failing = await OutboundMessage.objects.aget(id=failing.id)
+        self.assertEqual(failing.status, 'FAILED')
+        self.assertEqual(failing.attempts, OUTBOX_MAX_ATTEMPTS)
@@ -0,0 +1,137 @@
+# backend/loans/tests/test_payment_schedule_service.py
+
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch, AsyncMock
+from django.test import TestCase
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from authentication.models import User
+from farmers.models import Farmer
+from loans.models import Loan, LoanProduct, PaymentSchedule
+from loans.services import PaymentScheduleService
+
+
+class TestPaymentScheduleService(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="schedule_test_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789111222"
+        )
+        self.farmer = Farmer.objects.create(
+            user=self.user,
+            name="Schedule Test Farmer",
+            phone_number="+250789111222",
+            location="Kigali",
+            farm_size=2.5
+        )
+        self.loan_product = LoanProduct.objects.create(
+            name="Schedule Test Product",
+            description="For testing payment schedules",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=90
+        )
+        self.loan = Loan.objects.create(
+            farmer=self.farmer,
+            loan_product=self.loan_product,
+            amount_requested=Decimal("300.00"),
+            amount_approved=Decimal("300.00"),
+            status='ACTIVE'
+        )
+
+        self.sms_patcher = patch('loans.sms_service.SMSService._send_batch', new_callable=AsyncMock)
+        self.mock_sms = self.sms_patcher.start()
+        self.mock_sms.side_effect = lambda client, message, phone_numbers: {
+            phone_number: {'success': True, 'status': 'Success', 'message_id': None}
+            for phone_number in phone_numbers
+        }
+
+    def tearDown(self):
+        self.sms_patcher.stop()
+
+    def create_schedule(self, installment, days_from_now, status='PENDING'):
+        return PaymentSchedule.objects.create(
+            loan=self.loan,
+            installment_number=installment,
+            due_date=timezone.now() + timedelta(days=days_from_now),
+            principal_amount=Decimal("100.00"),
+            interest_amount=Decimal("0.00"),
+            amount=Decimal("100.00"),
+            status=status
+        )
+
+    @pytest.mark.asyncio
+    async def test_check_overdue_payments(self):
+        @sync_to_async
+        def create_schedules():
+            return [
+                self.create_schedule(1, -5, status='PENDING'),
+                self.create_schedule(2, -45, status='OVERDUE'),
+                self.create_schedule(3, 10),
+            ]
+
+        five_days, capped, upcoming = await create_schedules()
+
+        result = await PaymentScheduleService().check_overdue_payments()
+
+        self.assertEqual(result['schedules_updated'], 2)
+        self.assertEqual(result['reminders_sent'], 2)
+        # One bulk request per distinct message
+        self.assertEqual(self.mock_sms.await_count, 2)
+
+        @sync_to_async
+        def refresh():
+            return [PaymentSchedule.objects.get(id=s.id) for s in (five_days, capped, upcoming)]
+
+        five_days, capped, upcoming = await refresh()
+        self.assertEqual(five_days.status, 'OVERDUE')
+        self.assertEqual(five_days.penalty_amount, Decimal("5.00"))
+        self.assertEqual(capped.penalty_amount, Decimal("30.00"))
+        self.assertIsNotNone(capped.last_reminder_sent)
+        self.assertEqual(upcoming.status, 'PENDING')
+
+        # Reminders are not repeated within 24 hours
+        result = await PaymentScheduleService().check_overdue_payments()
+        self.assertEqual(result['reminders_sent'], 0)
+
+    @pytest.mark.asyncio
+    async def test_send_upcoming_reminders(self):
+        @sync_to_async
+        def create_schedules():
+            for installment, days in enumerate([7, 7, 3, 1, 5], start=1):
+                self.create_schedule(installment, days)
+
+        await create_schedules()
+
+        metrics = await PaymentScheduleService().send_upcoming_reminders(max_concurrency=2)
+
+        self.assertEqual(metrics['selected'], 4)
+        self.assertEqual(metrics['message_groups'], 3)
+        # Both installments due in 7 days render the same text for the same
+        # farmer, who still gets one SMS per installment
+        self.assertEqual(metrics['sent'], 4)
+        self.assertEqual(metrics['failed'], 0)
+        self.assertEqual(self.mock_sms.await_count, 4)
+
+    @pytest.mark.asyncio
+    async def test_upcoming_reminders_include_partial_installments(self):
+        @sync_to_async
+        def create_schedules():
+            partial = self.create_schedule(1, 3, status='PARTIAL')
+            partial.amount_paid = Decimal("40.00")
+            partial.save(update_fields=['amount_paid'])
+            self.create_schedule(2, 3, status='PAID')
+
+        await create_schedules()
+
+        metrics = await PaymentScheduleService().send_upcoming_reminders()
+
+        self.assertEqual(metrics['selected'], 1)
+        self.assertEqual(metrics['sent'], 1)
+        message = self.mock_sms.await_args.args[1]
+        self.assertIn("payment of 60.00 is due in 3 days", message)
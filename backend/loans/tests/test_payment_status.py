@@ -0,0 +1,169 @@
+# backend/loans/tests/test_payment_status.py
+
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+from django.test import TestCase
+from django.utils import timezone
+from authentication.models import User
+from farmers.models import Farmer
+from loans.models import Loan, LoanProduct, LoanRepayment, OutboundMessage, PaymentSchedule, Transaction
+from loans.payment_status_service import PAYMENT_POLL_MAX_CHECKS, DisbursementStatusPoller, PaymentStatusPoller
+
+
+class TestPaymentStatusPoller(TestCase):
+    def setUp(self):
+        self.momo_patcher = patch('loans.payment_status_service.MoMoAPI')
+        self.momo_patcher.start()
+
+        user = User.objects.create(
+            username="poll_test_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789777888"
+        )
+        farmer = Farmer.objects.create(
+            user=user,
+            name="Poll Test Farmer",
+            phone_number="+250789777888",
+            location="Kigali",
+            farm_size=2.5
+        )
+        product = LoanProduct.objects.create(
+            name="Poll Test Product",
+            description="For testing payment polling",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=90
+        )
+        self.product = product
+        self.loan = Loan.objects.create(
+            farmer=farmer,
+            loan_product=product,
+            amount_requested=Decimal("300.00"),
+            amount_approved=Decimal("300.00"),
+            outstanding_balance=Decimal("300.00"),
+            status='ACTIVE'
+        )
+
+    def tearDown(self):
+        self.momo_patcher.stop()
+
+    def create_transaction(self, reference, amount="100.00", **kwargs):
+        return Transaction.objects.create(
+            loan=self.loan,
+            transaction_type='REPAYMENT',
+            amount=Decimal(amount),
+            reference=reference,
+            phone_number="+250789777888",
+            **kwargs
+        )
+
+    def test_claim_only_due_transactions(self):
+        self.create_transaction("due-new")
+        self.create_transaction("due-retry", next_status_check_at=timezone.now() - timedelta(seconds=1))
+        self.create_transaction("not-due", next_status_check_at=timezone.now() + timedelta(minutes=1))
+        self.create_transaction("settled", status='SUCCESSFUL')
+
+        poller = PaymentStatusPoller()
+        claimed = poller.claim_batch()
+
+        self.assertEqual({tx.reference for tx in claimed}, {"due-new", "due-retry"})
+        # Claimed rows are leased, so a second poller finds nothing due
+        self.assertEqual(poller.claim_batch(), [])
+
+    def test_apply_results_in_bulk(self):
+        self.create_transaction("paid-1")
+        self.create_transaction("paid-2", amount="50.00")
+        self.create_transaction("rejected")
+        self.create_transaction("waiting")
+        self.create_transaction("unreachable", status_checks=PAYMENT_POLL_MAX_CHECKS - 1)
+        self.create_transaction("expired", status_checks=PAYMENT_POLL_MAX_CHECKS - 1)
+
+        poller = PaymentStatusPoller()
+        transactions = poller.claim_batch()
+        statuses = {
+            "paid-1": 'SUCCESSFUL', "paid-2": 'SUCCESSFUL', "rejected": 'REJECTED',
+            "waiting": 'PENDING', "unreachable": None, "expired": 'PENDING'
+        }
+
+        counts = poller.apply_results(transactions, [statuses[tx.reference] for tx in transactions])
+
+        self.assertEqual(counts, {'successful': 2, 'failed': 2, 'pending': 1, 'errors': 1})
+        stored = {tx.reference: tx for tx in Transaction.objects.all()}
+        self.assertEqual(stored["paid-1"].status, 'SUCCESSFUL')
+        self.assertEqual(stored["rejected"].status, 'FAILED')
+        self.assertEqual(stored["expired"].status, 'FAILED')
+        self.assertEqual(stored["waiting"].status, 'PENDING')
+        self.assertEqual(stored["waiting"].status_checks, 1)
+        self.assertGreater(stored["waiting"].next_status_check_at, timezone.now())
+        # A failed status request does not use up the check budget
+        self.assertEqual(stored["unreachable"].status, 'PENDING')
+        self.assertEqual(
+            (stored["unreachable"].status_checks, stored["unreachable"].status_check_errors),
+            (PAYMENT_POLL_MAX_CHECKS - 1, 1)
+        )
+        self.assertGreater(stored["unreachable"].next_status_check_at, timezone.now())
+
+        # Both payments for the loan are recorded together, with one SMS
+        self.assertEqual(LoanRepayment.objects.filter(loan=self.loan).count(), 2)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.total_repaid, Decimal("150.00"))
+        self.assertEqual(self.loan.outstanding_balance, Decimal("150.00"))
+        self.assertEqual(OutboundMessage.objects.count(), 1)
+
+        # A result arriving for an already settled transaction is not applied twice
+        counts = poller.apply_results([stored["paid-1"]], ['SUCCESSFUL'])
+        self.assertEqual(counts['successful'], 0)
+        self.assertEqual(LoanRepayment.objects.filter(loan=self.loan).count(), 2)
+
+    def test_disbursements_move_loans_on_once_confirmed(self):
+        loans = {}
+        for reference, checks in [("sent", 0), ("bounced", 0), ("slow", PAYMENT_POLL_MAX_CHECKS)]:
+            loans[reference] = Loan.objects.create(
+                farmer=self.loan.farmer,
+                loan_product=self.product,
+                amount_requested=Decimal("300.00"),
+                amount_approved=Decimal("300.00"),
+                status='APPROVED',
+                disbursement_status='PROCESSING'
+            )
+            Transaction.objects.create(
+                loan=loans[reference],
+                transaction_type='DISBURSEMENT',
+                amount=Decimal("300.00"),
+                reference=reference,
+                phone_number="+250789777888",
+                status_checks=checks
+            )
+        self.create_transaction("repayment")
+
+        poller = DisbursementStatusPoller()
+        transactions = poller.claim_batch()
+        self.assertEqual({tx.reference for tx in transactions}, {"sent", "bounced", "slow"})
+        statuses = {"sent": 'SUCCESSFUL', "bounced": 'FAILED', "slow": 'PENDING'}
+
+        counts = poller.apply_results(transactions, [statuses[tx.reference] for tx in transactions])
+
+        self.assertEqual(counts, {'successful': 1, 'failed': 1, 'pending': 1, 'errors': 0})
+        for loan in loans.values():
+            loan.refresh_from_db()
+        self.assertEqual(
+            (loans["sent"].status, loans["sent"].disbursement_status), ('DISBURSED', 'COMPLETED')
+        )
+        self.assertIsNotNone(loans["sent"].disbursement_date)
+        self.assertEqual(loans["sent"].due_date, loans["sent"].disbursement_date + timedelta(days=90))
+        self.assertEqual(
+            (loans["bounced"].status, loans["bounced"].disbursement_status), ('APPROVED', 'FAILED')
+        )
+        # A transfer MoMo still holds is never given up on
+        self.assertEqual(Transaction.objects.get(reference="slow").status, 'PENDING')
+        self.assertEqual(loans["slow"].disbursement_status, 'PROCESSING')
+
+        # Only the confirmed loan is scheduled: 90 days gives three installments
+        self.assertEqual(
+            list(PaymentSchedule.objects.values_list('loan_id', 'principal_amount')),
+            [(loans["sent"].id, Decimal("100.00"))] * 3
+        )
+        self.assertEqual(OutboundMessage.objects.count(), 1)
@@ -0,0 +1,109 @@
+# backend/loans/tests/test_resilience.py
+
+import asyncio
+import time
+import httpx
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from loans.resilience import (
+    CircuitOpenError,
+    ProviderGuard,
+    ProviderOverloadedError,
+    provider_guard,
+    provider_metrics,
+    reset_provider_guards,
+)
+
+
+async def respond(status_code, delay=0):
+    await asyncio.sleep(delay)
+    return httpx.Response(status_code)
+
+
+async def time_out():
+    raise httpx.ReadTimeout("timed out")
+
+
+class TestProviderGuard(SimpleTestCase):
+    def tearDown(self):
+        reset_provider_guards()
+
+    def test_breaker_opens_sheds_and_recovers(self):
+        guard = ProviderGuard('test.breaker', min_calls=4, recovery_timeout=0.05)
+        calls = []
+
+        async def scenario():
+            await guard.call(respond, 200)
+            for _ in range(3):
+                with self.assertRaises(httpx.ReadTimeout):
+                    await guard.call(time_out)
+            # 3 failures in 4 calls open the breaker; the next call is not made
+            with self.assertRaises(CircuitOpenError):
+                await guard.call(lambda: calls.append(1))
+
+            await asyncio.sleep(0.06)
+            # The half-open probe fails, so the breaker opens again
+            response = await guard.call(respond, 503)
+            self.assertEqual(response.status_code, 503)
+            with self.assertRaises(CircuitOpenError):
+                await guard.call(respond, 200)
+
+            await asyncio.sleep(0.06)
+            await guard.call(respond, 200)
+
+        async_to_sync(scenario)()
+
+        self.assertEqual(calls, [])
+        snapshot = guard.snapshot()
+        self.assertEqual(snapshot['state'], 'CLOSED')
+        self.assertEqual(snapshot['transitions'], {
+            'CLOSED->OPEN': 1, 'OPEN->HALF_OPEN': 2, 'HALF_OPEN->OPEN': 1, 'HALF_OPEN->CLOSED': 1
+        })
+        self.assertEqual(snapshot['rejected_open'], 2)
+
+    def test_limit_grows_additively_and_halves_on_failure(self):
+        guard = ProviderGuard('test.aimd', initial_limit=4, latency_target=0.05, min_calls=100)
+
+        async def scenario():
+            for _ in range(8):
+                await guard.call(respond, 200)
+            grown = guard.limiter.limit
+            # Client errors are the caller's fault and do not shrink the limit
+            await guard.call(respond, 404)
+            await guard.call(respond, 429)
+            return grown
+
+        grown = async_to_sync(scenario)()
+
+        self.assertGreater(grown, 5)
+        self.assertAlmostEqual(guard.limiter.limit, (grown + 1 / grown) / 2)
+        self.assertEqual(guard.limiter.decreases, 1)
+        self.assertEqual(guard.snapshot()['failures'], 1)
+
+    def test_calls_beyond_the_limit_are_shed_after_max_wait(self):
+        guard = ProviderGuard('test.shed', initial_limit=1, min_limit=1, max_wait=0.05, latency_target=1.0)
+
+        async def scenario():
+            slow = asyncio.ensure_future(guard.call(respond, 200, delay=0.2))
+            await asyncio.sleep(0)
+            started = time.monotonic()
+            with self.assertRaises(ProviderOverloadedError):
+                await guard.call(respond, 200)
+            waited = time.monotonic() - started
+            await slow
+            # The slot is free again once the slow call is done
+            await guard.call(respond, 200)
+            return waited
+
+        waited = async_to_sync(scenario)()
+
+        self.assertLess(waited, 0.15)
+        snapshot = guard.snapshot()
+        self.assertEqual(snapshot['shed_overloaded'], 1)
+        self.assertEqual(snapshot['in_flight'], 0)
+        self.assertEqual(snapshot['queued'], 0)
+
+    def test_guards_are_shared_per_family(self):
+        self.assertIs(provider_guard('momo.collection'), provider_guard('momo.collection'))
+        self.assertIsNot(provider_guard('momo.collection'), provider_guard('momo.disbursement'))
+        self.assertEqual(set(provider_metrics()), {'momo.collection', 'momo.disbursement'})
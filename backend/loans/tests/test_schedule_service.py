@@ -0,0 +1,94 @@
+# backend/loans/tests/test_schedule_service.py
+
+from datetime import timedelta
+from decimal import Decimal
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from django.utils import timezone
+from authentication.models import User
+from farmers.models import Farmer
+from loans.models import Loan, LoanProduct, PaymentSchedule
+from loans.schedule_service import BulkScheduleGenerator
+from loans.services import LoanService
+
+
+class TestBulkScheduleGenerator(TestCase):
+    def setUp(self):
+        user = User.objects.create(
+            username="schedule_generator_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789777888"
+        )
+        self.farmer = Farmer.objects.create(
+            user=user,
+            name="Schedule Generator Farmer",
+            phone_number="+250789777888",
+            location="Kigali",
+            farm_size=2.5
+        )
+        self.product = LoanProduct.objects.create(
+            name="Schedule Generator Product",
+            description="For testing bulk schedule generation",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("10000.00"),
+            interest_rate=Decimal("12.00"),
+            duration_days=90,
+            grace_period_days=15
+        )
+        self.disbursed_at = timezone.now() - timedelta(days=5)
+
+    def create_loan(self, amount):
+        return Loan.objects.select_related('loan_product').get(pk=Loan.objects.create(
+            farmer=self.farmer,
+            loan_product=self.product,
+            amount_requested=Decimal(amount),
+            amount_approved=Decimal(amount),
+            status='DISBURSED',
+            disbursement_date=self.disbursed_at
+        ).pk)
+
+    def schedule_rows(self, loan):
+        return list(PaymentSchedule.objects.filter(loan=loan).order_by('installment_number').values_list(
+            'installment_number', 'due_date', 'principal_amount', 'interest_amount', 'amount'
+        ))
+
+    def test_matches_per_loan_path_and_keeps_principal_exact(self):
+        even = self.create_loan("900.00")
+        async_to_sync(LoanService().create_payment_schedule)(even)
+        expected = self.schedule_rows(even)
+        PaymentSchedule.objects.all().delete()
+
+        uneven = self.create_loan("1000.00")
+        harvest = self.create_loan("500.00")
+        harvest_dates = [(self.disbursed_at + timedelta(days=days)).date() for days in (100, 40)]
+
+        result = BulkScheduleGenerator().generate([even, uneven, harvest], {harvest.id: harvest_dates})
+        self.assertEqual((result['loans'], result['schedules']), (3, 8))
+
+        # Where the amount divides evenly, installments match the per-loan path
+        self.assertEqual(self.schedule_rows(even), expected)
+
+        # The remainder goes on the final installment
+        self.assertEqual(
+            [(row[2], row[3]) for row in self.schedule_rows(uneven)],
+            [
+                (Decimal("333.33"), Decimal("10.00")),
+                (Decimal("333.33"), Decimal("6.67")),
+                (Decimal("333.34"), Decimal("3.33")),
+            ]
+        )
+
+        # Harvest installments fall due after the grace period, with interest for the days since disbursement
+        rows = self.schedule_rows(harvest)
+        self.assertEqual([row[1].date() for row in rows], [
+            (self.disbursed_at + timedelta(days=55)).date(), (self.disbursed_at + timedelta(days=115)).date()
+        ])
+        self.assertEqual([(row[2], row[3]) for row in rows], [
+            (Decimal("250.00"), Decimal("9.17")),
+            (Decimal("250.00"), Decimal("9.58")),
+        ])
+
+        # Loans that already have schedules are left alone
+        self.assertEqual(BulkScheduleGenerator().generate([even, uneven])['skipped'], 2)
+        self.assertEqual(PaymentSchedule.objects.count(), 8)
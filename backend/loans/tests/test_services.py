@@ -59,4 +59,42 @@ class TestLoanServices(TestCase):
     def test_credit_scoring(self):
         score = LoanService.calculate_credit_score(self.farmer)
         self.assertGreaterEqual(score, 0)
-        self.assertLessEqual(score, 100)
\ No newline at end of file
+        self.assertLessEqual(score, 100)
+
+    def test_bulk_eligibility_matches_single_check(self):
+        other_user = User.objects.create(
+            username="test_bulk_user",
+            email="bulk_test@example.com",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789123457"
+        )
+        busy_farmer = Farmer.objects.create(
+            user=other_user,
+            name="Busy Farmer",
+            phone_number="+250789123457",
+            location="Kigali",
+            farm_size=1
+        )
+        Loan.objects.create(
+            farmer=busy_farmer,
+            loan_product=self.loan_product,
+            amount_requested=Decimal("200.00"),
+            status='PENDING'
+        )
+
+        applications = [
+            {'farmer_id': self.farmer.id, 'loan_product_id': self.loan_product.id, 'amount': Decimal("500")},
+            {'farmer_id': self.farmer.id, 'loan_product_id': self.loan_product.id, 'amount': Decimal("600")},
+            {'farmer_id': busy_farmer.id, 'loan_product_id': self.loan_product.id, 'amount': Decimal("500")},
+            {'farmer_id': self.farmer.id, 'loan_product_id': self.loan_product.id, 'amount': Decimal("5000")},
+        ]
+        with self.assertNumQueries(6):
+            results = LoanService.check_bulk_eligibility(applications)
+
+        single = LoanService.check_loan_eligibility(self.farmer, self.loan_product, Decimal("500"))
+        self.assertEqual((results[0]['eligible'], results[0]['reason']), single)
+        self.assertEqual(results[0]['credit_score'], LoanService.calculate_credit_score(self.farmer))
+        self.assertEqual(results[1]['reason'], "Farmer already pre-approved in this batch")
+        self.assertEqual(results[2]['reason'], "Farmer has existing active loans")
+        self.assertFalse(results[3]['eligible'])
@@ -0,0 +1,139 @@
+# backend/loans/tests/test_settlement.py
+
+import httpx
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import AsyncMock
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from authentication.models import User
+from farmers.models import Farmer
+from loans.models import ApprovedVendor, Loan, LoanProduct, LoanToken, OutboundMessage, TokenTransaction, VendorSettlement
+from loans.settlement_service import VendorSettlementRunner
+from loans.tokenization_service import TokenizedLoanService
+
+
+@override_settings(TOKEN_SETTLEMENT_MODE='NETTED')
+class TestVendorSettlement(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(
+            username="settlement_test_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789777888"
+        )
+        farmer = Farmer.objects.create(
+            user=user,
+            name="Settlement Test Farmer",
+            phone_number="+250789777888",
+            location="Kigali",
+            farm_size=2.5
+        )
+        product = LoanProduct.objects.create(
+            name="Settlement Test Product",
+            description="For testing vendor settlement",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("5000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=90
+        )
+        loan = Loan.objects.create(
+            farmer=farmer,
+            loan_product=product,
+            amount_requested=Decimal("5000.00"),
+            amount_approved=Decimal("5000.00"),
+            status='DISBURSED'
+        )
+        self.token = LoanToken.objects.create(
+            loan=loan,
+            token="SETTLEMENT-TOKEN",
+            amount=Decimal("5000.00"),
+            status='ACTIVE',
+            expiry_date=timezone.now() + timedelta(days=30)
+        )
+        self.seeds = ApprovedVendor.objects.create(
+            name="Seed Shop", phone_number="+250789000001", location="Kigali", business_type='SEEDS'
+        )
+        self.fertilizer = ApprovedVendor.objects.create(
+            name="Fertilizer Shop", phone_number="+250789000002", location="Musanze", business_type='FERTILIZER'
+        )
+
+        self.service = TokenizedLoanService()
+        self.service.momo_api.initiate_disbursement = AsyncMock()
+        for vendor, amount in [(self.seeds, "300"), (self.seeds, "200"), (self.fertilizer, "1000")]:
+            success, _ = async_to_sync(self.service.process_token_redemption)(self.token.token, vendor.id, amount)
+            self.assertTrue(success)
+
+        # The seed shop is paid, the fertilizer transfer times out on the first run
+        self.responses = {self.seeds.phone_number: httpx.Response(202)}
+        self.sent = []
+
+        async def send_disbursement(reference, amount, phone_number, client=None, **notes):
+            self.sent.append((reference, amount, phone_number))
+            if phone_number in self.responses:
+                return self.responses[phone_number]
+            raise httpx.ConnectTimeout("timed out")
+
+        self.runner = VendorSettlementRunner()
+        self.runner.momo_api.send_disbursement = AsyncMock(side_effect=send_disbursement)
+
+    def test_redemptions_are_netted_into_one_transfer_per_vendor(self):
+        self.service.momo_api.initiate_disbursement.assert_not_called()
+        self.assertEqual(TokenTransaction.objects.filter(status='PENDING').count(), 3)
+
+        result = async_to_sync(self.runner.run)()
+
+        self.assertEqual((result['settlements'], result['accepted'], result['unknown']), (2, 1, 1))
+        self.assertEqual(sorted((amount, phone) for _, amount, phone in self.sent), [
+            (Decimal("500.00"), self.seeds.phone_number),
+            (Decimal("1000.00"), self.fertilizer.phone_number),
+        ])
+        seeds_settlement = VendorSettlement.objects.get(vendor=self.seeds)
+        self.assertEqual((seeds_settlement.status, seeds_settlement.transaction_count), ('PROCESSING', 2))
+        self.assertEqual(
+            set(TokenTransaction.objects.filter(vendor=self.seeds).values_list('status', flat=True)), {'SETTLED'}
+        )
+        self.assertTrue(OutboundMessage.objects.filter(phone_number=self.seeds.phone_number).exists())
+
+        # A later redemption waits for the next settlement, and the timed out one is resent as is
+        async_to_sync(self.service.process_token_redemption)(self.token.token, self.fertilizer.id, "50")
+        first_reference = VendorSettlement.objects.get(vendor=self.fertilizer).reference
+        self.responses[self.fertilizer.phone_number] = httpx.Response(409, text="RESOURCE_ALREADY_EXIST")
+        self.runner.momo_api.get_disbursement_status = AsyncMock(return_value={'status': 'SUCCESSFUL'})
+        self.sent.clear()
+
+        result = async_to_sync(self.runner.run)()
+
+        self.assertEqual(self.sent, [(first_reference, Decimal("1000.00"), self.fertilizer.phone_number)])
+        self.assertEqual(result['accepted'], 1)
+
+        # One transfer per vendor per run; the new redemption goes in the next one
+        self.responses[self.fertilizer.phone_number] = httpx.Response(202)
+        result = async_to_sync(self.runner.run)()
+
+        self.assertEqual(result['accepted'], 1)
+        self.assertEqual(
+            list(VendorSettlement.objects.filter(vendor=self.fertilizer).order_by('id').values_list('amount', flat=True)),
+            [Decimal("1000.00"), Decimal("50.00")]
+        )
+        report = VendorSettlementRunner.settlement_report(timezone.now() - timedelta(minutes=1))
+        self.assertEqual(len(report), 3)
+
+    def test_rejected_settlement_returns_redemptions_to_pending(self):
+        self.responses[self.fertilizer.phone_number] = httpx.Response(400, text="Payee not found")
+
+        result = async_to_sync(self.runner.run)()
+
+        self.assertEqual(result['rejected'], 1)
+        self.assertEqual(VendorSettlement.objects.get(vendor=self.fertilizer).status, 'FAILED')
+        pending = TokenTransaction.objects.get(vendor=self.fertilizer)
+        self.assertEqual((pending.status, pending.settlement_id), ('PENDING', None))
+
+        self.responses[self.fertilizer.phone_number] = httpx.Response(202)
+        result = async_to_sync(self.runner.run)()
+
+        self.assertEqual((result['settlements'], result['accepted']), (1, 1))
+        self.assertEqual(TokenTransaction.objects.get(vendor=self.fertilizer).status, 'SETTLED')
@@ -0,0 +1,122 @@
+# backend/loans/tests/test_sms_service.py
+
+import httpx
+import pytest
+from unittest.mock import patch, AsyncMock
+from django.test import TestCase, override_settings
+from loans.resilience import CircuitOpenError, reset_provider_guards
+from loans.sms_service import SMSService
+
+
+@override_settings(AT_API_KEY='test-key', AT_USERNAME='sandbox')
+class TestSMSServiceBulk(TestCase):
+    def setUp(self):
+        self.env_patcher = patch('loans.sms_service.SMSService.is_test_env', return_value=False)
+        self.env_patcher.start()
+        reset_provider_guards()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        reset_provider_guards()
+
+    @staticmethod
+    def provider_response(url, headers=None, data=None):
+        """Accept every number except those ending in 9"""
+        recipients = [
+            {
+                'number': number,
+                'status': 'InvalidPhoneNumber' if number.endswith('9') else 'Success',
+                'statusCode': 403 if number.endswith('9') else 101,
+                'messageId': f"ATXid_{number}"
+            }
+            for number in data['to'].split(',')
+        ]
+        return httpx.Response(200, json={'SMSMessageData': {'Message': 'Sent', 'Recipients': recipients}})
+
+    @pytest.mark.asyncio
+    async def test_send_bulk_batches_and_maps_statuses(self):
+        recipients = [f"+2507880{i:05d}" for i in range(250)]
+
+        with patch('loans.sms_service.SMS_BULK_BATCH_SIZE', 100), \
+             patch('httpx.AsyncClient.post', new_callable=AsyncMock) as mock_post:
+            mock_post.side_effect = self.provider_response
+            results = await SMSService().send_bulk("Reminder", recipients + recipients[:10])
+
+        # Duplicates are dropped and 250 recipients need three requests
+        self.assertEqual(mock_post.await_count, 3)
+        self.assertEqual(len(results), 250)
+        self.assertTrue(results["+250788000000"]['success'])
+        self.assertEqual(results["+250788000000"]['message_id'], "ATXid_+250788000000")
+        self.assertFalse(results["+250788000009"]['success'])
+        self.assertEqual(results["+250788000009"]['status'], 'InvalidPhoneNumber')
+
+    @pytest.mark.asyncio
+    async def test_send_grouped_merges_identical_bodies(self):
+        pairs = [
+            ("+250788000001", "Due in 3 days"),
+            ("+250788000002", "Due in 3 days"),
+            ("+250788000003", "Due in 1 day"),
+        ]
+
+        with patch('httpx.AsyncClient.post', new_callable=AsyncMock) as mock_post:
+            mock_post.side_effect = [
+                self.provider_response(None, data={'to': "+250788000001,+250788000002"}),
+                httpx.ConnectError("connection refused"),
+            ]
+            results = await SMSService().send_grouped(pairs, max_concurrency=1)
+
+        self.assertEqual(mock_post.await_count, 2)
+        self.assertTrue(results["Due in 3 days"]["+250788000002"]['success'])
+        self.assertFalse(results["Due in 1 day"]["+250788000003"]['success'])
+
+    @pytest.mark.asyncio
+    async def test_send_keyed_sends_every_key(self):
+        messages_by_key = {
+            1: ("+250788000001", "Due in 7 days"),
+            2: ("+250788000001", "Due in 7 days"),
+            3: ("+250788000002", "Due in 7 days"),
+            4: ("+250788000009", "Due in 1 day"),
+        }
+
+        with patch('httpx.AsyncClient.post', new_callable=AsyncMock) as mock_post:
+            mock_post.side_effect = self.provider_response
+            results = await SMSService().send_keyed(messages_by_key, max_concurrency=1)
+
+        # The repeated number and text goes out in a second request
+        sent_to = [call.kwargs['data']['to'] for call in mock_post.await_args_list]
+        self.assertEqual(sent_to, ["+250788000001,+250788000002", "+250788000001", "+250788000009"])
+        self.assertEqual(set(results), {1, 2, 3, 4})
+        self.assertTrue(results[1]['success'])
+        self.assertTrue(results[2]['success'])
+        self.assertFalse(results[4]['success'])
+
+    @pytest.mark.asyncio
+    async def test_batch_statuses_match_numbers_in_other_formats(self):
+        with patch('httpx.AsyncClient.post', new_callable=AsyncMock) as mock_post:
+            mock_post.return_value = self.provider_response(
+                None, data={'to': "+250788000001,+250788000002"}
+            )
+            results = await SMSService().send_bulk("Reminder", ["0788000001", "+250 788 000 002"])
+
+        self.assertTrue(results["0788000001"]['success'])
+        self.assertEqual(results["+250 788 000 002"]['message_id'], "ATXid_+250788000002")
+
+    @pytest.mark.asyncio
+    async def test_send_sms_reports_provider_failures(self):
+        with patch('httpx.AsyncClient.post', new_callable=AsyncMock) as mock_post:
+            mock_post.return_value = httpx.Response(500, text="Internal error")
+            success, result = await SMSService().send_sms("+250788000001", "Hello")
+        self.assertFalse(success)
+        self.assertEqual(result['error'], "HTTP 500")
+
+        with patch('loans.resilience.ProviderGuard.call', new_callable=AsyncMock) as mock_call:
+            mock_call.side_effect = CircuitOpenError("open")
+            success, result = await SMSService().send_sms("+250788000001", "Hello")
+        self.assertFalse(success)
+        self.assertEqual(result['status'], "provider_unavailable")
+
+        with patch('httpx.AsyncClient.post', new_callable=AsyncMock) as mock_post:
+            mock_post.return_value = self.provider_response(None, data={'to': "+250788000001"})
+            success, result = await SMSService().send_sms("+250788000001", "Hello")
+        self.assertTrue(success)
+        self.assertEqual(result['SMSMessageData']['Recipients'][0]['statusCode'], 101)
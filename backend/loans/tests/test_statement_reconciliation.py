@@ -0,0 +1,124 @@
+# backend/loans/tests/test_statement_reconciliation.py
+
+import csv
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+from authentication.models import User
+from farmers.models import Farmer
+from loans.models import ApprovedVendor, Loan, LoanProduct, LoanRepayment, Transaction, VendorSettlement
+from loans.statement_reconciliation import StatementReconciler
+
+
+class TestStatementReconciliation(TestCase):
+    def setUp(self):
+        user = User.objects.create(
+            username="statement_test_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789222333"
+        )
+        farmer = Farmer.objects.create(
+            user=user,
+            name="Statement Test Farmer",
+            phone_number="+250789222333",
+            location="Kigali",
+            farm_size=2.5
+        )
+        product = LoanProduct.objects.create(
+            name="Statement Test Product",
+            description="For testing statement reconciliation",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=90
+        )
+        loan = Loan.objects.create(
+            farmer=farmer,
+            loan_product=product,
+            amount_requested=Decimal("1000.00"),
+            amount_approved=Decimal("1000.00"),
+            status='DISBURSED'
+        )
+        for reference, transaction_type, amount, tx_status in [
+            ("REF-MATCHED", 'REPAYMENT', "100.00", 'SUCCESSFUL'),
+            ("REF-AMOUNT", 'REPAYMENT', "200.00", 'SUCCESSFUL'),
+            ("REF-STATUS", 'DISBURSEMENT', "300.00", 'PENDING'),
+            ("REF-UNAPPLIED", 'REPAYMENT', "400.00", 'SUCCESSFUL'),
+            ("REF-MISSING", 'REPAYMENT', "500.00", 'SUCCESSFUL'),
+        ]:
+            Transaction.objects.create(
+                loan=loan,
+                transaction_type=transaction_type,
+                amount=Decimal(amount),
+                reference=reference,
+                phone_number=farmer.phone_number,
+                status=tx_status
+            )
+        for reference, amount in [("REF-MATCHED", "100.00"), ("REF-AMOUNT", "200.00"), ("REF-MISSING", "500.00")]:
+            LoanRepayment.objects.create(loan=loan, amount=Decimal(amount), transaction_reference=reference)
+        # Settlement transfers have no Transaction row
+        vendor = ApprovedVendor.objects.create(
+            name="Statement Test Vendor",
+            phone_number="+250789444555",
+            location="Kigali",
+            business_type='SEEDS'
+        )
+        VendorSettlement.objects.create(
+            vendor=vendor,
+            amount=Decimal("600.00"),
+            transaction_count=3,
+            reference="REF-SETTLEMENT",
+            phone_number=vendor.phone_number,
+            status='PROCESSING',
+            period_end=timezone.now()
+        )
+
+        self.workdir = tempfile.TemporaryDirectory()
+        self.statement = os.path.join(self.workdir.name, 'statement.csv')
+        now = timezone.now()
+        with open(self.statement, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Id', 'External Transaction Id', 'Date', 'Status', 'Amount'])
+            writer.writerow(['1', 'REF-MATCHED', (now - timedelta(hours=1)).isoformat(), 'Successful', '100'])
+            writer.writerow(['2', 'REF-AMOUNT', now.isoformat(), 'SUCCESSFUL', '250.00'])
+            writer.writerow(['3', 'REF-STATUS', now.isoformat(), 'SUCCESSFUL', '-300.00'])
+            writer.writerow(['4', 'REF-UNAPPLIED', now.isoformat(), 'SUCCESSFUL', '400.00'])
+            writer.writerow(['5', 'REF-ORPHAN', (now + timedelta(hours=1)).isoformat(), 'SUCCESSFUL', '1,000.00'])
+            writer.writerow(['6', '', now.isoformat(), 'SUCCESSFUL', '10.00'])
+            writer.writerow(['7', 'REF-SETTLEMENT', now.isoformat(), 'SUCCESSFUL', '-600.00'])
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_statement_lines_are_classified_by_reference(self):
+        output_dir = os.path.join(self.workdir.name, 'reports')
+        result = StatementReconciler(partitions=4, output_dir=output_dir).run(self.statement)
+
+        self.assertEqual((result['statement_lines'], result['unparseable_lines']), (7, 1))
+        self.assertEqual(
+            {category: result[category] for category in (
+                'matched', 'amount_mismatch', 'status_mismatch', 'unapplied_repayment', 'missing', 'orphan'
+            )},
+            {'matched': 2, 'amount_mismatch': 1, 'status_mismatch': 1, 'unapplied_repayment': 1, 'missing': 1, 'orphan': 1}
+        )
+
+        with open(os.path.join(output_dir, 'amount_mismatch.csv')) as f:
+            row = list(csv.DictReader(f))[0]
+        self.assertEqual((row['reference'], row['statement_amount'], row['amount']), ("REF-AMOUNT", "250.00", "200.00"))
+        with open(os.path.join(output_dir, 'orphan.csv')) as f:
+            self.assertEqual([row['reference'] for row in csv.DictReader(f)], ["REF-ORPHAN"])
+        with open(os.path.join(output_dir, 'matched.csv')) as f:
+            types = {row['reference']: row['transaction_type'] for row in csv.DictReader(f)}
+        self.assertEqual(types["REF-SETTLEMENT"], 'SETTLEMENT')
+
+    def test_only_transactions_around_the_period_are_joined(self):
+        # Transactions far outside the given period are neither missing nor matched
+        start = timezone.now() - timedelta(days=30)
+        result = StatementReconciler(partitions=1).run(self.statement, start=start, end=start + timedelta(days=1))
+
+        self.assertEqual(result['missing'], 0)
+        self.assertEqual(result['orphan'], 6)
@@ -1,17 +1,22 @@
 # backend/loans/tests/test_tokenization.py
 
+import asyncio
 import pytest
+from datetime import timedelta
+from unittest.mock import AsyncMock
+from django.core.cache import cache
 from django.test import TestCase
 from django.utils import timezone
-from asgiref.sync import sync_to_async
+from asgiref.sync import async_to_sync, sync_to_async
 from decimal import Decimal
-from loans.tokenization_service import TokenizedLoanService
+from loans.tokenization_service import TokenizedLoanService, token_cache_key
 from farmers.models import Farmer
-from loans.models import Loan, LoanProduct, ApprovedVendor, LoanToken
+from loans.models import Loan, LoanProduct, ApprovedVendor, LoanToken, OutboundMessage, TokenTransaction
 from authentication.models import User 
 
 class TestTokenizedLoans(TestCase):
     def setUp(self):
+        cache.clear()
         # Create test farmer
         self.user = User.objects.create(
             username="test_token_user",
@@ -89,4 +94,150 @@ class TestTokenizedLoans(TestCase):
         
         updated_loan = await get_updated_loan()
         self.assertEqual(updated_loan.disbursement_status, 'COMPLETED')
-        self.assertEqual(updated_loan.momo_reference, result.token)
\ No newline at end of file
+        self.assertEqual(updated_loan.momo_reference, result.token)
+
+    def create_token(self, amount):
+        loan = Loan.objects.create(
+            farmer=self.farmer,
+            loan_product=self.loan_product,
+            amount_requested=amount,
+            amount_approved=amount,
+            status='DISBURSED'
+        )
+        return LoanToken.objects.create(
+            loan=loan,
+            token=f"TOKEN-{loan.id}",
+            amount=amount,
+            status='ACTIVE',
+            expiry_date=timezone.now() + timedelta(days=30)
+        )
+
+    def test_concurrent_redemptions_never_overspend(self):
+        loan_token = self.create_token(Decimal("1000"))
+        token_service = TokenizedLoanService()
+        payouts = []
+
+        async def payout(loan_id, amount, phone_number):
+            await asyncio.sleep(0.01)
+            if len(payouts) == 1:
+                payouts.append(None)
+                raise Exception("MoMo unavailable")
+            payouts.append(amount)
+            return {'status': 'pending', 'reference': f"REF-{len(payouts)}"}
+
+        token_service.momo_api.initiate_disbursement = payout
+
+        async def redeem_all():
+            return await asyncio.gather(*[
+                token_service.process_token_redemption(loan_token.token, self.vendor.id, Decimal("300"))
+                for _ in range(6)
+            ])
+
+        results = async_to_sync(redeem_all)()
+
+        # Only three reservations fit; the second payout fails and its amount is released
+        self.assertEqual(len(payouts), 3)
+        self.assertEqual([success for success, _ in results].count(True), 2)
+        loan_token.refresh_from_db()
+        self.assertEqual(loan_token.amount, Decimal("400"))
+        self.assertEqual(loan_token.status, 'ACTIVE')
+        self.assertEqual(TokenTransaction.objects.filter(token=loan_token).count(), 2)
+
+    def test_failed_payout_reactivates_token_spent_meanwhile(self):
+        loan_token = self.create_token(Decimal("1000"))
+        token_service = TokenizedLoanService()
+
+        async def interleave():
+            in_flight = asyncio.Event()
+            drained = asyncio.Event()
+
+            async def payout(loan_id, amount, phone_number):
+                if amount == Decimal("400"):
+                    in_flight.set()
+                    await drained.wait()
+                    raise Exception("MoMo unavailable")
+                return {'status': 'pending', 'reference': 'REF-DRAIN'}
+
+            token_service.momo_api.initiate_disbursement = payout
+            failing = asyncio.ensure_future(
+                token_service.process_token_redemption(loan_token.token, self.vendor.id, Decimal("400"))
+            )
+            await in_flight.wait()
+            # Drains the rest of the balance while the first payout is in flight
+            drain = await token_service.process_token_redemption(loan_token.token, self.vendor.id, Decimal("600"))
+            status = (await LoanToken.objects.aget(pk=loan_token.pk)).status
+            drained.set()
+            return await failing, drain, status
+
+        failed, drain, status_in_between = async_to_sync(interleave)()
+
+        self.assertEqual((failed[0], drain[0], status_in_between), (False, True, 'USED'))
+        loan_token.refresh_from_db()
+        self.assertEqual((loan_token.amount, loan_token.status), (Decimal("400"), 'ACTIVE'))
+        self.assertEqual(TokenizedLoanService.active_token_count(self.farmer.id), 1)
+
+    def test_spent_token_is_marked_used_and_vendors_are_cached(self):
+        loan_token = self.create_token(Decimal("500"))
+        token_service = TokenizedLoanService()
+        token_service.momo_api.initiate_disbursement = AsyncMock(
+            return_value={'status': 'pending', 'reference': 'REF-1'}
+        )
+
+        success, _ = async_to_sync(token_service.process_token_redemption)(
+            loan_token.token, self.vendor.id, Decimal("500")
+        )
+        self.assertTrue(success)
+        loan_token.refresh_from_db()
+        self.assertEqual(loan_token.status, 'USED')
+
+        # The vendor map is cached until a vendor changes
+        with self.assertNumQueries(0):
+            ApprovedVendor.active_map()
+        self.vendor.is_active = False
+        self.vendor.save()
+        success, message = async_to_sync(token_service.process_token_redemption)(
+            self.create_token(Decimal("100")).token, self.vendor.id, Decimal("50")
+        )
+        self.assertFalse(success)
+        self.assertEqual(message, "Vendor not approved")
+
+    def test_validation_is_cached_until_a_redemption(self):
+        loan_token = self.create_token(Decimal("500"))
+
+        with self.assertNumQueries(1):
+            row = TokenizedLoanService.validate_token(loan_token.token)
+        self.assertEqual(row['loan__farmer__name'], "Test Token Farmer")
+        with self.assertNumQueries(0):
+            TokenizedLoanService.validate_token(loan_token.token)
+
+        TokenizedLoanService.reserve_amount(loan_token.token, Decimal("200"))
+        self.assertEqual(TokenizedLoanService.validate_token(loan_token.token)['amount'], Decimal("300"))
+
+        # An expired token is not served from the cache
+        LoanToken.objects.filter(pk=loan_token.pk).update(expiry_date=timezone.now() - timedelta(minutes=1))
+        cache.set(
+            token_cache_key(loan_token.token),
+            {**row, 'expiry_date': timezone.now() - timedelta(minutes=1)}
+        )
+        self.assertIsNone(TokenizedLoanService.validate_token(loan_token.token))
+
+    def test_sweeper_expires_tokens_and_refreshes_cached_counts(self):
+        self.create_token(Decimal("500"))
+        expired_token = self.create_token(Decimal("300"))
+        LoanToken.objects.filter(pk=expired_token.pk).update(expiry_date=timezone.now() - timedelta(hours=1))
+
+        # Both are still ACTIVE until the sweep runs
+        self.assertEqual(TokenizedLoanService.active_token_count(self.farmer.id), 2)
+        with self.assertNumQueries(0):
+            TokenizedLoanService.active_token_count(self.farmer.id)
+
+        result = TokenizedLoanService.expire_tokens()
+
+        self.assertEqual(result, {'expired': 1, 'notified': 1})
+        expired_token.refresh_from_db()
+        self.assertEqual(expired_token.status, 'EXPIRED')
+        self.assertTrue(
+            OutboundMessage.objects.filter(phone_number=self.farmer.phone_number, message__contains="300").exists()
+        )
+        self.assertEqual(TokenizedLoanService.active_token_count(self.farmer.id), 1)
+        self.assertEqual(TokenizedLoanService.expire_tokens(), {'expired': 0, 'notified': 0})
@@ -1,4 +1,5 @@
 from decimal import Decimal
+from unittest.mock import patch
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -74,6 +75,22 @@ class LoanAPITests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['status'], 'APPROVED')
 
+    def test_loan_approval_sets_outstanding_balance(self):
+        """Approving through the view keeps the balance in step with the approved amount"""
+        loan = Loan.objects.create(
+            farmer=self.farmer,
+            loan_product=self.loan_product,
+            amount_requested=Decimal('500.00'),
+            status='PENDING'
+        )
+        url = reverse('loan-approve', kwargs={'pk': loan.id})
+        response = self.client.post(url, {'amount_approved': '450.00'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        loan.refresh_from_db()
+        self.assertEqual(loan.amount_approved, Decimal('450.00'))
+        self.assertEqual(loan.outstanding_balance, Decimal('450.00'))
+
     def test_loan_disbursement_success(self):
         """Test successful loan disbursement"""
         loan = Loan.objects.create(
@@ -86,4 +103,28 @@ class LoanAPITests(TestCase):
         url = reverse('loan-disburse', kwargs={'pk': loan.id})
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['status'], 'DISBURSED')
\ No newline at end of file
+        self.assertEqual(response.data['status'], 'DISBURSED')
+
+    def test_bulk_transition_parses_disburse_flag(self):
+        """A form 'false' for disburse skips scheduling the disbursement"""
+        self.user.role = 'ADMIN'
+        self.user.save()
+        loan = Loan.objects.create(
+            farmer=self.farmer,
+            loan_product=self.loan_product,
+            amount_requested=Decimal('500.00'),
+            status='PENDING'
+        )
+        url = reverse('loan-bulk-transition')
+
+        response = self.client.post(url, {'action': 'approve', 'loan_ids': [str(loan.id)], 'disburse': 'maybe'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('disburse', response.data)
+
+        with patch('loans.lifecycle_service.BulkLoanLifecycle.schedule_disbursement') as schedule, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'action': 'approve', 'loan_ids': [str(loan.id)], 'disburse': 'false'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        schedule.assert_not_called()
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, 'APPROVED')
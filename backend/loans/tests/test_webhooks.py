@@ -0,0 +1,202 @@
+# backend/loans/tests/test_webhooks.py
+
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch, AsyncMock
+from django.test import TestCase
+from django.utils import timezone
+from asgiref.sync import async_to_sync, sync_to_async
+from authentication.models import User
+from farmers.models import Farmer
+from loans.models import Loan, LoanProduct, LoanRepayment, MoMoWebhookEvent
+from loans.webhook_service import WEBHOOK_CLAIM_TIMEOUT, MoMoWebhookService, WebhookEventWorker
+
+
+class TestMoMoWebhookEvents(TestCase):
+    def setUp(self):
+        self.payload = {
+            'financialTransactionId': '1234567890',
+            'externalId': 'loan-ref-1',
+            'amount': '525.00',
+            'currency': 'RWF',
+            'payer': {'partyIdType': 'MSISDN', 'partyId': '250789123456'},
+            'status': 'SUCCESSFUL'
+        }
+        self.momo_patcher = patch('loans.repayment_service.MoMoAPI')
+        self.momo_patcher.start()
+        self.process_patcher = patch(
+            'loans.repayment_service.RepaymentService.process_payment', new_callable=AsyncMock
+        )
+        self.mock_process = self.process_patcher.start()
+        self.mock_process.return_value = (True, "Repayment processed successfully")
+
+    def tearDown(self):
+        self.momo_patcher.stop()
+        self.process_patcher.stop()
+
+    def test_duplicate_callbacks_are_rejected(self):
+        # A single INSERT (inside a savepoint) decides whether a callback is new
+        with self.assertNumQueries(3):
+            event, created = MoMoWebhookService.record_event(self.payload)
+        self.assertTrue(created)
+        self.assertEqual(event.provider_transaction_id, '1234567890')
+        self.assertEqual(event.amount, Decimal('525.00'))
+        self.assertEqual(event.phone_number, '250789123456')
+        self.assertEqual(event.payload, self.payload)
+
+        duplicate, created = MoMoWebhookService.record_event(dict(self.payload, amount='1.00'))
+        self.assertIsNone(duplicate)
+        self.assertFalse(created)
+        self.assertEqual(MoMoWebhookEvent.objects.count(), 1)
+
+        # Callbacks without a provider ID are still stored; only an exact re-delivery is a duplicate
+        failure = {'externalId': 'loan-ref-1', 'amount': '10', 'status': 'FAILED'}
+        event, created = MoMoWebhookService.record_event(failure)
+        self.assertTrue(created)
+        self.assertTrue(event.provider_transaction_id.startswith('payload-'))
+        self.assertFalse(MoMoWebhookService.record_event(dict(failure))[1])
+
+    @pytest.mark.asyncio
+    async def test_process_and_replay(self):
+        event, _ = await sync_to_async(MoMoWebhookService.record_event)(self.payload)
+        self.mock_process.return_value = (False, "Loan with reference loan-ref-1 not found")
+
+        success, _ = await MoMoWebhookService().process_event(event)
+
+        self.assertFalse(success)
+        self.mock_process.assert_awaited_once()
+        self.assertEqual(self.mock_process.await_args.args[0]['transaction_id'], '1234567890')
+        event = await MoMoWebhookEvent.objects.aget(id=event.id)
+        self.assertEqual(event.status, 'FAILED')
+
+        # Replaying the stored payload applies it once the loan can be found
+        self.mock_process.return_value = (True, "Repayment processed successfully")
+        counts = await MoMoWebhookService().replay([event])
+
+        self.assertEqual(counts, {'replayed': 1, 'processed': 1, 'failed': 0})
+        event = await MoMoWebhookEvent.objects.aget(id=event.id)
+        self.assertEqual(event.status, 'PROCESSED')
+        self.assertIsNotNone(event.processed_at)
+
+    @pytest.mark.asyncio
+    async def test_unsuccessful_payment_is_ignored(self):
+        event, _ = await sync_to_async(MoMoWebhookService.record_event)(
+            dict(self.payload, status='FAILED')
+        )
+
+        success, _ = await MoMoWebhookService().process_event(event)
+
+        self.assertTrue(success)
+        self.mock_process.assert_not_awaited()
+        self.assertEqual(event.status, 'IGNORED')
+
+    @pytest.mark.asyncio
+    async def test_worker_drains_events_in_order_per_loan(self):
+        @sync_to_async
+        def record_burst():
+            for i, loan_ref in enumerate(['loan-a', 'loan-b', 'loan-a', 'loan-a', 'loan-b']):
+                MoMoWebhookService.record_event(dict(
+                    self.payload, financialTransactionId=f"tx-{i}", externalId=loan_ref
+                ))
+
+        await record_burst()
+
+        applied = []
+
+        async def process_payment(payment_data, webhook_event=None):
+            applied.append((payment_data['reference'], payment_data['transaction_id']))
+            return True, "Repayment processed successfully"
+
+        self.mock_process.side_effect = process_payment
+
+        result = await WebhookEventWorker(batch_size=3).drain()
+
+        self.assertEqual(result['batches'], 2)
+        self.assertEqual(result['processed'], 5)
+        self.assertEqual(
+            [tx for loan_ref, tx in applied if loan_ref == 'loan-a'],
+            ['tx-0', 'tx-2', 'tx-3']
+        )
+        self.assertFalse(await MoMoWebhookEvent.objects.exclude(status='PROCESSED').aexists())
+
+
+class TestWebhookRepaymentIdempotency(TestCase):
+    def setUp(self):
+        user = User.objects.create(
+            username="webhook_idempotency_user",
+            password="password123",
+            role="FARMER",
+            phone_number="+250789333444"
+        )
+        farmer = Farmer.objects.create(
+            user=user,
+            name="Webhook Idempotency Farmer",
+            phone_number="+250789333444",
+            location="Kigali",
+            farm_size=2.5
+        )
+        product = LoanProduct.objects.create(
+            name="Webhook Idempotency Product",
+            description="For testing callback idempotency",
+            min_amount=Decimal("100.00"),
+            max_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"),
+            duration_days=90
+        )
+        self.loan = Loan.objects.create(
+            farmer=farmer,
+            loan_product=product,
+            amount_requested=Decimal("1000.00"),
+            amount_approved=Decimal("1000.00"),
+            status='DISBURSED'
+        )
+        self.event, _ = MoMoWebhookService.record_event({
+            'financialTransactionId': 'MOMO-42',
+            'externalId': str(self.loan.id),
+            'amount': '100.00',
+            'payer': {'partyIdType': 'MSISDN', 'partyId': '250789333444'},
+            'status': 'SUCCESSFUL'
+        })
+
+    def test_reclaimed_event_is_not_applied_twice(self):
+        worker = WebhookEventWorker()
+        [event] = worker.claim_batch()
+        async_to_sync(worker.webhook_service.apply_event)(event, worker.repayment_service)
+
+        # The worker dies before its bulk_update; the event was still marked with the repayment
+        self.assertEqual(MoMoWebhookEvent.objects.get(id=event.id).status, 'PROCESSED')
+
+        # Even if another worker reclaims it, the provider ID stops a second repayment
+        MoMoWebhookEvent.objects.filter(id=event.id).update(
+            status='PROCESSING', claimed_at=timezone.now() - WEBHOOK_CLAIM_TIMEOUT - timedelta(minutes=1)
+        )
+        result = async_to_sync(worker.drain)()
+
+        self.assertEqual(result['processed'], 1)
+        self.assertEqual(LoanRepayment.objects.filter(loan=self.loan).count(), 1)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.total_repaid, Decimal("100.00"))
+
+    def test_legacy_callbacks_for_the_same_loan_are_all_applied(self):
+        # Legacy callbacks carry the loan reference in transaction_id and no provider ID
+        legacy = {
+            'transaction_id': str(self.loan.id), 'amount': '150.00',
+            'phone_number': '250789333444', 'status': 'SUCCESSFUL'
+        }
+        first, created = MoMoWebhookService.record_event(legacy)
+        self.assertTrue(created)
+        self.assertEqual(first.external_id, str(self.loan.id))
+        self.assertNotEqual(first.provider_transaction_id, str(self.loan.id))
+
+        second, created = MoMoWebhookService.record_event(dict(legacy, amount='200.00'))
+        self.assertTrue(created)
+        self.assertFalse(MoMoWebhookService.record_event(dict(legacy))[1])
+
+        result = async_to_sync(WebhookEventWorker().drain)()
+
+        self.assertEqual(result['processed'], 3)
+        self.assertEqual(
+            sorted(LoanRepayment.objects.filter(loan=self.loan).values_list('amount', flat=True)),
+            [Decimal("100.00"), Decimal("150.00"), Decimal("200.00")]
+        )
@@ -1,13 +1,42 @@
 # backend/loans/tokenization_service.py
 
+import logging
 import uuid
 from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Case, F, Value, When
 from asgiref.sync import sync_to_async
 from .models import Loan, LoanToken, ApprovedVendor, TokenTransaction
 from .momo_integration import MoMoAPI
 from .services import SMSService
+from .outbox_service import queue_sms, queue_sms_batch
+
+logger = logging.getLogger(__name__)
+
+# Seconds an ACTIVE token's validation row stays cached; redemptions clear it sooner
+TOKEN_VALIDATION_CACHE_TTL = 60
+# Token, loan and farmer fields returned to vendors when a token is scanned
+TOKEN_VALIDATION_FIELDS = (
+    'id', 'token', 'amount', 'status', 'expiry_date', 'created_at',
+    'loan__farmer__name', 'loan__farmer__phone_number'
+)
+
+# Seconds a farmer's active token count stays cached; token changes clear it sooner
+ACTIVE_TOKEN_COUNT_CACHE_TTL = 600
+# Expired tokens read per chunk when queueing expiry notifications
+TOKEN_EXPIRY_NOTIFY_CHUNK_SIZE = 1000
+
+
+def token_cache_key(token_code):
+    return f"loan-token:{token_code}"
+
+
+def active_token_count_key(farmer_id):
+    return f"farmer-active-tokens:{farmer_id}"
 
 class TokenizedLoanService:
     def __init__(self):
@@ -19,106 +48,242 @@ class TokenizedLoanService:
         # Generate unique token for this loan
         token = str(uuid.uuid4())
         
-        # Store token information
+        # Store the token, update the loan and queue the notification together
         @sync_to_async
         def create_token():
-            return LoanToken.objects.create(
-                loan=loan,
-                token=token,
-                amount=loan.amount_approved,
-                status='ACTIVE',
-                expiry_date=timezone.now() + timedelta(days=30)
-            )
+            with transaction.atomic():
+                loan_token = LoanToken.objects.create(
+                    loan=loan,
+                    token=token,
+                    amount=loan.amount_approved,
+                    status='ACTIVE',
+                    expiry_date=timezone.now() + timedelta(days=30)
+                )
+                
+                loan.disbursement_status = 'COMPLETED'
+                loan.momo_reference = token
+                loan.save(update_fields=['disbursement_status', 'momo_reference'])
+                cache.delete(active_token_count_key(loan.farmer_id))
+                
+                queue_sms(
+                    loan.farmer.phone_number,
+                    f"Your loan of {loan.amount_approved} RWF has been approved and tokenized. "
+                    f"Your token is {token}. Use this token at any of our certified input suppliers "
+                    f"to purchase agricultural inputs. The token is valid for 30 days."
+                )
+                return loan_token
         
         try:
             loan_token = await create_token()
-            # Update loan status
-            @sync_to_async
-            def update_loan():
-                loan.disbursement_status = 'COMPLETED'
-                loan.momo_reference = token
-                loan.save()
-            
-            await update_loan()
-            
-            # Notify farmer
-            await self.sms_service.send_sms(
-                loan.farmer.phone_number,
-                f"Your loan of {loan.amount_approved} RWF has been approved and tokenized. "
-                f"Your token is {token}. Use this token at any of our certified input suppliers "
-                f"to purchase agricultural inputs. The token is valid for 30 days."
-            )
             
             return True, loan_token
             
         except Exception as e:
             return False, str(e)
     
-    async def process_token_redemption(self, token_code, vendor_id, amount):
-        """Process a token redemption at an approved vendor"""
-        # Verify token is valid
-        @sync_to_async
-        def get_token():
-            try:
-                return LoanToken.objects.select_related('loan__farmer').get(
-                    token=token_code,
-                    status='ACTIVE',
-                    amount__gte=amount
-                )
-            except LoanToken.DoesNotExist:
-                return None
-            
-        @sync_to_async
-        def get_vendor():
-            try:
-                return ApprovedVendor.objects.get(id=vendor_id, is_active=True)
-            except ApprovedVendor.DoesNotExist:
+    @staticmethod
+    def validate_token(token_code):
+        """
+        Look up an ACTIVE, unexpired token for a vendor scan.
+
+        Token, loan and farmer are read in one values() query and cached
+        by token code for TOKEN_VALIDATION_CACHE_TTL seconds.
+
+        Returns:
+            Dictionary of TOKEN_VALIDATION_FIELDS, or None
+        """
+        key = token_cache_key(token_code)
+        row = cache.get(key)
+        if row is None:
+            row = LoanToken.objects.filter(
+                token=token_code, status='ACTIVE'
+            ).values(*TOKEN_VALIDATION_FIELDS).first()
+            if row is None:
                 return None
-        
-        loan_token = await get_token()
-        if not loan_token:
-            return False, "Invalid or insufficient token"
-        
-        vendor = await get_vendor()
+            cache.set(key, row, TOKEN_VALIDATION_CACHE_TTL)
+
+        if row['expiry_date'] <= timezone.now():
+            cache.delete(key)
+            return None
+        return row
+
+    @staticmethod
+    def invalidate_token(token_code):
+        """Drop a token's cached validation row after its balance or status changes"""
+        cache.delete(token_cache_key(token_code))
+
+    @staticmethod
+    def active_token_count(farmer_id):
+        """
+        Number of a farmer's ACTIVE tokens, cached per farmer.
+
+        Relies on expire_tokens to move tokens out of ACTIVE, so no expiry
+        filter is needed; issuing, using up and expiring tokens clear it.
+        """
+        key = active_token_count_key(farmer_id)
+        count = cache.get(key)
+        if count is None:
+            count = LoanToken.objects.filter(loan__farmer_id=farmer_id, status='ACTIVE').count()
+            cache.set(key, count, ACTIVE_TOKEN_COUNT_CACHE_TTL)
+        return count
+
+    @staticmethod
+    def expire_tokens(now=None):
+        """
+        Expire every ACTIVE token past its expiry date with one UPDATE.
+
+        The UPDATE stamps updated_at with this sweep's time, which is how the
+        expired rows are found again to queue one SMS each and to clear the
+        affected farmers' cached counts, all in the same transaction.
+
+        Returns:
+            Dictionary with the number of tokens expired and SMS queued
+        """
+        now = now or timezone.now()
+        queued = 0
+        farmer_ids = set()
+
+        with transaction.atomic():
+            expired = LoanToken.objects.filter(status='ACTIVE', expiry_date__lte=now).update(
+                status='EXPIRED', updated_at=now
+            )
+            if expired:
+                rows = LoanToken.objects.filter(status='EXPIRED', updated_at=now).values_list(
+                    'amount', 'loan__farmer_id', 'loan__farmer__phone_number'
+                ).iterator(chunk_size=TOKEN_EXPIRY_NOTIFY_CHUNK_SIZE)
+
+                chunk = []
+                for amount, farmer_id, phone_number in rows:
+                    farmer_ids.add(farmer_id)
+                    chunk.append((
+                        phone_number,
+                        f"Your loan token has expired with {amount} RWF unused. "
+                        f"Please contact your loan officer if you still need agricultural inputs."
+                    ))
+                    if len(chunk) >= TOKEN_EXPIRY_NOTIFY_CHUNK_SIZE:
+                        queued += queue_sms_batch(chunk)
+                        chunk = []
+                queued += queue_sms_batch(chunk)
+
+        cache.delete_many([active_token_count_key(farmer_id) for farmer_id in farmer_ids])
+        logger.info(f"Expired {expired} loan tokens, queued {queued} notifications")
+        return {'expired': expired, 'notified': queued}
+
+    @staticmethod
+    def reserve_amount(token_code, amount):
+        """
+        Take amount off an active token's balance with one conditional UPDATE.
+
+        The balance check and the decrement happen in the same statement,
+        so concurrent redemptions can never take more than the token holds.
+
+        Returns:
+            The token with its loan and farmer after the reservation, or
+            None if the token is not active, has expired or is short
+        """
+        now = timezone.now()
+        reserved = LoanToken.objects.filter(
+            token=token_code,
+            status='ACTIVE',
+            amount__gte=amount,
+            expiry_date__gt=now
+        ).update(amount=F('amount') - amount, updated_at=now)
+        if not reserved:
+            return None
+        TokenizedLoanService.invalidate_token(token_code)
+        return LoanToken.objects.select_related('loan__farmer').get(token=token_code)
+
+    @staticmethod
+    def release_amount(loan_token, amount):
+        """
+        Give a reserved amount back to the token after a failed payout.
+
+        A concurrent redemption may have spent the rest of the balance and
+        marked the token USED meanwhile, so the same UPDATE reactivates a
+        USED token that has not expired.
+        """
+        now = timezone.now()
+        LoanToken.objects.filter(pk=loan_token.pk).update(
+            amount=F('amount') + amount,
+            status=Case(
+                When(status='USED', expiry_date__gt=now, then=Value('ACTIVE')),
+                default=F('status')
+            ),
+            updated_at=now
+        )
+        TokenizedLoanService.invalidate_token(loan_token.token)
+        cache.delete(active_token_count_key(loan_token.loan.farmer_id))
+
+    async def process_token_redemption(self, token_code, vendor_id, amount):
+        """
+        Process a token redemption at an approved vendor.
+
+        The amount is reserved on the token before the vendor is paid and
+        released again if the payout fails. In NETTED settlement mode the
+        vendor is not paid here; the redemption is recorded as pending and
+        settled by VendorSettlementRunner.
+        """
+        amount = Decimal(str(amount))
+        if amount <= 0:
+            return False, "Invalid amount"
+
+        try:
+            vendor_id = int(vendor_id)
+        except (TypeError, ValueError):
+            return False, "Vendor not approved"
+
+        vendor = (await sync_to_async(ApprovedVendor.active_map)()).get(vendor_id)
         if not vendor:
             return False, "Vendor not approved"
-        
-        # Process payment to vendor
-        success, result = await self.momo_api.initiate_disbursement(
-            loan_id=loan_token.loan.id,
-            amount=amount,
-            phone_number=vendor.phone_number
-        )
-        
-        if not success:
-            return False, "Payment failed"
-        
-        reference = result if isinstance(result, str) else "TOKEN-PAYMENT"
-        
-        # Update token amount
+
+        loan_token = await sync_to_async(self.reserve_amount)(token_code, amount)
+        if not loan_token:
+            return False, "Invalid or insufficient token"
+
+        if settings.TOKEN_SETTLEMENT_MODE == 'NETTED':
+            reference = str(uuid.uuid4())
+            settlement_status = 'PENDING'
+        else:
+            # Process payment to vendor
+            try:
+                result = await self.momo_api.initiate_disbursement(
+                    loan_id=loan_token.loan.id,
+                    amount=amount,
+                    phone_number=vendor['phone_number']
+                )
+            except Exception as e:
+                logger.warning(f"Payout for token {token_code} failed, releasing {amount}: {str(e)}")
+                await sync_to_async(self.release_amount)(loan_token, amount)
+                return False, "Payment failed"
+
+            reference = result.get('reference') or "TOKEN-PAYMENT"
+            settlement_status = 'SETTLED'
+
+        # Record the redemption and close the token once it is spent
         @sync_to_async
-        def update_token():
+        def record_redemption():
             with transaction.atomic():
-                loan_token.amount -= amount
                 if loan_token.amount <= 0:
-                    loan_token.status = 'USED'
-                loan_token.save()
-                
-                # Record transaction
+                    LoanToken.objects.filter(pk=loan_token.pk, amount__lte=0, status='ACTIVE').update(
+                        status='USED'
+                    )
+                    self.invalidate_token(loan_token.token)
+                    cache.delete(active_token_count_key(loan_token.loan.farmer_id))
+
                 TokenTransaction.objects.create(
                     token=loan_token,
-                    vendor=vendor,
+                    vendor_id=vendor['id'],
                     amount=amount,
-                    reference=reference
+                    reference=reference,
+                    status=settlement_status
                 )
-        
-        await update_token()
-        
-        # Notify farmer
-        await self.sms_service.send_sms(
-            loan_token.loan.farmer.phone_number,
-            f"Your token has been used to purchase {amount} RWF of agricultural inputs from {vendor.name}. "
-            f"Remaining token balance: {loan_token.amount} RWF."
-        )
-        
-        return True, "Transaction successful"
\ No newline at end of file
+
+                queue_sms(
+                    loan_token.loan.farmer.phone_number,
+                    f"Your token has been used to purchase {amount} RWF of agricultural inputs from {vendor['name']}. "
+                    f"Remaining token balance: {loan_token.amount} RWF."
+                )
+
+        await record_redemption()
+
+        return True, "Transaction successful"
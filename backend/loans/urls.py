@@ -41,4 +41,5 @@ urlpatterns = [
     path('loans/<int:pk>/approve/', LoanViewSet.as_view({'post': 'approve'}), name='loan-approve'),
     path('loans/<int:pk>/disburse/', LoanViewSet.as_view({'post': 'disburse'}), name='loan-disburse'),
     path('webhooks/momo/', views.momo_webhook, name='momo-webhook'),
+    path('providers/health/', views.provider_health, name='provider-health'),
 ]
\ No newline at end of file
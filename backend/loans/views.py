@@ -16,14 +16,15 @@ from asgiref.sync import sync_to_async, async_to_sync
 from farmers.models import Farmer
 
 from .models import (
-    Loan, LoanProduct, LoanRepayment, Transaction, PaymentSchedule,
-    LoanToken, TokenTransaction, ApprovedVendor, CropCycle
+    Loan, LoanProduct, Transaction, PaymentSchedule,
+    TokenTransaction, ApprovedVendor, CropCycle
 )
 from .serializers import (
     LoanSerializer, LoanProductSerializer, SimpleLoanSerializer, DetailedLoanSerializer,
     LoanRepaymentSerializer, TransactionSerializer, PaymentScheduleSerializer,
     LoanTokenSerializer, TokenTransactionSerializer, CropCycleSerializer, 
-    HarvestScheduleSerializer, FarmerDashboardSerializer
+    HarvestScheduleSerializer, FarmerDashboardSerializer, CreditScoreExplanationSerializer,
+    BulkTransitionOptionsSerializer
 )
 from .services import LoanService, SMSService, DynamicCreditScoringService
 from .tokenization_service import TokenizedLoanService
@@ -33,8 +34,11 @@ from .external.weather_api import WeatherService
 from .external.market_api import MarketDataService
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
-from .repayment_service import RepaymentService
+from .webhook_service import MoMoWebhookService
+from .explanation_service import CreditExplanationService
+from .lifecycle_service import LOAN_TRANSITIONS, BulkLoanLifecycle
 from .permissions import IsAdminUser
+from .resilience import provider_metrics
 
 
 
@@ -101,10 +105,10 @@ class LoanViewSet(viewsets.ModelViewSet):
                 'total_loans': loans.count(),
                 'active_loans': loans.filter(status__in=['APPROVED', 'DISBURSED', 'ACTIVE']).count(),
                 'total_approved': loans.aggregate(Sum('amount_approved'))['amount_approved__sum'] or 0,
-                'total_repaid': LoanRepayment.objects.filter(loan__in=loans).aggregate(Sum('amount'))['amount__sum'] or 0,
+                'total_repaid': loans.aggregate(Sum('total_repaid'))['total_repaid__sum'] or 0,
                 'upcoming_payments': PaymentSchedule.objects.filter(
                     loan__in=loans,
-                    status__in=['PENDING', 'PARTIALLY_PAID']
+                    status__in=['PENDING', 'PARTIAL']
                 ).count(),
                 'overdue_payments': PaymentSchedule.objects.filter(
                     loan__in=loans,
@@ -114,6 +118,77 @@ class LoanViewSet(viewsets.ModelViewSet):
         
         payment_stats = await get_payment_stats()
         return Response(payment_stats)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def bulk_eligibility(self, request):
+        """Pre-approval check for a list of farmer, product and amount applications"""
+        applications = request.data.get('applications')
+        if not isinstance(applications, list) or not applications:
+            return Response(
+                {"error": "applications must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            results = LoanService.check_bulk_eligibility([
+                {
+                    'farmer_id': int(app['farmer_id']),
+                    'loan_product_id': int(app['loan_product_id']),
+                    'amount': Decimal(str(app['amount']))
+                }
+                for app in applications
+            ])
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            return Response(
+                {"error": "Each application needs farmer_id, loan_product_id and amount"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        eligible = sum(1 for result in results if result['eligible'])
+        return Response({
+            'results': results,
+            'summary': {
+                'total': len(results),
+                'eligible': eligible,
+                'ineligible': len(results) - eligible
+            }
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def bulk_transition(self, request):
+        """Approve, reject or complete a batch of loans in one set-based operation"""
+        loan_ids = request.data.get('loan_ids')
+        transition = request.data.get('action')
+        if transition not in LOAN_TRANSITIONS:
+            return Response(
+                {"error": f"action must be one of {', '.join(LOAN_TRANSITIONS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not isinstance(loan_ids, list) or not loan_ids:
+            return Response(
+                {"error": "loan_ids must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        options = BulkTransitionOptionsSerializer(data=request.data)
+        if not options.is_valid():
+            return Response(options.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            result = BulkLoanLifecycle().transition(
+                transition,
+                loan_ids,
+                approved_amounts=request.data.get('approved_amounts'),
+                disburse=options.validated_data['disburse']
+            )
+        except (AttributeError, TypeError, ValueError, ArithmeticError):
+            return Response(
+                {"error": "approved_amounts must map loan ids to amounts"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = result.pop('results')
+        return Response({'results': results, 'summary': result})
+
     @action(detail=True, methods=['post'])
     def apply(self, request, pk=None):
         """Apply for a loan"""
@@ -155,9 +230,15 @@ class LoanViewSet(viewsets.ModelViewSet):
     def approve(self, request, pk=None):
         """Approve a loan"""
         loan = self.get_object()
-        loan.status = 'APPROVED'
-        loan.approval_date = timezone.now()
-        loan.save()
+        try:
+            amount_approved = Decimal(str(request.data.get('amount_approved') or loan.amount_requested))
+        except ArithmeticError:
+            return Response(
+                {"error": "Invalid amount_approved"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        loan.approve(amount_approved)
+        loan.save(update_fields=Loan.APPROVAL_FIELDS)
         serializer = self.get_serializer(loan)
         return Response(serializer.data)
 
@@ -167,9 +248,24 @@ class LoanViewSet(viewsets.ModelViewSet):
         loan = self.get_object()
         loan.status = 'DISBURSED'
         loan.disbursement_date = timezone.now()
-        loan.save()
+        loan.save(update_fields=['status', 'disbursement_date'])
         serializer = self.get_serializer(loan)
         return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def explanation(self, request, pk=None):
+        """Top features behind the credit score used for this loan decision"""
+        loan = self.get_object()
+        explanation = CreditExplanationService.get_loan_explanation(loan)
+        if not explanation:
+            return Response(
+                {"detail": "No score explanation existed when this loan was decided"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        data = CreditScoreExplanationSerializer(explanation).data
+        data['loan_id'] = loan.id
+        return Response(data)
     
 class FarmerDashboardAPIView(APIView):
     """API view for farmer dashboard data"""
@@ -204,7 +300,7 @@ class FarmerDashboardAPIView(APIView):
                 # Calculate metrics
                 active_loans_count = active_loans.count()
                 total_loan_balance = active_loans.aggregate(
-                    total=Sum('amount_approved')
+                    total=Sum('outstanding_balance')
                 )['total'] or 0
                 
                 # Find next payment
@@ -212,19 +308,15 @@ class FarmerDashboardAPIView(APIView):
                 next_payment = PaymentSchedule.objects.filter(
                     loan__farmer=farmer,
                     loan__status__in=active_statuses,
-                    status__in=['PENDING', 'PARTIALLY_PAID'],
+                    status__in=['PENDING', 'PARTIAL'],
                     due_date__gte=today
                 ).order_by('due_date').first()
                 
                 next_payment_date = next_payment.due_date if next_payment else None
                 next_payment_amount = next_payment.amount if next_payment else 0
                 
-                # Count active tokens
-                active_tokens = LoanToken.objects.filter(
-                    loan__farmer=farmer,
-                    status='ACTIVE',
-                    expiry_date__gte=today
-                ).count()
+                # Count active tokens, cached until one is issued, used up or expired
+                active_tokens = TokenizedLoanService.active_token_count(farmer.id)
                 
                 # Create data dict with computed fields
                 data = {
@@ -334,42 +426,19 @@ class TokenValidationView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Verify token exists and is valid
-        @sync_to_async
-        def get_token():
-            try:
-                return LoanToken.objects.select_related('loan__farmer').get(
-                    token=token_code,
-                    status='ACTIVE'
-                )
-            except LoanToken.DoesNotExist:
-                return None
-        
-        loan_token = await get_token()
-        if not loan_token:
+        # Token, loan and farmer in one query, cached while the token is active
+        row = await sync_to_async(TokenizedLoanService.validate_token)(token_code)
+        if not row:
             return Response(
                 {"detail": "Invalid or expired token"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Serialize token data
-        @sync_to_async
-        def serialize_token():
-            serializer = LoanTokenSerializer(loan_token)
-            return serializer.data
-        
-        token_data = await serialize_token()
-        
-        # Add farmer info
-        @sync_to_async
-        def get_farmer_info():
-            return {
-                'farmer_name': loan_token.loan.farmer.name,
-                'farmer_phone': loan_token.loan.farmer.phone_number
-            }
-        
-        farmer_info = await get_farmer_info()
-        token_data.update(farmer_info)
+        token_data = LoanTokenSerializer(row).data
+        token_data.update({
+            'farmer_name': row['loan__farmer__name'],
+            'farmer_phone': row['loan__farmer__phone_number']
+        })
         
         return Response(token_data)
 
@@ -570,36 +639,38 @@ class CropCycleViewSet(viewsets.ModelViewSet):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 async def momo_webhook(request):
-    """Handle MTN Mobile Money webhook callbacks"""
+    """
+    Handle MTN Mobile Money webhook callbacks.
+    
+    The callback is validated and stored, then applied by a background
+    worker so that MTN gets its 200 as soon as the event is committed.
+    """
     try:
-        # Log the incoming webhook data for debugging
-        print(f"Received MoMo webhook: {request.data}")
+        payload = request.data if isinstance(request.data, dict) else request.data.dict()
         
-        # Adapt MTN data format to our expected format
-        payment_data = {
-            'reference': request.data.get('external_id') or request.data.get('transaction_id'),
-            'amount': request.data.get('amount'),
-            'phone_number': request.data.get('payer_phone') or request.data.get('phone_number'),
-            'status': request.data.get('status')
-        }
+        # Reject retries of a callback we already have before touching the loan
+        event, created = await sync_to_async(MoMoWebhookService.record_event)(payload)
         
-        # Only process successful payments
-        if payment_data.get('status') not in ('SUCCESSFUL', 'COMPLETED', None):
+        if not created:
             return Response({
-                "status": "ignored", 
-                "message": f"Payment not successful: {payment_data.get('status')}"
+                "status": "duplicate",
+                "message": "Callback already received"
             }, status=status.HTTP_200_OK)
         
-        # Process the payment
-        repayment_service = RepaymentService()
-        success, message = await repayment_service.process_payment(payment_data)
+        await sync_to_async(MoMoWebhookService.schedule_drain)()
         
-        if success:
-            return Response({"status": "success", "message": message}, status=status.HTTP_200_OK)
-        else:
-            return Response({"status": "error", "message": message}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "status": "accepted",
+            "message": "Callback queued for processing"
+        }, status=status.HTTP_200_OK)
     except Exception as e:
         return Response(
             {"status": "error", "message": f"Webhook processing error: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def provider_health(request):
+    """Circuit breaker state, concurrency limits and call counters per provider endpoint family"""
+    return Response(provider_metrics())
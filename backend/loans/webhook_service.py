@@ -0,0 +1,266 @@
+# backend/loans/webhook_service.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from .models import MoMoWebhookEvent
+
+logger = logging.getLogger(__name__)
+
+# Payload keys that carry the provider's transaction ID, in order of preference;
+# transaction_id is not one of them, legacy callbacks put the loan reference there
+TRANSACTION_ID_KEYS = ('financialTransactionId', 'financial_transaction_id')
+# Callbacks without a provider transaction ID are deduplicated on a hash of the
+# whole payload, so only an exact re-delivery is dropped
+PAYLOAD_HASH_PREFIX = 'payload-'
+# Provider statuses that mean the payment went through; None for callbacks without one
+SUCCESSFUL_STATUSES = ('SUCCESSFUL', 'COMPLETED', None)
+# Events claimed per worker micro-batch
+WEBHOOK_BATCH_SIZE = 200
+# Loans whose events are applied concurrently within a batch
+WEBHOOK_CONCURRENCY = 10
+# Events claimed longer ago than this are assumed lost by a crashed worker
+WEBHOOK_CLAIM_TIMEOUT = timedelta(minutes=5)
+# Callbacks arriving within this window share one scheduled drain
+WEBHOOK_DRAIN_DELAY_SECONDS = 1
+WEBHOOK_DRAIN_LOCK_KEY = 'momo-webhook-drain-scheduled'
+
+
+def payload_hash(payload):
+    """Stable dedupe key for a callback that carries no provider transaction ID"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return PAYLOAD_HASH_PREFIX + hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def parse_callback(payload):
+    """Extract the fields we index and process from a MoMo callback payload"""
+    payer = payload.get('payer') if isinstance(payload.get('payer'), dict) else {}
+    try:
+        amount = Decimal(str(payload.get('amount')))
+    except (InvalidOperation, ValueError):
+        amount = None
+
+    return {
+        'provider_transaction_id': next(
+            (str(payload[key]) for key in TRANSACTION_ID_KEYS if payload.get(key)), None
+        ) or payload_hash(payload),
+        # Callbacks without an external ID carry the loan reference in transaction_id
+        'external_id': str(
+            payload.get('external_id') or payload.get('externalId') or payload.get('transaction_id') or ''
+        ),
+        'amount': amount,
+        'phone_number': str(
+            payload.get('payer_phone') or payload.get('phone_number') or payer.get('partyId') or ''
+        ),
+        'provider_status': str(payload.get('status') or '')
+    }
+
+
+class MoMoWebhookService:
+    """Records MoMo callbacks exactly once and applies them as repayments"""
+
+    @staticmethod
+    def record_event(payload):
+        """
+        Store a callback unless its provider transaction ID was seen before.
+
+        The unique index on provider_transaction_id makes the duplicate
+        check a single indexed INSERT, done before any loan row is locked.
+        Callbacks without a provider ID, such as legacy repayments and
+        some failure callbacks, are keyed on a hash of their payload.
+
+        Returns:
+            Tuple of (event, created); event is None for duplicates
+        """
+        fields = parse_callback(payload)
+
+        try:
+            with transaction.atomic():
+                return MoMoWebhookEvent.objects.create(payload=payload, **fields), True
+        except IntegrityError:
+            logger.info(f"Duplicate MoMo callback {fields['provider_transaction_id']} rejected")
+            return None, False
+
+    @staticmethod
+    def schedule_drain():
+        """
+        Queue a worker drain unless one is already due shortly.
+
+        Callbacks in a burst then share a single micro-batched drain
+        instead of enqueueing one task each.
+        """
+        from .tasks import process_momo_webhook_events
+
+        if cache.add(WEBHOOK_DRAIN_LOCK_KEY, True, timeout=WEBHOOK_DRAIN_DELAY_SECONDS):
+            try:
+                process_momo_webhook_events.apply_async(countdown=WEBHOOK_DRAIN_DELAY_SECONDS)
+            except Exception as e:
+                # The periodic drain picks the event up if the broker is unavailable
+                logger.warning(f"Could not queue MoMo webhook drain: {str(e)}")
+
+    async def apply_event(self, event, repayment_service=None):
+        """
+        Apply a recorded callback as a repayment without saving the event.
+
+        Returns:
+            Tuple of (success, message); event.status and event.result are set
+        """
+        if (event.provider_status or None) not in SUCCESSFUL_STATUSES:
+            success, message = True, f"Payment not successful: {event.provider_status}"
+            event.status = 'IGNORED'
+        else:
+            if repayment_service is None:
+                from .repayment_service import RepaymentService
+                repayment_service = RepaymentService()
+            success, message = await repayment_service.process_payment({
+                'reference': event.external_id,
+                'amount': event.amount,
+                'phone_number': event.phone_number,
+                'transaction_id': event.provider_transaction_id
+            }, webhook_event=event)
+            event.status = 'PROCESSED' if success else 'FAILED'
+
+        event.result = message or ''
+        event.processed_at = timezone.now()
+        return success, message
+
+    async def process_event(self, event):
+        """
+        Apply a recorded callback as a repayment and store the outcome.
+
+        Returns:
+            Tuple of (success, message)
+        """
+        success, message = await self.apply_event(event)
+        await event.asave(update_fields=['status', 'result', 'processed_at'])
+        return success, message
+
+    async def replay(self, events):
+        """
+        Re-apply stored callbacks from their raw payloads.
+
+        Returns:
+            Dictionary with the number of events replayed, processed and failed
+        """
+        counts = {'replayed': 0, 'processed': 0, 'failed': 0}
+        for event in events:
+            fields = parse_callback(event.payload)
+            fields.pop('provider_transaction_id')
+            for name, value in fields.items():
+                setattr(event, name, value)
+            success, _ = await self.process_event(event)
+            counts['replayed'] += 1
+            counts['processed' if success else 'failed'] += 1
+        return counts
+
+
+class WebhookEventWorker:
+    """Drains received MoMo callbacks in micro-batches grouped by loan"""
+
+    def __init__(self, batch_size=WEBHOOK_BATCH_SIZE, max_concurrency=WEBHOOK_CONCURRENCY):
+        from .repayment_service import RepaymentService
+
+        self.webhook_service = MoMoWebhookService()
+        self.repayment_service = RepaymentService()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+
+    def claim_batch(self):
+        """
+        Claim up to batch_size events in arrival order by marking them PROCESSING.
+
+        Uses SKIP LOCKED where supported so several workers can drain side
+        by side without applying an event twice.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                MoMoWebhookEvent.objects.select_for_update(skip_locked=True).filter(
+                    Q(status='RECEIVED') |
+                    Q(status='PROCESSING', claimed_at__lt=now - WEBHOOK_CLAIM_TIMEOUT)
+                ).order_by('received_at', 'id').values_list('id', flat=True)[:self.batch_size]
+            )
+            MoMoWebhookEvent.objects.filter(id__in=ids).update(status='PROCESSING', claimed_at=now)
+        return list(MoMoWebhookEvent.objects.filter(id__in=ids).order_by('received_at', 'id'))
+
+    async def drain_batch(self):
+        """
+        Claim and apply one batch.
+
+        Events for the same loan are applied one after another in arrival
+        order; different loans run concurrently. An applied event is marked
+        PROCESSED together with its repayment; the remaining outcomes are
+        written back with one bulk_update.
+
+        Returns:
+            Dictionary of event counts by outcome status
+        """
+        events = await sync_to_async(self.claim_batch)()
+        if not events:
+            return {}
+
+        by_loan = {}
+        for event in events:
+            by_loan.setdefault(event.external_id, []).append(event)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def apply_loan_events(loan_events):
+            async with semaphore:
+                for event in loan_events:
+                    try:
+                        await self.webhook_service.apply_event(event, self.repayment_service)
+                    except Exception as e:
+                        event.status = 'FAILED'
+                        event.result = str(e)
+                        event.processed_at = timezone.now()
+
+        await asyncio.gather(*[apply_loan_events(loan_events) for loan_events in by_loan.values()])
+
+        for event in events:
+            event.claimed_at = None
+        await sync_to_async(MoMoWebhookEvent.objects.bulk_update)(
+            events, ['status', 'result', 'claimed_at', 'processed_at']
+        )
+
+        counts = {}
+        for event in events:
+            counts[event.status] = counts.get(event.status, 0) + 1
+        return counts
+
+    async def drain(self, max_batches=None):
+        """Apply batches until no received events are left"""
+        started = time.perf_counter()
+        totals = {'batches': 0, 'events': 0, 'PROCESSED': 0, 'FAILED': 0, 'IGNORED': 0}
+
+        while max_batches is None or totals['batches'] < max_batches:
+            counts = await self.drain_batch()
+            if not counts:
+                break
+            totals['batches'] += 1
+            for status, count in counts.items():
+                totals['events'] += count
+                totals[status] = totals.get(status, 0) + count
+
+        elapsed = time.perf_counter() - started
+        result = {
+            'batches': totals['batches'],
+            'events': totals['events'],
+            'processed': totals['PROCESSED'],
+            'failed': totals['FAILED'],
+            'ignored': totals['IGNORED'],
+            'elapsed_seconds': round(elapsed, 3),
+            'per_second': round(totals['events'] / elapsed, 1) if elapsed else 0.0
+        }
+        if totals['events']:
+            logger.info(f"MoMo webhook drain: {result}")
+        return result